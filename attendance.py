@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# --- Attendance State ---
+# Holds the IN/OUT state of every enrolled person and turns a recognized face
+# into an ENTRY or EXIT event for the sheet writer. Shared by the single-camera
+# recognizer (idk.py) and the multi-camera server (multi_camera.py).
+# State lives in parallel NumPy arrays indexed by a per-person slot, instead of a
+# dict per person, so 50k identities cost well under a megabyte:
+#   is_in (bool), entry_row (int64, 0 = no open row, < 0 = entry not yet in the sheet), last_action_time (float64)
+# Slots are handed out once per name and never reused; gallery rows cannot be used
+# directly because they shift when a face is removed. The people currently IN are
+# also kept as a set of slots, so counting them is O(1).
+COLOR_GREEN = (0, 255, 0)
+COLOR_YELLOW = (0, 255, 255)
+COLOR_RED = (0, 0, 255)
+INITIAL_CAPACITY = 1024
+SNAPSHOT_VERSION = 1
+
+
+class AttendanceBook:
+    """In-memory attendance state for all known people, backed by a SheetWriter."""
+
+    def __init__(self, sheet_writer, cooldown_seconds, capacity=INITIAL_CAPACITY):
+        self.sheet_writer = sheet_writer
+        self.cooldown_seconds = cooldown_seconds
+        self.names = [] # Slot -> person name
+        self._slots = {} # Person name -> slot
+        self.is_in = np.zeros(capacity, dtype=bool)
+        self.entry_row = np.zeros(capacity, dtype=np.int64)
+        self.last_action_time = np.zeros(capacity, dtype=np.float64)
+        self._present = set() # Slots of the people currently IN
+        self._lock = threading.Lock() # Sightings may arrive from several camera threads
+
+    # --- People ---
+    def _slot(self, person_name):
+        """Returns the slot of a person, adding them as OUT if new. Caller holds self._lock."""
+        slot = self._slots.get(person_name)
+        if slot is None:
+            slot = len(self.names)
+            if slot == len(self.is_in):
+                self._grow(max(slot * 2, INITIAL_CAPACITY))
+            self.names.append(person_name)
+            self._slots[person_name] = slot
+        return slot
+
+    def _grow(self, capacity):
+        for attr in ('is_in', 'entry_row', 'last_action_time'):
+            old = getattr(self, attr)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    def add_person(self, person_name):
+        """Starts tracking a person as OUT (no-op if already known)."""
+        with self._lock:
+            self._slot(person_name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _set_in(self, slot, entry_row):
+        self.is_in[slot] = True
+        self.entry_row[slot] = entry_row
+        self._present.add(slot)
+
+    def _set_out(self, slot):
+        self.is_in[slot] = False
+        self.entry_row[slot] = 0
+        self._present.discard(slot)
+
+    def restore_open_entries(self, open_entries, current_time_epoch=None):
+        """
+        Makes exactly the people in open_entries ({person_name: entry_row}) IN, e.g. after a
+        restart. Everyone else is OUT. open_entries may also be a function returning that dict;
+        it is then called under the book's lock.
+        """
+        if current_time_epoch is None:
+            current_time_epoch = time.time()
+        with self._lock:
+            if callable(open_entries):
+                open_entries = open_entries()
+            for slot in list(self._present):
+                self._set_out(slot)
+            for person_name, entry_row in open_entries.items():
+                slot = self._slot(person_name)
+                self._set_in(slot, entry_row)
+                # The cooldown starts now, so someone standing at the camera during a restart is not logged out at once
+                self.last_action_time[slot] = current_time_epoch
+
+    def num_present(self):
+        """Number of people currently IN."""
+        return len(self._present)
+
+    def present_names(self):
+        """Names of the people currently IN."""
+        with self._lock:
+            return [self.names[slot] for slot in self._present]
+
+    # --- Snapshot ---
+    def save_snapshot(self, path):
+        """Atomically writes the whole state as one compressed .npz file."""
+        with self._lock:
+            count = len(self.names)
+            tmp_path = path + ".tmp.npz"
+            np.savez_compressed(tmp_path, version=SNAPSHOT_VERSION, saved_at=time.time(),
+                                names=np.array(self.names, dtype=str), is_in=self.is_in[:count],
+                                entry_row=self.entry_row[:count], last_action_time=self.last_action_time[:count])
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path):
+        """Restores state written by save_snapshot. Returns the time it was saved."""
+        with np.load(path) as data:
+            if int(data['version']) != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported attendance snapshot version {int(data['version'])}")
+            names = [str(name) for name in data['names']]
+            is_in, entry_row, last_action_time = data['is_in'], data['entry_row'], data['last_action_time']
+            saved_at = float(data['saved_at'])
+        with self._lock:
+            slots = np.array([self._slot(name) for name in names], dtype=np.int64)
+            self.is_in[slots] = is_in
+            self.entry_row[slots] = entry_row
+            self.last_action_time[slots] = last_action_time
+            self._present = set(np.flatnonzero(self.is_in[:len(self.names)]).tolist())
+        return saved_at
+
+    # --- Sheet Events ---
+    def log_new_entry(self, person_name, current_dt):
+        """Journals a new entry row for the Google Sheet and returns the reference its exit is logged against."""
+        try:
+            # The event is journaled; the background writer appends the row and learns where it landed
+            entry_ref = self.sheet_writer.log_entry(person_name, current_dt)
+            print(f"ATTENDANCE LOG: ENTRY for '{person_name}' journaled for Google Sheet ({current_dt.strftime('%H:%M:%S')} on {current_dt.strftime('%Y-%m-%d')}).")
+            return entry_ref # Return the entry reference for later exit update
+        except Exception as e:
+            print(f"ERROR logging entry for '{person_name}': {e}")
+            return None # Indicate failure
+
+    def update_exit_time(self, person_name, row_index, current_dt):
+        """Journals the 'Exit Time' update for an entry row (sheet row, or reference if not yet written)."""
+        try:
+            self.sheet_writer.log_exit(person_name, row_index, current_dt)
+            print(f"ATTENDANCE LOG: EXIT for '{person_name}' journaled for Google Sheet ({current_dt.strftime('%H:%M:%S')}).")
+            return True
+        except Exception as e:
+            print(f"ERROR updating exit time for '{person_name}' at row {row_index}: {e}")
+            return False
+
+    # --- Sightings ---
+    def record_sighting(self, person_name, current_dt, current_time_epoch):
+        """
+        Applies a recognition of a known person: ENTRY if they are OUT, EXIT if they are IN,
+        nothing while their cooldown runs. Returns (box_label, status_message, color) for display.
+        """
+        return self.record_sightings([person_name], current_dt, current_time_epoch)[0]
+
+    def record_sightings(self, person_names, current_dt, current_time_epoch):
+        """record_sighting for everyone recognized in one frame, with a single vectorized cooldown check."""
+        with self._lock:
+            slots = np.array([self._slot(name) for name in person_names], dtype=np.int64)
+            in_cooldown = (current_time_epoch - self.last_action_time[slots]) < self.cooldown_seconds
+            results = []
+            handled = set() # The same person twice in one frame only counts once
+            for person_name, slot, cooling_down in zip(person_names, slots.tolist(), in_cooldown.tolist()):
+                if cooling_down or slot in handled:
+                    # Still in cooldown, just update display
+                    results.append((f"{person_name} (Cooldown)", f"Cooldown: {person_name}", COLOR_YELLOW))
+                else:
+                    results.append(self._toggle(person_name, slot, current_dt, current_time_epoch))
+                    handled.add(slot)
+            return results
+
+    def _toggle(self, person_name, slot, current_dt, current_time_epoch):
+        """ENTRY or EXIT for a person whose cooldown has passed. Caller holds self._lock."""
+        if not self.is_in[slot]: # Person is currently OUT -> ENTRY
+            new_row_idx = self.log_new_entry(person_name, current_dt)
+            if new_row_idx:
+                self._set_in(slot, new_row_idx)
+                self.last_action_time[slot] = current_time_epoch
+                return f"ENTRY: {person_name}", f"ENTRY: {person_name}", COLOR_GREEN
+            return f"Entry Failed: {person_name}", f"Entry Failed: {person_name}", COLOR_RED
+
+        # Person is currently IN -> EXIT
+        entry_row = int(self.entry_row[slot])
+        if entry_row == 0:
+            # Inconsistent state: is_in is True but no entry_row. Resetting.
+            print(f"WARNING: Inconsistent state for {person_name}. Resetting to OUT.")
+            self._set_out(slot)
+            return f"Error State: {person_name}", f"Error State: {person_name}", COLOR_RED
+
+        if self.update_exit_time(person_name, entry_row, current_dt):
+            self._set_out(slot) # Clear the entry row for the next entry
+            self.last_action_time[slot] = current_time_epoch
+            return f"EXIT: {person_name}", f"EXIT: {person_name}", COLOR_RED
+        return f"Exit Failed: {person_name}", f"Exit Failed: {person_name}", COLOR_RED
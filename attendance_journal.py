@@ -0,0 +1,110 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# --- Attendance Write-Ahead Journal ---
+# Every attendance event is committed to a local SQLite database (WAL mode) before
+# it is replicated to Google Sheets. A sheet outage therefore never blocks the
+# recognition loop and never loses an event: unreplicated events are replayed by
+# the sheet writer, including after a restart. An entry's sheet row is only known
+# once it has been appended, and is recorded here when it is marked replicated.
+REPLICATED_RETENTION_DAYS = 30 # Replicated events older than this are pruned at startup
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind          TEXT    NOT NULL,  -- 'entry' or 'exit'
+    name          TEXT    NOT NULL,
+    row_index     INTEGER NOT NULL,  -- entry: sheet row once written (0 before); exit: entry row or -entry id
+    payload       TEXT    NOT NULL,  -- JSON list of cell values
+    created_at    REAL    NOT NULL,
+    replicated_at REAL
+);
+CREATE INDEX IF NOT EXISTS events_pending ON events (id) WHERE replicated_at IS NULL;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class AttendanceJournal:
+    """Append-only local log of attendance events with replication bookkeeping."""
+
+    def __init__(self, path, durable=True):
+        self.path = path
+        # One connection shared by the recognition and writer threads, serialised by a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # FULL fsyncs every commit so the last events survive a power cut; NORMAL only survives application crashes
+            self._conn.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+            self._conn.executescript(_SCHEMA)
+            # Identifies this journal's rows in the sheet, next to rows from other door machines
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('writer_id', ?)", (uuid.uuid4().hex[:8],))
+            (self.writer_id,) = self._conn.execute("SELECT value FROM meta WHERE key = 'writer_id'").fetchone()
+
+    def append(self, kind, name, row_index, values):
+        """Durably records one event and returns its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO events (kind, name, row_index, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, name, row_index, json.dumps(values), time.time()))
+            return cursor.lastrowid
+
+    def unreplicated(self):
+        """Returns every event not yet written to the sheet as (id, kind, name, row_index, values), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, name, row_index, payload FROM events WHERE replicated_at IS NULL ORDER BY id").fetchall()
+        return [(event_id, kind, name, row_index, json.loads(payload)) for event_id, kind, name, row_index, payload in rows]
+
+    def mark_replicated(self, event_ids, entry_rows=None):
+        """Marks events as written to the sheet, recording the rows entries landed on ({event_id: row})."""
+        if not event_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE events SET replicated_at = ? WHERE id = ?", [(now, i) for i in event_ids])
+            if entry_rows:
+                self._conn.executemany("UPDATE events SET row_index = ? WHERE id = ?",
+                                       [(row, i) for i, row in entry_rows.items()])
+            self._conn.execute("COMMIT")
+
+    def entry_row(self, event_id):
+        """Sheet row a journaled entry was written to, or None if it is not in the sheet (or pruned)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_index FROM events WHERE id = ? AND kind = 'entry' AND replicated_at IS NOT NULL",
+                (event_id,)).fetchone()
+        return row[0] if row else None
+
+    def last_entry_row(self):
+        """Highest sheet row an entry of this journal is known to have been written to, or None."""
+        with self._lock:
+            (row,) = self._conn.execute(
+                "SELECT MAX(row_index) FROM events WHERE kind = 'entry' AND replicated_at IS NOT NULL").fetchone()
+        return row
+
+    def lag(self):
+        """Returns (pending_events, seconds_since_oldest_pending_event)."""
+        with self._lock:
+            count, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM events WHERE replicated_at IS NULL").fetchone()
+        return count, (time.time() - oldest) if oldest is not None else 0.0
+
+    def prune(self, retention_days=REPLICATED_RETENTION_DAYS):
+        """Deletes replicated events older than the retention period."""
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM events WHERE replicated_at IS NOT NULL AND replicated_at < ?", (cutoff,))
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,132 @@
+import json
+import os
+from datetime import date
+
+# --- Attendance State Recovery ---
+# Every person used to start as OUT, so after a restart anyone already inside got a
+# duplicate ENTRY row and their open row never received an exit time. At startup the
+# open entries of today (rows with today's date and no exit time) are rebuilt from the
+# sheet with a single column-limited, open-ended batch_get:
+#   A{start}:B  - name and date of every row not seen before, which also tells how many rows are used
+#   D{first}:D  - exit times, also covering rows that were open at the last checkpoint
+# The result is checkpointed locally, so the next start only reads the rows appended
+# since then instead of the whole day or the whole sheet. The last checkpointed row is
+# read again too: if it has become empty, rows were deleted and the sheet is read afresh:
+#   {"sheet": ..., "date": "YYYY-MM-DD", "scanned_rows": N, "open": {name: row}}
+CHECKPOINT_VERSION = 1
+FIRST_DATA_ROW = 2 # Row 1 is the header
+
+
+def load_checkpoint(path, sheet_key):
+    """Returns the saved checkpoint for this sheet, or None if missing, unreadable or for another sheet."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('sheet') != sheet_key:
+            return None
+        return {'date': checkpoint['date'], 'scanned_rows': int(checkpoint['scanned_rows']),
+                'open': {name: int(row) for name, row in checkpoint['open'].items()}}
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        print(f"WARNING: Could not read attendance checkpoint '{path}' ({e}). Reading today's rows from the sheet.")
+        return None
+
+
+def save_checkpoint(path, sheet_key, day, scanned_rows, open_entries):
+    """Atomically writes the checkpoint."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': CHECKPOINT_VERSION, 'sheet': sheet_key, 'date': day,
+                   'scanned_rows': scanned_rows, 'open': open_entries}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def read_open_entries(worksheet, checkpoint, today):
+    """
+    Returns ({person_name: entry_row}, used_rows, rows_read) for today's entries without an
+    exit time, reading only the rows the checkpoint does not already cover.
+    """
+    if checkpoint and checkpoint['date'] == today:
+        open_entries = dict(checkpoint['open'])
+        start = checkpoint['scanned_rows'] + 1
+    elif checkpoint:
+        # A new day: nothing before the checkpoint can be from today
+        open_entries = {}
+        start = checkpoint['scanned_rows'] + 1
+    else:
+        open_entries = {}
+        start = FIRST_DATA_ROW
+
+    start = max(start, FIRST_DATA_ROW)
+    anchor = 1 if start > FIRST_DATA_ROW else 0 # The last checkpointed row is read again
+    exit_start = min([start] + list(open_entries.values()))
+    names_dates, exit_times = worksheet.batch_get([f"A{start - anchor}:B", f"D{exit_start}:D"])
+    if anchor:
+        if not _cell(names_dates, 0, 0):
+            # The sheet shrank since the checkpoint was taken (rows deleted by hand)
+            return read_open_entries(worksheet, None, today)
+        names_dates = names_dates[1:]
+    used_rows = start - 1 + len(names_dates)
+
+    # Rows that were open at the checkpoint may have been closed since
+    for person_name, row_index in list(open_entries.items()):
+        if _cell(exit_times, row_index - exit_start, 0):
+            del open_entries[person_name]
+
+    for offset in range(len(names_dates)):
+        row_index = start + offset
+        person_name = _cell(names_dates, offset, 0)
+        if not person_name or _cell(names_dates, offset, 1) != today:
+            continue
+        # Each person's latest row today decides: a closed row after their open one means they left
+        if _cell(exit_times, row_index - exit_start, 0):
+            if open_entries.get(person_name, row_index) < row_index:
+                del open_entries[person_name]
+        else:
+            open_entries[person_name] = row_index # A later open row wins over an earlier one
+
+    return open_entries, used_rows, len(names_dates)
+
+
+def _cell(values, row, col):
+    """Value at (row, col) of a batch_get range, or '' where the API trimmed empty cells."""
+    if row < len(values) and col < len(values[row]):
+        return values[row][col]
+    return ''
+
+
+def apply_pending_events(open_entries, pending_events, today):
+    """Folds journaled events the sheet has not received yet into open_entries."""
+    for kind, person_name, row_index, values in pending_events:
+        if kind == 'entry':
+            if values[1] == today:
+                open_entries[person_name] = row_index
+        elif open_entries.get(person_name) == row_index:
+            del open_entries[person_name]
+    return open_entries
+
+
+def recover_attendance(worksheet, attendance_book, pending_events, checkpoint_path, sheet_key):
+    """
+    Restores who is IN from today's rows in the sheet plus the journaled events still
+    waiting to be written, as returned by pending_events(). Used as the SheetWriter restore
+    callback. Returns the number of used sheet rows, or None if the sheet could not be read.
+    """
+    today = date.today().strftime("%Y-%m-%d")
+    try:
+        checkpoint = load_checkpoint(checkpoint_path, sheet_key)
+        open_entries, used_rows, rows_read = read_open_entries(worksheet, checkpoint, today)
+    except Exception as e:
+        print(f"WARNING: Could not recover attendance state from Google Sheets ({e}). People already IN may be logged again.")
+        return None
+
+    try:
+        save_checkpoint(checkpoint_path, sheet_key, today, used_rows, open_entries)
+    except OSError as e:
+        print(f"WARNING: Could not write attendance checkpoint '{checkpoint_path}': {e}")
+
+    # Sightings may be logged while the sheet is read: the pending events are taken under the book's lock
+    attendance_book.restore_open_entries(lambda: apply_pending_events(open_entries, pending_events(), today))
+    print(f"Attendance state recovered: {len(open_entries)} people currently IN ({rows_read} sheet rows read).")
+    return used_rows
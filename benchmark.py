@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import face_cache
+from face_gallery import FaceGallery
+from face_tracker import FaceTracker
+from detection_control import DetectionController
+from motion_gate import MotionGate
+from recognizer import FrameRecognizer, STAGES
+from recognition_profiles import make_profile
+from attendance import AttendanceBook
+from attendance_journal import AttendanceJournal
+from sheet_writer import SheetWriter, SHEET_HEADER
+from fake_sheets import FakeWorksheet
+from config import (
+    AUTHORIZED_FACES_DIR, FACE_CACHE_DIR, FACE_RECOGNITION_TOLERANCE, GALLERY_INDEX,
+    GALLERY_MATCH_MODE, GALLERY_MAX_EXEMPLARS, RECOGNITION_PROFILES, RECOGNITION_PROFILE,
+    TRACK_REFRESH_INTERVAL_SECONDS, TRACK_CONFIDENT_DISTANCE, DETECTION_SCALE, DETECT_EVERY_N_FRAMES,
+    MOTION_PIXEL_THRESHOLD, MOTION_MIN_CHANGED_FRACTION, MOTION_WARM_DOWN_SECONDS, MOTION_IDLE_CHECK_FPS,
+)
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# --- Recognition Benchmark ---
+# Plays recorded video or synthetic frames through the same detection -> tracking ->
+# encoding -> matching -> attendance pipeline idk.py runs, with an in-memory stand-in
+# for the Google Sheet. Each gallery size runs in a fresh process so peak RSS is
+# measured per run. Results are written as JSON for comparing commits:
+#   python benchmark.py --video door.mp4 --gallery-sizes 10 1000 50000 --output before.json
+#   python benchmark.py --video door.mp4 --gallery-sizes 10 1000 50000 --compare before.json
+# Recognition profiles are compared by running each of them on the same frames:
+#   python benchmark.py --video door.mp4 --gallery-sizes 1000 --profiles fast balanced accurate
+# Frames are decoded (or built) one at a time, so long recordings do not have to fit in memory.
+# --motion-gate puts idk.py's motion gate in front of recognition, timed by the video (--fps)
+# rather than the wall clock, since frames are played as fast as they can be processed.
+DEFAULT_GALLERY_SIZES = [10, 100, 1000, 10000, 50000]
+DEFAULT_SYNTHETIC_FRAMES = 200
+DEFAULT_VIDEO_FPS = 30.0
+SYNTHETIC_FRAME_SIZE = (480, 640) # height, width, like the webcam in idk.py
+PERCENTILES = (50, 90, 99)
+
+
+# --- Frame Sources ---
+def iter_video_frames(paths, max_frames):
+    """Yields up to max_frames frames decoded from the given video files, in order."""
+    remaining = max_frames
+    for path in paths:
+        video_capture = cv2.VideoCapture(path)
+        if not video_capture.isOpened():
+            raise RuntimeError(f"Could not open video '{path}'")
+        try:
+            while remaining > 0:
+                ret, frame = video_capture.read()
+                if not ret:
+                    break
+                remaining -= 1
+                yield frame
+        finally:
+            video_capture.release()
+
+
+def iter_synthetic_frames(faces_dir, count, seed=0):
+    """
+    Yields frames built by pasting the authorized face photos onto a noisy background.
+    Each face stays on screen for a few dozen frames and drifts slightly, like a
+    person walking up to the door, followed by some empty frames.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = SYNTHETIC_FRAME_SIZE
+    photos = []
+    for filename in sorted(os.listdir(faces_dir)):
+        if filename.lower().endswith(face_cache.IMAGE_EXTENSIONS):
+            photo = cv2.imread(os.path.join(faces_dir, filename))
+            if photo is not None:
+                scale = min(height * 0.6 / photo.shape[0], width * 0.5 / photo.shape[1])
+                photos.append(cv2.resize(photo, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+
+    background = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    visit_length = 40
+    for i in range(count):
+        frame = background.copy()
+        visit, step = divmod(i, visit_length)
+        if photos and step < visit_length * 3 // 4: # The last quarter of each visit is an empty corridor
+            photo = photos[visit % len(photos)]
+            top = (height - photo.shape[0]) // 2
+            left = min(max((width - photo.shape[1]) // 2 + step - visit_length // 2, 0), width - photo.shape[1])
+            frame[top:top + photo.shape[0], left:left + photo.shape[1]] = photo
+        yield frame
+
+
+def synthetic_encodings(count, reference, seed=0):
+    """Random encodings with the per-dimension mean/std of the real gallery, far from any real face."""
+    rng = np.random.default_rng(seed)
+    if len(reference) >= 2:
+        mean, std = reference.mean(axis=0), reference.std(axis=0) + 1e-3
+    else:
+        mean, std = np.zeros(128), np.full(128, 0.1)
+    return rng.normal(mean, std, size=(count, 128))
+
+
+# --- One Benchmark Run ---
+def _percentiles_ms(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000.0
+    summary = {f"p{p}_ms": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary['mean_ms'] = round(float(values.mean()), 3)
+    summary['count'] = len(samples)
+    return summary
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def run_once(settings, gallery_size, profile_name):
+    """Runs every frame through the pipeline with a gallery of gallery_size faces. Returns a result dict."""
+    import dlib
+
+    if settings['videos']:
+        frames = iter_video_frames(settings['videos'], settings['max_frames'])
+    else:
+        frames = iter_synthetic_frames(AUTHORIZED_FACES_DIR, settings['synthetic_frames'])
+
+    names, encodings = face_cache.load_encodings(AUTHORIZED_FACES_DIR, FACE_CACHE_DIR)
+    names, encodings = list(names)[:gallery_size], np.asarray(encodings)[:gallery_size]
+    padding = gallery_size - len(names)
+    if padding > 0:
+        encodings = np.concatenate([encodings, synthetic_encodings(padding, np.asarray(encodings))])
+        names += [f"Synthetic {i:05d}" for i in range(padding)]
+    gallery = FaceGallery(names, encodings, tolerance=FACE_RECOGNITION_TOLERANCE, index=settings['index'],
+                          match_mode=GALLERY_MATCH_MODE, max_exemplars=GALLERY_MAX_EXEMPLARS)
+    profile = make_profile(profile_name, RECOGNITION_PROFILES)
+
+    worksheet = FakeWorksheet([SHEET_HEADER], latency=settings['sheet_latency'])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal = AttendanceJournal(os.path.join(tmp_dir, "journal.db"))
+        sheet_writer = SheetWriter(worksheet, flush_interval=0.5, journal=journal)
+        sheet_writer.start()
+        attendance_book = AttendanceBook(sheet_writer, settings['cooldown'])
+        for person_name in names:
+            attendance_book.add_person(person_name)
+
+        if settings['no_tracking']:
+            face_tracker = FaceTracker(refresh_interval=0.0, unknown_retry_interval=0.0)
+        else:
+            face_tracker = FaceTracker(refresh_interval=TRACK_REFRESH_INTERVAL_SECONDS, confident_distance=TRACK_CONFIDENT_DISTANCE)
+        detection_controller = DetectionController(scale=settings['scale'], detect_every=settings['detect_every'])
+        frame_count = 0
+        motion_gate = None
+        if settings['motion_gate']:
+            motion_gate = MotionGate(pixel_threshold=MOTION_PIXEL_THRESHOLD, min_changed_fraction=MOTION_MIN_CHANGED_FRACTION,
+                                     warm_down_seconds=MOTION_WARM_DOWN_SECONDS, idle_check_fps=MOTION_IDLE_CHECK_FPS,
+                                     clock=lambda: frame_count / settings['fps'])
+
+        stage_samples = {stage: [] for stage in STAGES}
+        recognizer = FrameRecognizer(dlib.get_frontal_face_detector(), gallery, attendance_book, face_tracker,
+                                     detection_controller, on_stage=lambda stage, seconds: stage_samples[stage].append(seconds),
+                                     motion_gate=motion_gate, profile=profile)
+
+        # Decoding is part of the measured time, as it is at the door
+        start = time.perf_counter()
+        for frame in frames:
+            recognizer(frame)
+            frame_count += 1
+        wall_seconds = time.perf_counter() - start
+
+        sheet_writer.stop() # Flush, so the sheet call count covers every event
+        journal.close()
+
+    events = sheet_writer.events_written
+    faces_per_second = profile.faces_per_second
+    return {
+        'profile': profile_name,
+        'gallery_size': gallery_size,
+        'frames': frame_count,
+        'wall_seconds': round(wall_seconds, 3),
+        'fps': round(frame_count / wall_seconds, 2) if wall_seconds else None,
+        'motion_duty_cycle': round(motion_gate.duty_cycle, 3) if motion_gate else None,
+        'motion_wake_ups': motion_gate.wake_ups if motion_gate else None,
+        'stages': {stage: _percentiles_ms(samples) for stage, samples in stage_samples.items()},
+        'encodes': face_tracker.encodes_done.count,
+        'encodes_avoided': face_tracker.encodes_avoided.count,
+        'encodes_per_second': round(face_tracker.encodes_done.count / wall_seconds, 2) if wall_seconds else None,
+        'encode_faces_per_second': round(faces_per_second, 2) if faces_per_second else None,
+        'encode_ms_per_face': round(1000.0 / faces_per_second, 3) if faces_per_second else None,
+        'attendance_events': events,
+        'sheet_calls': dict(worksheet.calls),
+        'sheet_calls_per_event': round(worksheet.total_calls / events, 3) if events else None,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+# --- Reporting ---
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_run(run):
+    frame = run['stages']['frame'] or {}
+    stage_p50 = ", ".join(f"{stage} {summary['p50_ms']:.1f}ms" for stage, summary in run['stages'].items()
+                          if summary and stage != 'frame')
+    print(f"{run['profile']:>10} gallery {run['gallery_size']:>6}: {run['fps']} fps | frame p50 {frame.get('p50_ms')}ms"
+          f" p99 {frame.get('p99_ms')}ms | {stage_p50} | {run['encodes_per_second']} encodes/s"
+          f" ({run['encode_ms_per_face']} ms/face)"
+          f" | {run['sheet_calls_per_event']} sheet calls/event | peak RSS {run['peak_rss_mb']} MB"
+          + (f" | motion duty cycle {run['motion_duty_cycle'] * 100:.1f}%" if run.get('motion_duty_cycle') is not None else ""))
+
+
+def compare(previous, current):
+    """Prints FPS and frame latency changes per profile and gallery size against a previous results file."""
+    # Results written before profiles existed ran face_recognition's defaults, i.e. "balanced"
+    before = {(run.get('profile', 'balanced'), run['gallery_size']): run for run in previous['runs']}
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for run in current['runs']:
+        old = before.get((run['profile'], run['gallery_size']))
+        if not old or not old['fps'] or not run['fps']:
+            continue
+        old_p50 = (old['stages']['frame'] or {}).get('p50_ms')
+        new_p50 = (run['stages']['frame'] or {}).get('p50_ms')
+        line = f"{run['profile']:>10} gallery {run['gallery_size']:>6}: fps {old['fps']} -> {run['fps']} ({(run['fps'] / old['fps'] - 1) * 100:+.1f}%)"
+        if old_p50 and new_p50:
+            line += f" | frame p50 {old_p50} -> {new_p50}ms ({(new_p50 / old_p50 - 1) * 100:+.1f}%)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recognition pipeline without a camera or Google Sheet.")
+    parser.add_argument('--video', action='append', default=[], help="Recorded video file (repeatable)")
+    parser.add_argument('--max-frames', type=int, default=1000, help="Frames to read from the videos")
+    parser.add_argument('--synthetic-frames', type=int, default=DEFAULT_SYNTHETIC_FRAMES,
+                        help="Synthetic frames built from authorized_faces when no --video is given")
+    parser.add_argument('--gallery-sizes', type=int, nargs='+', default=DEFAULT_GALLERY_SIZES)
+    parser.add_argument('--index', default=GALLERY_INDEX, help="Gallery index: brute, faiss-flat or faiss-hnsw")
+    parser.add_argument('--profiles', nargs='+', default=[RECOGNITION_PROFILE], choices=sorted(RECOGNITION_PROFILES),
+                        help="Recognition profiles to compare")
+    parser.add_argument('--scale', type=float, default=DETECTION_SCALE)
+    parser.add_argument('--detect-every', type=int, default=DETECT_EVERY_N_FRAMES)
+    parser.add_argument('--no-tracking', action='store_true', help="Encode every face on every frame")
+    parser.add_argument('--motion-gate', action='store_true', help="Skip recognition while nothing moves, as idk.py does")
+    parser.add_argument('--fps', type=float, default=DEFAULT_VIDEO_FPS, help="Frame rate the motion gate assumes for the frames")
+    parser.add_argument('--cooldown', type=float, default=1.0, help="Attendance cooldown in seconds")
+    parser.add_argument('--sheet-latency', type=float, default=0.0, help="Simulated seconds per Sheets API call")
+    parser.add_argument('--output', default="benchmark_results.json")
+    parser.add_argument('--compare', help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    settings = {
+        'videos': args.video, 'max_frames': args.max_frames, 'synthetic_frames': args.synthetic_frames,
+        'index': args.index, 'scale': args.scale, 'detect_every': args.detect_every,
+        'no_tracking': args.no_tracking, 'motion_gate': args.motion_gate, 'fps': args.fps, 'cooldown': args.cooldown, 'sheet_latency': args.sheet_latency,
+    }
+    results = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': settings,
+        'runs': [],
+    }
+
+    for profile_name in args.profiles:
+        for gallery_size in args.gallery_sizes:
+            # A fresh process per run keeps peak RSS and warm caches from leaking between runs
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                run = executor.submit(run_once, settings, gallery_size, profile_name).result()
+            results['runs'].append(run)
+            print_run(run)
+
+    if len(args.profiles) > 1:
+        print("\nProfile throughput (largest gallery):")
+        largest = max(args.gallery_sizes)
+        for run in results['runs']:
+            if run['gallery_size'] == largest:
+                print(f"  {run['profile']:>10}: {run['fps']} fps, {run['encode_faces_per_second']} faces/s encoded"
+                      f" ({make_profile(run['profile'], RECOGNITION_PROFILES).describe()})")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import time
+
+from enrollment import BulkImport, DEFAULT_BULK_BATCH_SIZE, DEFAULT_MAX_IMAGE_SIDE
+from config import AUTHORIZED_FACES_DIR, GALLERY_INBOX_DIR
+
+# --- Bulk Enrollment ---
+# Imports a folder or ZIP archive of photos named after each person, e.g.
+#   python bulk_enroll.py new_hires/            (jane_doe.jpg, jane_doe__2.jpg, john_smith.png, ...)
+#   python bulk_enroll.py site_photos.zip --workers 8
+# Every photo must show exactly one face. Results go to a CSV report; running the
+# same command again after an interruption skips the photos already in the report.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll many faces at once from a folder or ZIP archive.")
+    parser.add_argument('source', help="Folder (searched recursively) or ZIP archive of photos")
+    parser.add_argument('--report', help="CSV report, also used to resume (default: <source>.enroll_report.csv)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU core)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BULK_BATCH_SIZE,
+                        help="Faces written to the gallery per batch")
+    parser.add_argument('--max-side', type=int, default=DEFAULT_MAX_IMAGE_SIDE,
+                        help="Photos are downscaled to this longest side before detection")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing report and process every photo again")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"ERROR: '{args.source}' does not exist.")
+        return
+    report_path = args.report or f"{args.source.rstrip(os.sep)}.enroll_report.csv"
+
+    bulk_import = BulkImport(args.source, AUTHORIZED_FACES_DIR, GALLERY_INBOX_DIR, report_path,
+                             workers=args.workers, batch_size=args.batch_size, max_side=args.max_side,
+                             resume=not args.restart)
+    print(f"Enrolling faces from '{args.source}' with {bulk_import.workers} workers...")
+    start = time.time()
+
+    def print_progress(progress):
+        handled = sum(count for status, count in progress.items() if status != 'finished')
+        print(f"  {handled} photos handled in {time.time() - start:.0f}s: "
+              + ", ".join(f"{count} {status}" for status, count in sorted(progress.items()) if status != 'finished'))
+
+    try:
+        counts = bulk_import.run(on_progress=print_progress)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Run the same command again to resume; finished photos are listed in '{report_path}'.")
+        return
+
+    elapsed = time.time() - start
+    processed = sum(count for status, count in counts.items() if status != 'already imported')
+    print(f"Done in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} photos/s). Report: '{report_path}'.")
+
+
+if __name__ == '__main__':
+    main()
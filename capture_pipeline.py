@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from collections import deque
+
+# --- Threaded Capture Pipeline ---
+# Camera reads, recognition and rendering run as separate stages so a slow stage
+# never backs frames up behind it:
+#   capture thread  -> frame queue  -> recognition worker -> result queue -> render (main thread)
+# Both queues are bounded and drop their OLDEST item when full, so every stage
+# always works on the freshest data instead of a backlog of stale frames.
+FPS_WINDOW_SECONDS = 5.0
+
+
+class StageStats:
+    """Frame counter for one pipeline stage with a rolling FPS."""
+
+    def __init__(self, name, window_seconds=FPS_WINDOW_SECONDS):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.count = 0
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        """Records that the stage finished one item."""
+        now = time.monotonic()
+        with self._lock:
+            self.count += 1
+            self._times.append(now)
+            while self._times and now - self._times[0] > self.window_seconds:
+                self._times.popleft()
+
+    @property
+    def fps(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._times and now - self._times[0] > self.window_seconds:
+                self._times.popleft()
+            if len(self._times) < 2:
+                return 0.0
+            return (len(self._times) - 1) / max(now - self._times[0], 1e-6)
+
+
+class LatestQueue:
+    """Bounded queue that discards the oldest item instead of blocking the producer."""
+
+    def __init__(self, maxsize=1):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Returns the next item, or None if nothing arrived within timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class CaptureThread(threading.Thread):
+    """Reads frames from a cv2.VideoCapture as fast as the camera delivers them."""
+
+    def __init__(self, video_capture, frame_queue, stop_event):
+        super().__init__(name="capture", daemon=True)
+        self.video_capture = video_capture
+        self.frame_queue = frame_queue
+        self.stop_event = stop_event
+        self.stats = StageStats("capture")
+        self.failed = False
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def latest_frame(self):
+        """Returns the most recently captured frame (or None before the first one)."""
+        with self._lock:
+            return self._latest
+
+    def run(self):
+        while not self.stop_event.is_set():
+            ret, frame = self.video_capture.read()
+            if not ret:
+                print("ERROR: Failed to grab frame from webcam. Stopping capture.")
+                self.failed = True
+                self.stop_event.set()
+                break
+            with self._lock:
+                self._latest = frame
+            self.frame_queue.put(frame)
+            self.stats.tick()
+
+
+class RecognitionWorker(threading.Thread):
+    """Runs process_frame(frame) on the newest captured frame and publishes the result."""
+
+    def __init__(self, process_frame, frame_queue, result_queue, stop_event):
+        super().__init__(name="recognition", daemon=True)
+        self.process_frame = process_frame
+        self.frame_queue = frame_queue
+        self.result_queue = result_queue
+        self.stop_event = stop_event
+        self.stats = StageStats("recognition")
+
+    def run(self):
+        while not self.stop_event.is_set():
+            frame = self.frame_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+            try:
+                result = self.process_frame(frame)
+            except Exception as e:
+                print(f"ERROR in recognition worker: {e}")
+                continue
+            self.result_queue.put(result)
+            self.stats.tick()
+
+
+class CapturePipeline:
+    """Wires the capture thread and recognition worker together; the caller runs the render stage."""
+
+    def __init__(self, video_capture, process_frame=None, frame_queue_size=1, result_queue_size=2):
+        self.stop_event = threading.Event()
+        self.frame_queue = LatestQueue(frame_queue_size)
+        self.result_queue = LatestQueue(result_queue_size)
+        self.capture = CaptureThread(video_capture, self.frame_queue, self.stop_event)
+        self.recognition = RecognitionWorker(process_frame, self.frame_queue, self.result_queue, self.stop_event)
+        self.render_stats = StageStats("render")
+
+    def start(self):
+        """Starts capturing, and recognizing too if process_frame was given."""
+        self.capture.start()
+        if self.recognition.process_frame is not None:
+            self.recognition.start()
+
+    def start_recognition(self, process_frame):
+        """Starts the recognition worker once the recognizer is ready; the camera may already be capturing."""
+        self.recognition.process_frame = process_frame
+        self.recognition.start()
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for thread in (self.capture, self.recognition):
+            if thread.is_alive():
+                thread.join(timeout)
+
+    @property
+    def running(self):
+        return not self.stop_event.is_set()
+
+    def stats_line(self):
+        """One-line summary of per-stage FPS and queue depths."""
+        return (f"capture {self.capture.stats.fps:.1f} fps"
+                f" | frame queue {self.frame_queue.qsize()}/{self.frame_queue.maxsize} (dropped {self.frame_queue.dropped})"
+                f" | recognition {self.recognition.stats.fps:.1f} fps"
+                f" | result queue {self.result_queue.qsize()}/{self.result_queue.maxsize} (dropped {self.result_queue.dropped})"
+                f" | render {self.render_stats.fps:.1f} fps")
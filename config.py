@@ -0,0 +1,115 @@
+import os
+
+import face_cache
+
+# --- Google Sheets API Configuration ---
+# !!! IMPORTANT: REPLACE WITH YOUR GOOGLE SHEET ID !!!
+SHEET_ID = "10rV0z0KIMJh1OKZVuewL8WtH4KR2m9zi3SMc_IoxzdI" # <--- YOUR GOOGLE SHEET ID HERE
+# The path to your service account key JSON file
+SERVICE_ACCOUNT_KEY_PATH = os.path.join(os.path.dirname(__file__), "credentials.json")
+WORKSHEET_NAME = "Sheet1" # Assuming your attendance sheet is named "Sheet1"
+
+# --- Configuration ---
+script_dir = os.path.dirname(__file__)
+AUTHORIZED_FACES_DIR = os.path.join(script_dir, "authorized_faces")
+# Encodings of the authorized faces are cached here between runs
+FACE_CACHE_DIR = face_cache.default_cache_dir(AUTHORIZED_FACES_DIR)
+# Faces enrolled through web_add_face.py are published here and picked up by the running recognizer
+GALLERY_INBOX_DIR = os.path.join(FACE_CACHE_DIR, "inbox")
+GALLERY_UPDATE_POLL_SECONDS = 1.0
+# SHAPE_PREDICTOR_PATH is no longer needed as liveness detection is removed
+# ACCESS_LOG_FILE is defined but not actively written to in this version,
+# as logging goes directly to Google Sheets.
+
+FACE_RECOGNITION_TOLERANCE = 0.55
+# Gallery matching strategy: "brute" (exact, default), "faiss-flat" (exact) or
+# "faiss-hnsw" (approximate, for 10k+ enrolled faces). The faiss modes need `pip install faiss-cpu`.
+GALLERY_INDEX = "brute"
+# People with several photos (jane_doe.jpg, jane_doe__2.jpg, ...) are stored as the centroid of
+# their encodings plus up to GALLERY_MAX_EXEMPLARS of the photos, and matched by the "min"
+# (closest stored encoding) or "mean" (average over them) distance.
+GALLERY_MATCH_MODE = "min"
+GALLERY_MAX_EXEMPLARS = 4
+
+# --- Recognition Profiles ---
+# How faces in the live feed are encoded. "balanced" is face_recognition's default.
+# Run `python benchmark.py --profiles fast balanced accurate` to measure them on your hardware.
+RECOGNITION_PROFILES = {
+    "fast": {"landmark_model": "small", "num_jitters": 1, "max_face_side": 150},
+    "balanced": {"landmark_model": "large", "num_jitters": 1, "max_face_side": None},
+    "accurate": {"landmark_model": "large", "num_jitters": 5, "max_face_side": None},
+}
+# Profile of the single-camera recognizer (idk.py --profile); multi_camera.py takes one per camera
+RECOGNITION_PROFILE = "balanced"
+
+# --- Face Tracking ---
+# A tracked face keeps its identity without re-encoding until this many seconds pass
+TRACK_REFRESH_INTERVAL_SECONDS = 3.0
+# Matches further away than this are treated as unconfident and re-encoded every frame
+TRACK_CONFIDENT_DISTANCE = 0.45
+
+# --- Detection Speed ---
+# Detection runs on a frame downscaled by this factor (1.0 = full 640x480). Faces smaller than
+# roughly 80px / DETECTION_SCALE at full resolution will no longer be detected.
+DETECTION_SCALE = 0.5
+# Run the detector on every Nth frame only; faces are followed by the tracker in between
+DETECT_EVERY_N_FRAMES = 1
+# Set to a number (e.g. 10) to let scale and frame skip adapt to reach this recognition FPS; None disables
+DETECTION_TARGET_FPS = None
+DETECTION_MIN_SCALE = 0.25
+
+# --- Motion Gate ---
+# Skip detection and encoding while nothing moves in front of the camera
+MOTION_GATE_ENABLED = True
+# Per-pixel change (0-255) on an 80x60 thumbnail that counts as motion; raise it for noisy cameras
+MOTION_PIXEL_THRESHOLD = 25
+# Share of the thumbnail that must change; lower is more sensitive (0.002 is about 10 pixels)
+MOTION_MIN_CHANGED_FRACTION = 0.002
+# Keep recognizing this long after the last motion
+MOTION_WARM_DOWN_SECONDS = 3.0
+# How often motion is checked while the gate is closed
+MOTION_IDLE_CHECK_FPS = 5.0
+
+# --- Cooldown Period ---
+# Prevents logging the same person multiple times in quick succession
+# This cooldown applies to both entry and exit actions for a given person.
+COOLDOWN_PERIOD_SECONDS = 10.0 # Recommended: 10-30 seconds
+
+# --- Google Sheets Writer ---
+# Attendance events are queued and written in batches by a background thread
+SHEET_FLUSH_INTERVAL_SECONDS = 2.0 # Maximum delay before queued events are written
+SHEET_BATCH_SIZE = 100 # Maximum events per batch_update call
+SHEET_MAX_BACKOFF_SECONDS = 64.0 # Upper bound for retry backoff when rate limited or offline
+# Local write-ahead journal; every event lands here before it is replicated to the sheet
+ATTENDANCE_JOURNAL_PATH = os.path.join(script_dir, "attendance_journal.db")
+ATTENDANCE_JOURNAL_DURABLE = True # fsync every journal commit so events survive a power cut (False is faster, survives crashes only)
+# Who was IN as of the last start; later starts only read sheet rows appended after it
+ATTENDANCE_CHECKPOINT_PATH = os.path.join(script_dir, "attendance_checkpoint.json")
+# Binary snapshot of the full attendance state (incl. cooldown timers), saved on exit and reused on a same-day restart
+ATTENDANCE_SNAPSHOT_PATH = os.path.join(script_dir, "attendance_state.npz")
+
+# --- Pipeline ---
+# How often per-stage FPS and queue depths are printed
+PIPELINE_STATS_INTERVAL_SECONDS = 30.0
+
+# --- Headless Mode ---
+# Run without an OpenCV window or keyboard polling (also: python idk.py --headless); stop with SIGINT/SIGTERM
+HEADLESS = False
+# Optional MJPEG preview at http://<PREVIEW_HOST>:<PREVIEW_PORT>/, only rendered while a client is connected; None disables
+PREVIEW_PORT = None
+PREVIEW_HOST = "127.0.0.1"
+PREVIEW_FPS = 2.0
+
+# --- Metrics and Profiling ---
+# Per-stage latency histograms in Prometheus format at http://127.0.0.1:<port>/metrics; None disables
+METRICS_PORT = 9108
+# Draw p50/p99 stage latencies under the "Currently IN" counter (toggle with 'm' while running)
+METRICS_OVERLAY = False
+# SIGUSR1 starts a sampling profiler, a second SIGUSR1 writes collapsed stacks (flame graph input) here
+PROFILE_OUTPUT_DIR = os.path.join(script_dir, "profiles")
+
+# --- Multi-Camera Server (multi_camera.py) ---
+# Worker processes for detection and encoding; None uses one per CPU core minus one
+CAMERA_WORKERS = None
+# Shared-memory frame buffers per camera; a camera drops frames while all of its buffers are in use
+CAMERA_FRAME_SLOTS = 2
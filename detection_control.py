@@ -0,0 +1,103 @@
+import time
+
+import cv2
+
+# --- Detection Resolution & Frame-Skip Control ---
+# The dlib HOG detector's cost grows with the pixel count, so detecting on a
+# downscaled grayscale frame is the cheapest speed-up available. Boxes found on
+# the small frame are mapped back to full resolution so encoding still sees the
+# full-quality face. Between detections the face tracker's last boxes are reused.
+#
+# With a target FPS set, the controller adapts both knobs to the current CPU:
+# when too slow it first lowers the scale, then detects less often; when there is
+# headroom it undoes those steps in reverse order.
+SCALE_STEP = 0.125
+ADJUST_INTERVAL_SECONDS = 1.0
+SLOW_MARGIN = 0.9  # Below 90% of the target FPS: degrade
+FAST_MARGIN = 1.3  # Above 130% of the target FPS: restore quality
+EMA_WEIGHT = 0.2
+
+
+def downscale(image, scale):
+    """Resizes an image by a scale factor (no copy when scale is 1)."""
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def scale_rects_to_full(rects, scale, frame_shape):
+    """Maps dlib rectangles found on a downscaled frame to (top, right, bottom, left) boxes at full resolution."""
+    height, width = frame_shape[:2]
+    boxes = []
+    for rect in rects:
+        top = max(int(rect.top() / scale), 0)
+        right = min(int(rect.right() / scale), width - 1)
+        bottom = min(int(rect.bottom() / scale), height - 1)
+        left = max(int(rect.left() / scale), 0)
+        boxes.append((top, right, bottom, left))
+    return boxes
+
+
+def detect_faces(detector, frame, scale):
+    """Runs the dlib detector on a downscaled grayscale copy of a BGR frame. Returns full-resolution boxes."""
+    small_frame = downscale(frame, scale)
+    gray_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
+    return scale_rects_to_full(detector(gray_frame, 0), scale, frame.shape)
+
+
+class DetectionController:
+    """Decides on which frames to run detection and at what scale, optionally adapting to a target FPS."""
+
+    def __init__(self, scale=1.0, detect_every=1, target_fps=None, min_scale=0.25, max_skip=6):
+        self.scale = scale
+        self.detect_every = max(int(detect_every), 1)
+        self.target_fps = target_fps
+        self.min_scale = min_scale
+        self.max_scale = scale # Adaptive mode never goes above the configured scale
+        self.max_skip = max_skip
+        self.frame_time = None # Exponential moving average of seconds per processed frame
+        self._frame_index = 0
+        self._last_adjust = time.monotonic()
+
+    def should_detect(self):
+        """True if the detector should run on the current frame. Call once per frame."""
+        detect = self._frame_index % self.detect_every == 0
+        self._frame_index += 1
+        return detect
+
+    def record_frame(self, seconds):
+        """Feeds back how long a frame took and adapts scale and skip rate if a target FPS is set."""
+        if self.frame_time is None:
+            self.frame_time = seconds
+        else:
+            self.frame_time += EMA_WEIGHT * (seconds - self.frame_time)
+
+        if not self.target_fps:
+            return
+        now = time.monotonic()
+        if now - self._last_adjust < ADJUST_INTERVAL_SECONDS:
+            return
+        self._last_adjust = now
+
+        fps = 1.0 / max(self.frame_time, 1e-6)
+        if fps < self.target_fps * SLOW_MARGIN:
+            if self.scale - SCALE_STEP >= self.min_scale - 1e-9:
+                self.scale = round(self.scale - SCALE_STEP, 3)
+            elif self.detect_every < self.max_skip:
+                self.detect_every += 1
+            else:
+                return
+            print(f"DETECTION: {fps:.1f} fps below target {self.target_fps}. Now {self.stats_line()}.")
+        elif fps > self.target_fps * FAST_MARGIN:
+            if self.detect_every > 1:
+                self.detect_every -= 1
+            elif self.scale + SCALE_STEP <= self.max_scale + 1e-9:
+                self.scale = round(self.scale + SCALE_STEP, 3)
+            else:
+                return
+            print(f"DETECTION: {fps:.1f} fps above target {self.target_fps}. Now {self.stats_line()}.")
+
+    def stats_line(self):
+        """One-line summary of the current detection settings."""
+        fps = 1.0 / self.frame_time if self.frame_time else 0.0
+        return f"scale {self.scale:.3f}, detecting every {self.detect_every} frame(s), {fps:.1f} fps"
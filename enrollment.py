@@ -0,0 +1,413 @@
+import csv
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import face_cache
+import face_updates
+
+# --- Face Enrollment ---
+# Turns an uploaded photo into an authorized face. A 12 MP phone photo is decoded
+# straight from memory, downscaled so its longest side is at most max_side pixels,
+# checked for exactly one face and encoded. The downscaled JPEG is what gets stored,
+# so the recognizer's face cache would compute the same encoding from it.
+# The work runs in a pool of worker processes, so web requests return immediately and
+# enrollment throughput scales with the number of cores.
+# BulkImport does the same for a whole directory or ZIP archive of photos (bulk_enroll.py,
+# /bulk_upload), publishing to the recognizer inbox once per batch. The face cache itself is
+# only ever written by the recognizer (or apply_pending_to_cache when it starts), never from here.
+DEFAULT_MAX_IMAGE_SIDE = 1024
+DEFAULT_MAX_PENDING_JOBS = 64
+DEFAULT_KEEP_FINISHED_JOBS = 500
+JPEG_QUALITY = 92
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+DEFAULT_BULK_BATCH_SIZE = 200
+REPORT_FIELDS = ['source', 'name', 'status', 'message']
+
+
+def face_filename(person_name, sample=None):
+    """'Jane Doe' -> 'jane_doe.jpg' (or 'jane_doe__2.jpg' for sample '2'), the inverse of face_cache.person_name_from_filename."""
+    stem = person_name.strip().replace(' ', '_').lower()
+    if sample:
+        stem += face_cache.SAMPLE_SEPARATOR + str(sample).strip().replace(' ', '_').lower()
+    return f"{stem}.jpg"
+
+
+def next_sample_filename(faces_dir, person_name):
+    """Filename for another photo of person_name: the main photo if there is none yet, else the first free 'name__<n>.jpg'."""
+    filename = face_filename(person_name)
+    sample = 1
+    while os.path.exists(os.path.join(faces_dir, filename)):
+        sample += 1
+        filename = face_filename(person_name, sample)
+    return filename
+
+
+def decode_image(data, max_side=DEFAULT_MAX_IMAGE_SIDE):
+    """Decodes image bytes into a BGR array no larger than max_side on its longest side. Returns None if unreadable."""
+    import cv2 # Imported here, like face_recognition, so importing this module stays cheap for the web server
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) # Applies EXIF orientation
+    if image is None:
+        return None
+    longest_side = max(image.shape[:2])
+    if max_side and longest_side > max_side:
+        scale = max_side / longest_side
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def encode_face_photo(data, max_side=DEFAULT_MAX_IMAGE_SIDE):
+    """
+    Checks that a photo shows exactly one face and encodes it. Runs in a worker process.
+    Returns {'ok': bool, 'message': str, 'encoding': ndarray or None, 'jpeg': bytes or None}.
+    """
+    # Imported here so the web server process itself never loads the dlib models
+    import cv2
+    import face_recognition
+
+    image = decode_image(data, max_side)
+    if image is None:
+        return {'ok': False, 'message': "The file is not a readable image.", 'encoding': None, 'jpeg': None}
+
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = face_recognition.face_locations(rgb_image)
+    if len(face_locations) > 1:
+        return {'ok': False, 'message': "Multiple faces detected in the photo. Please upload a photo with only one face.",
+                'encoding': None, 'jpeg': None}
+    if len(face_locations) == 0:
+        return {'ok': False, 'message': "No face detected in the photo. Please upload a clearer photo.",
+                'encoding': None, 'jpeg': None}
+
+    encoding = face_recognition.face_encodings(rgb_image, face_locations)[0]
+    ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        return {'ok': False, 'message': "Could not re-encode the photo as JPEG.", 'encoding': None, 'jpeg': None}
+    return {'ok': True, 'message': "Face detected.", 'encoding': encoding, 'jpeg': jpeg.tobytes()}
+
+
+def load_models():
+    """Loads OpenCV and the dlib models in a worker process ahead of its first photo."""
+    import cv2
+    import face_recognition
+
+
+def encode_face_file(path, max_side=DEFAULT_MAX_IMAGE_SIDE):
+    """encode_face_photo for a file on disk, read inside the worker process."""
+    with open(path, 'rb') as f:
+        return encode_face_photo(f.read(), max_side)
+
+
+def _write_face_image(faces_dir, filename, jpeg):
+    """Atomically writes a face photo, so the recognizer never loads a half-written file."""
+    final_path = os.path.join(faces_dir, filename)
+    tmp_path = os.path.join(faces_dir, f".{filename}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(jpeg)
+    os.replace(tmp_path, final_path)
+    return final_path
+
+
+def save_face(faces_dir, inbox_dir, filename, jpeg, encoding):
+    """Atomically stores an enrolled photo and announces its encoding to a running recognizer."""
+    final_path = _write_face_image(faces_dir, filename, jpeg)
+    face_updates.publish_face(inbox_dir, filename, encoding)
+    return final_path
+
+
+class EnrollmentQueue:
+    """
+    Bounded queue of enrollment jobs processed by a process pool. Successful jobs are
+    saved from the parent process, so only one process ever writes the faces folder.
+    If a worker dies (e.g. killed for running out of memory on a huge photo), the jobs
+    that were in the broken pool fail and the next submit starts a new pool.
+    """
+
+    def __init__(self, faces_dir, inbox_dir, workers=None, max_pending=DEFAULT_MAX_PENDING_JOBS,
+                 max_side=DEFAULT_MAX_IMAGE_SIDE, keep_finished=DEFAULT_KEEP_FINISHED_JOBS):
+        self.faces_dir = faces_dir
+        self.inbox_dir = inbox_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_side = max_side
+        self.keep_finished = keep_finished
+        self._executor = None # Created on first use, so importing this module never starts processes
+        self._jobs = OrderedDict() # job_id -> job dict, oldest first
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # Extra photos pick their filename and save it in one step
+
+    def _get_executor(self):
+        """The process pool, created on first use. Caller holds self._lock."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _discard_executor(self, executor):
+        """Drops a broken process pool so the next job gets a new one. Caller holds self._lock."""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            print("Web Error: An enrollment worker process died. Starting new workers for the next jobs.")
+
+    def warm_up(self):
+        """Starts the worker processes and loads their models in the background, so the first upload does not wait for them."""
+        with self._lock:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(load_models)
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job['status'] not in (STATUS_DONE, STATUS_FAILED))
+
+    def submit(self, person_name, data, extra=False):
+        """
+        Queues a photo for person_name, replacing their main photo or, with extra=True, adding
+        another photo of them. Returns the job id, or None if the queue is full.
+        """
+        with self._lock:
+            if self._pending_count() >= self.max_pending:
+                return None
+            executor = self._get_executor()
+            try:
+                future = executor.submit(encode_face_photo, data, self.max_side)
+            except BrokenProcessPool:
+                # The pool broke since the last job finished; its callbacks may not have run yet
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(encode_face_photo, data, self.max_side)
+            job_id = uuid.uuid4().hex[:12]
+            self._jobs[job_id] = {'id': job_id, 'name': person_name, 'extra': extra, 'status': STATUS_QUEUED,
+                                  'message': "Waiting for a worker.", 'submitted': time.time(), 'finished': None}
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finish(job_id, f, executor))
+        return job_id
+
+    def _finish(self, job_id, future, executor):
+        person_name, extra = self._jobs[job_id]['name'], self._jobs[job_id]['extra']
+        try:
+            result = future.result()
+            if result['ok']:
+                with self._save_lock:
+                    filename = next_sample_filename(self.faces_dir, person_name) if extra else face_filename(person_name)
+                    replaced = os.path.exists(os.path.join(self.faces_dir, filename))
+                    path = save_face(self.faces_dir, self.inbox_dir, filename, result['jpeg'], result['encoding'])
+                status = STATUS_DONE
+                if extra:
+                    message = f"Successfully added a photo of '{person_name}' ({filename})."
+                else:
+                    message = f"Successfully {'replaced' if replaced else 'added'} '{person_name}'."
+                print(f"Web: Added '{person_name}' to local authorized faces at {path}")
+            else:
+                status, message = STATUS_FAILED, result['message']
+        except BrokenProcessPool:
+            status, message = STATUS_FAILED, "The worker processing this photo stopped unexpectedly. Please try again."
+            with self._lock:
+                self._discard_executor(executor)
+        except Exception as e:
+            status, message = STATUS_FAILED, f"An error occurred during processing: {e}"
+            print(f"Web Error: {e}")
+
+        with self._lock:
+            self._jobs[job_id].update(status=status, message=message, finished=time.time())
+            self._futures.pop(job_id, None)
+            # Forget the oldest finished jobs
+            finished = [jid for jid, job in self._jobs.items() if job['finished'] is not None]
+            for old_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+                del self._jobs[old_id]
+
+    def status(self, job_id):
+        """A copy of the job dict, or None for an unknown job id."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            future = self._futures.get(job_id)
+        if job['status'] == STATUS_QUEUED and future is not None and future.running():
+            job['status'] = STATUS_PROCESSING
+            job['message'] = "Detecting and encoding the face."
+        return job
+
+    def recent(self, limit=20):
+        """The most recent jobs, newest first."""
+        with self._lock:
+            job_ids = list(self._jobs)[-limit:]
+        return [job for job in (self.status(job_id) for job_id in reversed(job_ids)) if job is not None]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+# --- Bulk Import ---
+def iter_photo_sources(source):
+    """
+    Yields (key, person_name, path_or_member) for every photo in a directory (recursively)
+    or ZIP archive, in a stable order. key identifies the photo in the report.
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for member in sorted(archive.namelist()):
+                basename = os.path.basename(member)
+                if member.endswith('/') or basename.startswith('.') or member.startswith('__MACOSX/'):
+                    continue
+                if basename.lower().endswith(face_cache.IMAGE_EXTENSIONS):
+                    yield member, face_cache.person_name_from_filename(basename), member
+        return
+
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for filename in sorted(files):
+            if filename.lower().endswith(face_cache.IMAGE_EXTENSIONS) and not filename.startswith('.'):
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, source), face_cache.person_name_from_filename(filename), path
+
+
+def read_report_keys(report_path):
+    """Sources already recorded in a report, so an interrupted import can resume after them."""
+    if not os.path.exists(report_path):
+        return set()
+    with open(report_path, 'r', newline='') as f:
+        return {row['source'] for row in csv.DictReader(f)}
+
+
+class BulkImport:
+    """
+    Imports a directory or ZIP archive of photos named after each person ('jane_doe.jpg',
+    with extra photos as 'jane_doe__2.jpg' or 'jane_doe__glasses.png').
+    Photos stream through a process pool, at most a few per worker in flight. Accepted faces
+    are written to the faces folder and published to the recognizer inbox once per batch,
+    and every photo gets a row in a CSV report. The report doubles as the resume log: a
+    photo is only listed after its batch has been committed, and listed photos are skipped
+    when the same import is run again. skipped lists (key, message) for uploads that never
+    made it into source, so they are reported too.
+    """
+
+    def __init__(self, source, faces_dir, inbox_dir, report_path, workers=None,
+                 batch_size=DEFAULT_BULK_BATCH_SIZE, max_side=DEFAULT_MAX_IMAGE_SIDE, resume=True, skipped=()):
+        self.source = source
+        self.faces_dir = faces_dir
+        self.inbox_dir = inbox_dir
+        self.report_path = report_path
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_side = max_side
+        self.resume = resume
+        self.skipped = list(skipped)
+        self.counts = Counter()
+        self.finished = False
+        self._batch = {} # filename -> (key, person_name, jpeg, encoding)
+        self._report = None
+        self._report_file = None
+
+    def progress(self):
+        """Counts per status so far, e.g. {'added': 120, 'no face': 3}."""
+        return dict(self.counts, finished=self.finished)
+
+    def run(self, on_progress=None):
+        """Imports everything and returns the per-status counts."""
+        already_done = read_report_keys(self.report_path) if self.resume else set()
+        new_report = not already_done
+        os.makedirs(self.faces_dir, exist_ok=True)
+        archive = zipfile.ZipFile(self.source) if zipfile.is_zipfile(self.source) else None
+        claimed = {} # Face filename -> source key, to catch two sources of the same photo (jane_doe.jpg, jane_doe.png)
+        in_flight = {}
+
+        with open(self.report_path, 'w' if new_report else 'a', newline='') as self._report_file, \
+                ProcessPoolExecutor(max_workers=self.workers) as executor:
+            self._report = csv.writer(self._report_file)
+            if new_report:
+                self._report.writerow(REPORT_FIELDS)
+            for key, message in self.skipped:
+                if key not in already_done:
+                    self._record(key, face_cache.person_name_from_filename(os.path.basename(key)), "skipped", message)
+            try:
+                for key, person_name, location in iter_photo_sources(self.source):
+                    if key in already_done:
+                        self.counts['already imported'] += 1
+                        continue
+                    # Extra photos keep their sample suffix, so only the same photo twice is a duplicate
+                    filename = face_filename(person_name, face_cache.sample_from_filename(os.path.basename(key)))
+                    if filename in claimed:
+                        self._record(key, person_name, "duplicate", f"Same photo as '{claimed[filename]}', skipped.")
+                        continue
+                    claimed[filename] = key
+
+                    if archive is not None:
+                        future = executor.submit(encode_face_photo, archive.read(location), self.max_side)
+                    else:
+                        future = executor.submit(encode_face_file, location, self.max_side)
+                    in_flight[future] = (key, person_name, filename)
+
+                    # Keep a few photos per worker queued, not the whole archive in memory
+                    if len(in_flight) >= self.workers * 4:
+                        self._collect(in_flight, FIRST_COMPLETED, on_progress)
+                self._collect(in_flight, None, on_progress)
+                self._commit_batch()
+            finally:
+                if archive is not None:
+                    archive.close()
+
+        self.finished = True
+        if on_progress:
+            on_progress(self.progress())
+        return dict(self.counts)
+
+    def _collect(self, in_flight, return_when, on_progress):
+        """Waits for some (FIRST_COMPLETED) or all (None) in-flight photos and handles their results."""
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=return_when or ALL_COMPLETED)
+        for future in done:
+            key, person_name, filename = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self._record(key, person_name, "error", str(e))
+                continue
+            if not result['ok']:
+                self._record(key, person_name, "rejected", result['message'])
+                continue
+            self._batch[filename] = (key, person_name, result['jpeg'], result['encoding'])
+            if len(self._batch) >= self.batch_size:
+                self._commit_batch()
+                if on_progress:
+                    on_progress(self.progress())
+
+    def _commit_batch(self):
+        """Writes the photos of a batch, then publishes their encodings to the inbox, then writes its report rows."""
+        if not self._batch:
+            return
+        statuses = {}
+        for filename, (_, _, jpeg, _) in self._batch.items():
+            statuses[filename] = "replaced" if os.path.exists(os.path.join(self.faces_dir, filename)) else "added"
+            _write_face_image(self.faces_dir, filename, jpeg)
+
+        encodings = {filename: encoding for filename, (_, _, _, encoding) in self._batch.items()}
+        # Picked up by a running recognizer, or applied to the face cache when it next starts
+        face_updates.publish_faces(self.inbox_dir, encodings)
+
+        for filename, (key, person_name, _, _) in self._batch.items():
+            self._record(key, person_name, statuses[filename], "Face detected and encoded.", flush=False)
+        self._report_file.flush()
+        os.fsync(self._report_file.fileno())
+        self._batch = {}
+
+    def _record(self, key, person_name, status, message, flush=True):
+        self._report.writerow([key, person_name, status, message])
+        self.counts[status] += 1
+        if flush:
+            self._report_file.flush()
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# --- Face Encoding Cache ---
+# Encoding a face means running the HOG detector plus the 128-d ResNet on every
+# image, which takes minutes for a few hundred people. The results are kept on
+# disk next to the gallery so a restart only re-encodes images that changed:
+#   encodings.npy  - (N, 128) matrix, row i belongs to manifest entry i
+#   manifest.json  - filename, person name, mtime, size and SHA-1 for each row
+# The matrix is memory-mapped while it is read, and the map is dropped before anything is
+# returned or the files are replaced: Windows cannot replace a file that is still mapped.
+CACHE_DIR_NAME = ".face_cache"
+ENCODINGS_FILE = "encodings.npy"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+ENCODING_SIZE = 128
+# Extra photos of the same person: 'dakshesh_sharma__glasses.jpg', 'dakshesh_sharma__2.jpg'
+SAMPLE_SEPARATOR = "__"
+
+
+def person_name_from_filename(filename):
+    """Turns 'dakshesh_sharma.jpg' (or 'dakshesh_sharma__2.jpg') into the display name 'Dakshesh Sharma'."""
+    stem = os.path.splitext(filename)[0].split(SAMPLE_SEPARATOR)[0]
+    return stem.replace("_", " ").title()
+
+
+def sample_from_filename(filename):
+    """Returns the sample suffix of an extra photo ('2' for 'dakshesh_sharma__2.jpg'), or None for the main photo."""
+    stem = os.path.splitext(filename)[0]
+    return stem.split(SAMPLE_SEPARATOR, 1)[1] if SAMPLE_SEPARATOR in stem else None
+
+
+def default_cache_dir(faces_dir):
+    """Returns the cache directory used for a given authorized faces folder."""
+    return os.path.join(faces_dir, CACHE_DIR_NAME)
+
+
+def _file_sha1(path):
+    """Returns the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_image(image_path):
+    """Returns the first face encoding found in an image, or None."""
+    # Imported here so a fully warm cache never has to load the dlib models.
+    import face_recognition
+
+    image = face_recognition.load_image_file(image_path)
+    encodings = face_recognition.face_encodings(image)
+    if len(encodings) > 0:
+        return encodings[0]
+    return None
+
+
+def _load_store(cache_dir, mmap=True):
+    """Reads the manifest and (memory-maps) the encodings matrix. Returns ([], None, {}) if missing or unreadable."""
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    encodings_path = os.path.join(cache_dir, ENCODINGS_FILE)
+    if not (os.path.exists(manifest_path) and os.path.exists(encodings_path)):
+        return [], None, {}
+
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            print("Face cache format changed. Rebuilding cache.")
+            return [], None, {}
+        entries = manifest['entries']
+        encodings = np.load(encodings_path, mmap_mode='r' if mmap else None)
+        if encodings.shape != (len(entries), ENCODING_SIZE):
+            print("WARNING: Face cache is inconsistent with its manifest. Rebuilding cache.")
+            return [], None, {}
+        return entries, encodings, manifest.get('skipped', {})
+    except (OSError, ValueError, KeyError) as e:
+        print(f"WARNING: Could not read face cache ({e}). Rebuilding cache.")
+        return [], None, {}
+
+
+def _save_store(cache_dir, entries, encodings, skipped):
+    """Atomically replaces the manifest and encodings matrix on disk."""
+    os.makedirs(cache_dir, exist_ok=True)
+    encodings_path = os.path.join(cache_dir, ENCODINGS_FILE)
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+
+    # Write to temporary files first so a crash never leaves a half-written cache.
+    tmp_encodings_path = encodings_path + ".tmp.npy"
+    np.save(tmp_encodings_path, encodings)
+    tmp_manifest_path = manifest_path + ".tmp"
+    with open(tmp_manifest_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'entries': entries, 'skipped': skipped}, f, indent=1)
+
+    os.replace(tmp_encodings_path, encodings_path)
+    os.replace(tmp_manifest_path, manifest_path)
+
+
+def load_encodings(faces_dir, cache_dir=None, with_filenames=False):
+    """
+    Returns (names, encodings) for every image in faces_dir, plus the image filenames if
+    with_filenames is set. A person with several photos appears once per photo.
+    Unchanged images are served from the on-disk cache, new or modified images
+    are re-encoded and images that were deleted are dropped from the cache.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(faces_dir)
+
+    entries, cached_encodings, cached_skipped = _load_store(cache_dir)
+    cached_by_filename = {entry['filename']: (row, entry) for row, entry in enumerate(entries)}
+
+    new_entries = []
+    rows = [] # Either a row index into cached_encodings or a freshly computed encoding
+    skipped = {}
+    changed = False
+    reused = 0
+    encoded = 0
+
+    for filename in sorted(os.listdir(faces_dir)):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image_path = os.path.join(faces_dir, filename)
+        stat = os.stat(image_path)
+        person_name = person_name_from_filename(filename)
+
+        cached = cached_by_filename.pop(filename, None)
+        previously_skipped = cached_skipped.get(filename)
+
+        # Fast path: same size and mtime means the file has not been touched.
+        if cached and cached[1]['mtime'] == stat.st_mtime and cached[1]['size'] == stat.st_size:
+            row, entry = cached
+            new_entries.append(dict(entry, name=person_name))
+            rows.append(row)
+            reused += 1
+            continue
+        if previously_skipped and previously_skipped['mtime'] == stat.st_mtime and previously_skipped['size'] == stat.st_size:
+            skipped[filename] = previously_skipped
+            continue
+
+        # The file was touched. Only re-encode if its contents actually changed.
+        sha1 = _file_sha1(image_path)
+        changed = True
+        entry = {'filename': filename, 'name': person_name, 'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': sha1}
+        if cached and cached[1]['sha1'] == sha1:
+            new_entries.append(entry)
+            rows.append(cached[0])
+            reused += 1
+            continue
+        if previously_skipped and previously_skipped['sha1'] == sha1:
+            skipped[filename] = entry
+            continue
+
+        try:
+            encoding = _encode_image(image_path)
+        except Exception as e:
+            print(f"ERROR: Could not process '{filename}': {e}")
+            continue
+        if encoding is None:
+            print(f"WARNING: No face found in '{filename}'. Skipping this image.")
+            skipped[filename] = entry
+            continue
+
+        new_entries.append(entry)
+        rows.append(np.asarray(encoding, dtype=np.float64))
+        encoded += 1
+        print(f"Encoded '{person_name}' from '{filename}'.")
+
+    removed = len(cached_by_filename)
+    if removed or set(cached_skipped) - set(skipped):
+        changed = True
+    for filename in cached_by_filename:
+        print(f"Removed '{filename}' from face cache (image deleted).")
+
+    if not changed and cached_encodings is not None:
+        print(f"Face cache up to date: {reused} encodings loaded from '{cache_dir}'.")
+        return _result(new_entries, np.array(cached_encodings), with_filenames) # A copy, so the map is released
+
+    encodings = np.empty((len(rows), ENCODING_SIZE), dtype=np.float64)
+    for i, row in enumerate(rows):
+        encodings[i] = cached_encodings[row] if isinstance(row, int) else row
+    del cached_encodings # Unmap encodings.npy before _save_store replaces it
+
+    try:
+        _save_store(cache_dir, new_entries, encodings, skipped)
+    except OSError as e:
+        print(f"WARNING: Could not write face cache to '{cache_dir}': {e}")
+    print(f"Face cache updated: {reused} reused, {encoded} encoded, {removed} removed.")
+    return _result(new_entries, encodings, with_filenames)
+
+
+def _result(entries, encodings, with_filenames):
+    names = [entry['name'] for entry in entries]
+    if with_filenames:
+        return names, encodings, [entry['filename'] for entry in entries]
+    return names, encodings
+
+
+def apply_updates(faces_dir, cache_dir, upserts, removals):
+    """
+    Writes encodings computed elsewhere (e.g. by the enrollment server) into the cache,
+    so the next start does not re-encode those images.
+    upserts maps image filename -> encoding; removals is a collection of image filenames.
+    """
+    entries, cached_encodings, skipped = _load_store(cache_dir, mmap=False) # The file is replaced below
+    new_entries = []
+    rows = []
+
+    for row, entry in enumerate(entries):
+        if entry['filename'] in removals or entry['filename'] in upserts:
+            continue
+        new_entries.append(entry)
+        rows.append(cached_encodings[row])
+
+    for filename, encoding in upserts.items():
+        image_path = os.path.join(faces_dir, filename)
+        if not os.path.exists(image_path):
+            continue # The image will be picked up (and encoded) by the next full load
+        stat = os.stat(image_path)
+        skipped.pop(filename, None)
+        new_entries.append({'filename': filename, 'name': person_name_from_filename(filename),
+                            'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': _file_sha1(image_path)})
+        rows.append(np.asarray(encoding, dtype=np.float64))
+    for filename in removals:
+        skipped.pop(filename, None)
+
+    encodings = np.array(rows, dtype=np.float64).reshape(-1, ENCODING_SIZE)
+    try:
+        _save_store(cache_dir, new_entries, encodings, skipped)
+    except OSError as e:
+        print(f"WARNING: Could not write face cache to '{cache_dir}': {e}")
@@ -0,0 +1,329 @@
+import threading
+
+import numpy as np
+
+# --- Face Gallery Matcher ---
+# compare_faces + face_distance rebuild an array from the Python list and scan the
+# whole gallery twice for every face. FaceGallery keeps the encodings as one
+# contiguous float32 matrix with precomputed squared norms, so every face in a
+# frame is matched with a single matrix product:
+#   |q - g|^2 = |q|^2 + |g|^2 - 2 q.g
+# For very large galleries an optional nearest-neighbour index can be used instead.
+#
+# A person may have several sample encodings (e.g. photos with and without glasses).
+# Each identity is stored as consecutive rows: the centroid of its samples followed by
+# up to max_exemplars of the samples, picked to be far apart. A person with a single
+# sample is stored as just that sample. Distances to every row come out of the same
+# matrix product and are reduced per identity with one reduceat call:
+#   match_mode "min"  - distance to the closest of the identity's rows (default)
+#   match_mode "mean" - mean distance over the identity's rows
+#
+# Faces can be added, replaced or removed while the recognizer is running. Updates
+# build a new snapshot and swap it in with one assignment, so a match that is in
+# progress keeps using the old snapshot and the frame loop never waits.
+INDEX_BRUTE = "brute"        # Exact, batched matrix product (default)
+INDEX_FLAT = "faiss-flat"    # Exact, faiss IndexFlatL2 (SIMD, multi-threaded)
+INDEX_HNSW = "faiss-hnsw"    # Approximate, faiss HNSW graph; near-constant latency at 10k+ faces
+INDEX_TYPES = (INDEX_BRUTE, INDEX_FLAT, INDEX_HNSW)
+
+MATCH_MIN = "min"
+MATCH_MEAN = "mean"
+MATCH_MODES = (MATCH_MIN, MATCH_MEAN)
+DEFAULT_MAX_EXEMPLARS = 4
+
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 64
+FAISS_CANDIDATE_ROWS = 16 # Rows fetched per face before reducing per identity, when people have several rows
+
+
+def identity_rows(samples, max_exemplars=DEFAULT_MAX_EXEMPLARS):
+    """
+    Rows stored for one person: their only sample, or the centroid of their samples
+    followed by up to max_exemplars samples chosen by farthest-point sampling.
+    """
+    samples = np.asarray(samples, dtype=np.float32).reshape(-1, 128)
+    if len(samples) == 1:
+        return samples
+    centroid = samples.mean(axis=0)
+    chosen = []
+    spread = np.linalg.norm(samples - centroid, axis=1) # Distance of each sample to the closest row kept so far
+    for _ in range(min(max_exemplars, len(samples))):
+        pick = int(np.argmax(spread))
+        if spread[pick] == 0.0:
+            break # The remaining samples duplicate rows already kept
+        chosen.append(pick)
+        spread = np.minimum(spread, np.linalg.norm(samples - samples[pick], axis=1))
+    return np.concatenate([centroid[None, :], samples[chosen]])
+
+
+class _GallerySnapshot:
+    """Immutable view of the gallery contents used by one match call."""
+    __slots__ = ('names', 'encodings', 'sq_norms', 'index', 'rows', 'starts', 'counts', 'multi_row')
+
+    def __init__(self, names, blocks, index_type, encodings=None):
+        """blocks holds the rows of each identity in names; encodings may pass them already stacked."""
+        self.names = list(names)
+        self.counts = np.fromiter((len(block) for block in blocks), dtype=np.int64, count=len(blocks))
+        self.starts = np.cumsum(self.counts) - self.counts # First row of each identity
+        if encodings is None:
+            encodings = np.concatenate(blocks) if blocks else np.empty((0, 128), dtype=np.float32)
+        self.encodings = encodings
+        self.sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+        self.index = _build_index(encodings, index_type) if index_type != INDEX_BRUTE else None
+        self.rows = {name: identity for identity, name in enumerate(self.names)}
+        self.multi_row = len(encodings) != len(self.names)
+
+
+class FaceGallery:
+    """Authorized face encodings held as one float32 matrix, matched in batches."""
+
+    def __init__(self, names, encodings, tolerance=0.55, index=INDEX_BRUTE, match_mode=MATCH_MIN,
+                 max_exemplars=DEFAULT_MAX_EXEMPLARS, sample_keys=None):
+        """
+        names and encodings hold one sample per entry; repeated names are several samples of
+        one person. sample_keys (e.g. image filenames) identify samples for later updates.
+        """
+        self._configure(tolerance, index, match_mode, max_exemplars)
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, 128)
+        if len(names) != len(encodings):
+            raise ValueError(f"Got {len(names)} names for {len(encodings)} encodings.")
+        if sample_keys is None:
+            sample_keys = range(len(names))
+        elif len(sample_keys) != len(names):
+            raise ValueError(f"Got {len(sample_keys)} sample keys for {len(names)} names.")
+
+        for name, sample_key, encoding in zip(names, sample_keys, encodings):
+            self._samples.setdefault(name, {})[sample_key] = encoding
+        if len(self._samples) == len(names):
+            # One sample per person: the matrix is used as is, so a shared-memory gallery is never copied
+            self._blocks = {name: encodings[row:row + 1] for row, name in enumerate(names)}
+            self._data = _GallerySnapshot(names, list(self._blocks.values()), index, encodings)
+        else:
+            self._blocks = {name: identity_rows(list(samples.values()), max_exemplars) for name, samples in self._samples.items()}
+            self._data = self._snapshot()
+        if index != INDEX_BRUTE and self._data.index is None:
+            self.index_type = INDEX_BRUTE
+
+    @classmethod
+    def from_rows(cls, names, encodings, row_counts, tolerance=0.55, index=INDEX_BRUTE, match_mode=MATCH_MIN,
+                  max_exemplars=DEFAULT_MAX_EXEMPLARS):
+        """
+        Wraps rows already grouped per person, such as another gallery's names, encodings and
+        row_counts, without copying them; used to share one gallery matrix between processes.
+        The samples behind the rows are not known, so an upsert replaces a person's rows.
+        """
+        gallery = cls.__new__(cls)
+        gallery._configure(tolerance, index, match_mode, max_exemplars)
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, 128)
+        row_counts = np.asarray(row_counts, dtype=np.int64)
+        if len(names) != len(row_counts) or row_counts.sum() != len(encodings):
+            raise ValueError(f"Got {len(names)} names and {int(row_counts.sum())} counted rows for {len(encodings)} encodings.")
+        ends = np.cumsum(row_counts)
+        gallery._blocks = {name: encodings[end - count:end] for name, count, end in zip(names, row_counts, ends)}
+        gallery._data = _GallerySnapshot(names, list(gallery._blocks.values()), index, encodings)
+        if index != INDEX_BRUTE and gallery._data.index is None:
+            gallery.index_type = INDEX_BRUTE
+        return gallery
+
+    def _configure(self, tolerance, index, match_mode, max_exemplars):
+        """Checks and stores the matching settings shared by both constructors."""
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unknown gallery index '{index}'. Expected one of {INDEX_TYPES}.")
+        if match_mode not in MATCH_MODES:
+            raise ValueError(f"Unknown gallery match mode '{match_mode}'. Expected one of {MATCH_MODES}.")
+        self.tolerance = tolerance
+        self.index_type = index
+        self.match_mode = match_mode
+        self.max_exemplars = max_exemplars
+        self._update_lock = threading.Lock() # Serialises writers only; readers never lock
+        self._samples = {} # Person name -> {sample key: encoding}; only used by writers
+
+    def _snapshot(self):
+        return _GallerySnapshot(list(self._blocks), list(self._blocks.values()), self.index_type)
+
+    def __len__(self):
+        return len(self._data.names)
+
+    def __contains__(self, name):
+        return name in self._data.rows
+
+    @property
+    def names(self):
+        """One name per person."""
+        return self._data.names
+
+    @property
+    def encodings(self):
+        """Every stored row: one per single-sample person, centroid plus exemplars for the others."""
+        return self._data.encodings
+
+    @property
+    def row_counts(self):
+        """Number of consecutive rows in encodings that belong to each person in names."""
+        return self._data.counts
+
+    # --- Live updates ---
+    def upsert(self, name, encoding, sample_key=None):
+        """
+        Adds or replaces the sample sample_key of a person. Without a sample_key the encoding
+        replaces all of the person's samples.
+        """
+        self.apply_updates([(name, encoding, sample_key)], [])
+
+    def remove(self, name, sample_key=None):
+        """
+        Removes one sample of a person, or the whole person without a sample_key. A person
+        whose last sample is removed leaves the gallery. Returns False if nothing was removed.
+        """
+        return bool(self.apply_updates([], [(name, sample_key)]))
+
+    def apply_updates(self, upserts, removals):
+        """
+        Applies removals [(name, sample_key)] and then upserts [(name, encoding, sample_key)] as
+        upsert and remove would, but swaps in a single new snapshot. Returns the removals that
+        found something to remove.
+        """
+        upserts = [(name, np.asarray(encoding, dtype=np.float32).reshape(128), sample_key)
+                   for name, encoding, sample_key in upserts]
+        with self._update_lock:
+            changed = set()
+            removed = []
+            for name, sample_key in removals:
+                samples = self._samples.get(name)
+                if samples is None or (sample_key is not None and sample_key not in samples):
+                    continue
+                if sample_key is None or len(samples) == 1:
+                    del self._samples[name]
+                else:
+                    self._samples[name] = {key: encoding for key, encoding in samples.items() if key != sample_key}
+                changed.add(name)
+                removed.append((name, sample_key))
+            for name, encoding, sample_key in upserts:
+                samples = dict(self._samples.get(name, {})) if sample_key is not None else {}
+                samples[sample_key] = encoding
+                self._samples[name] = samples
+                changed.add(name)
+            if not changed:
+                return removed
+
+            for name in changed:
+                if name in self._samples:
+                    self._blocks[name] = identity_rows(list(self._samples[name].values()), self.max_exemplars)
+                else:
+                    self._blocks.pop(name, None)
+            self._data = self._snapshot()
+            return removed
+
+    # --- Matching ---
+    def distances(self, face_encodings):
+        """Returns the (faces x people) matrix of euclidean distances, reduced per person by match_mode."""
+        data = self._data
+        return _reduce(data, _distances(data, face_encodings), self.match_mode)
+
+    def nearest(self, face_encodings, k=1):
+        """Returns (person indices, distances), each of shape (faces, k), sorted by distance."""
+        return _nearest(self._data, face_encodings, k, self.match_mode)
+
+    def match(self, face_encodings):
+        """
+        Matches every face in one pass. Returns a list of (name, distance) per face;
+        name is None when no gallery face is within the tolerance.
+        """
+        data = self._data # One snapshot for the whole call, even if an update lands meanwhile
+        if len(data.names) == 0:
+            return [(None, None) for _ in range(len(face_encodings))]
+
+        results = []
+        indices, _ = _nearest(data, face_encodings, 1, self.match_mode)
+        queries = np.asarray(face_encodings, dtype=np.float64).reshape(-1, 128)
+        for query, (best_index,) in zip(queries, indices):
+            if best_index < 0: # faiss returns -1 when it finds nothing
+                results.append((None, None))
+                continue
+            # Re-check the winner in float64 so the tolerance decision matches face_recognition.face_distance exactly.
+            distance = _identity_distance(data, best_index, query, self.match_mode)
+            name = data.names[best_index] if distance <= self.tolerance else None
+            results.append((name, distance))
+        return results
+
+
+def _distances(data, face_encodings):
+    """(faces x rows) euclidean distances."""
+    queries = np.ascontiguousarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+    sq_dist = np.einsum('ij,ij->i', queries, queries)[:, None] + data.sq_norms[None, :]
+    sq_dist -= 2.0 * (queries @ data.encodings.T)
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return np.sqrt(sq_dist)
+
+
+def _reduce(data, row_distances, match_mode):
+    """Turns (faces x rows) distances into (faces x people) distances."""
+    if not data.multi_row or row_distances.shape[1] == 0:
+        return row_distances
+    if match_mode == MATCH_MEAN:
+        return np.add.reduceat(row_distances, data.starts, axis=1) / data.counts
+    return np.minimum.reduceat(row_distances, data.starts, axis=1)
+
+
+def _identity_distance(data, identity, query, match_mode):
+    """Exact float64 distance from one face to one person."""
+    start = data.starts[identity]
+    rows = data.encodings[start:start + data.counts[identity]].astype(np.float64)
+    distances = np.linalg.norm(rows - query, axis=1)
+    return float(distances.mean() if match_mode == MATCH_MEAN else distances.min())
+
+
+def _nearest(data, face_encodings, k, match_mode):
+    queries = np.ascontiguousarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+    k = min(k, len(data.names))
+    if len(queries) == 0 or k == 0:
+        return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+    if data.index is not None:
+        if not data.multi_row: # Rows are people
+            sq_dist, indices = data.index.search(queries, k)
+            return indices.astype(np.int64), np.sqrt(np.maximum(sq_dist, 0.0))
+        return _nearest_candidates(data, queries, k, match_mode)
+
+    dist = _reduce(data, _distances(data, queries), match_mode)
+    if k == 1:
+        indices = np.argmin(dist, axis=1)[:, None]
+    else:
+        indices = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(dist, indices, axis=1)
+    order = np.argsort(top, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def _nearest_candidates(data, queries, k, match_mode):
+    """faiss search over rows, then the people owning the nearest rows are scored exactly."""
+    owners = np.repeat(np.arange(len(data.names)), data.counts)
+    _, row_indices = data.index.search(queries, min(max(k, FAISS_CANDIDATE_ROWS), len(data.encodings)))
+    indices = np.full((len(queries), k), -1, dtype=np.int64)
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    for i, (query, rows) in enumerate(zip(queries.astype(np.float64), row_indices)):
+        candidates = np.unique(owners[rows[rows >= 0]])
+        scores = np.array([_identity_distance(data, identity, query, match_mode) for identity in candidates])
+        order = np.argsort(scores)[:k]
+        indices[i, :len(order)] = candidates[order]
+        distances[i, :len(order)] = scores[order]
+    return indices, distances
+
+
+def _build_index(encodings, index):
+    """Builds the optional faiss index. Returns None (brute force) if faiss is not installed."""
+    try:
+        import faiss
+    except ImportError:
+        print(f"WARNING: faiss is not installed, gallery index '{index}' unavailable. Using brute-force matching.")
+        return None
+
+    dim = encodings.shape[1]
+    if index == INDEX_HNSW:
+        faiss_index = faiss.IndexHNSWFlat(dim, HNSW_NEIGHBORS)
+        faiss_index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        faiss_index = faiss.IndexFlatL2(dim)
+    if len(encodings) > 0:
+        faiss_index.add(encodings)
+    return faiss_index
@@ -0,0 +1,123 @@
+import itertools
+
+import numpy as np
+
+from capture_pipeline import StageStats
+
+# --- Face Tracker ---
+# Running the 128-d encoding network is the most expensive per-face step, yet a
+# person standing at the door shows up in dozens of consecutive frames. The
+# tracker links detection boxes across frames by IoU overlap and keeps the
+# identity of each track, so a face is only re-encoded when:
+#   - its track is new,
+#   - its identity is not confident (unknown, or distance above confident_distance), or
+#   - refresh_interval seconds have passed since it was last encoded.
+DEFAULT_IOU_THRESHOLD = 0.3
+DEFAULT_MAX_MISSED_FRAMES = 5
+DEFAULT_REFRESH_INTERVAL_SECONDS = 3.0
+DEFAULT_CONFIDENT_DISTANCE = 0.45
+DEFAULT_UNKNOWN_RETRY_SECONDS = 0.5
+
+
+class Track:
+    """One face followed across frames."""
+    __slots__ = ('track_id', 'box', 'name', 'distance', 'last_encoded_time', 'missed')
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box # (top, right, bottom, left)
+        self.name = None
+        self.distance = None
+        self.last_encoded_time = None
+        self.missed = 0
+
+
+def box_iou(boxes_a, boxes_b):
+    """Returns the IoU matrix between two lists of (top, right, bottom, left) boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+class FaceTracker:
+    """Assigns track IDs to detection boxes and decides which faces need a fresh encoding."""
+
+    def __init__(self, iou_threshold=DEFAULT_IOU_THRESHOLD, max_missed=DEFAULT_MAX_MISSED_FRAMES,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL_SECONDS, confident_distance=DEFAULT_CONFIDENT_DISTANCE,
+                 unknown_retry_interval=DEFAULT_UNKNOWN_RETRY_SECONDS):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.refresh_interval = refresh_interval
+        self.confident_distance = confident_distance
+        self.unknown_retry_interval = unknown_retry_interval
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self.encodes_done = StageStats("encodes")
+        self.encodes_avoided = StageStats("encodes-avoided")
+
+    def update(self, boxes):
+        """Associates this frame's boxes with existing tracks. Returns one Track per box, in order."""
+        assigned = [None] * len(boxes)
+        unmatched_tracks = set(range(len(self.tracks)))
+
+        if boxes and self.tracks:
+            iou = box_iou(boxes, [track.box for track in self.tracks])
+            # Greedy association: best overlapping pairs first
+            for flat in np.argsort(-iou, axis=None):
+                box_i, track_i = np.unravel_index(flat, iou.shape)
+                if iou[box_i, track_i] < self.iou_threshold:
+                    break
+                if assigned[box_i] is not None or track_i not in unmatched_tracks:
+                    continue
+                track = self.tracks[track_i]
+                track.box = boxes[box_i]
+                track.missed = 0
+                assigned[box_i] = track
+                unmatched_tracks.discard(track_i)
+
+        for track_i in unmatched_tracks:
+            self.tracks[track_i].missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for box_i, box in enumerate(boxes):
+            if assigned[box_i] is None:
+                track = Track(next(self._ids), box)
+                self.tracks.append(track)
+                assigned[box_i] = track
+        return assigned
+
+    def needs_encoding(self, track, now):
+        """True if the track's identity must be (re)computed from a fresh encoding."""
+        if track.last_encoded_time is None:
+            return True
+        age = now - track.last_encoded_time
+        if track.name is None:
+            return age >= self.unknown_retry_interval
+        if track.distance is not None and track.distance > self.confident_distance:
+            return True
+        return age >= self.refresh_interval
+
+    def set_identity(self, track, name, distance, now):
+        """Stores the result of matching a fresh encoding for this track."""
+        track.name = name
+        track.distance = distance
+        track.last_encoded_time = now
+        self.encodes_done.tick()
+
+    def skip_encoding(self):
+        """Records that a face kept its track's identity without being encoded."""
+        self.encodes_avoided.tick()
+
+    def stats_line(self):
+        """One-line summary of encodes run versus avoided."""
+        return (f"{len(self.tracks)} tracks | encodes {self.encodes_done.fps:.1f}/s"
+                f" | encodes avoided {self.encodes_avoided.fps:.1f}/s"
+                f" (total {self.encodes_done.count} run, {self.encodes_avoided.count} avoided)")
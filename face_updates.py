@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+import face_cache
+
+# --- Live Gallery Updates ---
+# The enrollment server (web_add_face.py) already has the pixels of every new face,
+# so it computes the encoding itself and publishes it to an inbox directory next to
+# the face cache. The running recognizer polls the inbox and applies each update to
+# its gallery in place, without a restart and without re-encoding anything:
+#   <inbox>/<timestamp>_<filename>.npz   - action ('upsert' or 'remove'), image filename, encoding
+#   <inbox>/<timestamp>_batch.npz        - action 'upsert', filenames (N,), encodings (N, 128)
+# Updates are written to a temporary name and renamed into place, so a reader never
+# sees a half-written file.
+INBOX_DIR_NAME = "inbox"
+UPDATE_SUFFIX = ".npz"
+ACTION_UPSERT = "upsert"
+ACTION_REMOVE = "remove"
+DEFAULT_POLL_INTERVAL_SECONDS = 1.0
+
+
+def default_inbox_dir(faces_dir):
+    """Returns the update inbox used for a given authorized faces folder."""
+    return os.path.join(face_cache.default_cache_dir(faces_dir), INBOX_DIR_NAME)
+
+
+def _publish(inbox_dir, action, filename, encoding):
+    os.makedirs(inbox_dir, exist_ok=True)
+    base = f"{time.time_ns()}_{os.path.splitext(filename)[0]}"
+    tmp_path = os.path.join(inbox_dir, f".{base}.tmp.npz")
+    np.savez(tmp_path, action=action, filename=filename, encoding=np.asarray(encoding, dtype=np.float64))
+    os.replace(tmp_path, os.path.join(inbox_dir, base + UPDATE_SUFFIX))
+
+
+def publish_face(inbox_dir, filename, encoding):
+    """Announces a new or replaced authorized face image together with its encoding."""
+    _publish(inbox_dir, ACTION_UPSERT, filename, encoding)
+
+
+def publish_faces(inbox_dir, encodings_by_filename):
+    """Announces many new or replaced faces at once ({filename: encoding}), as a single update file."""
+    if not encodings_by_filename:
+        return
+    os.makedirs(inbox_dir, exist_ok=True)
+    base = f"{time.time_ns()}_batch"
+    tmp_path = os.path.join(inbox_dir, f".{base}.tmp.npz")
+    np.savez(tmp_path, action=ACTION_UPSERT, filenames=np.array(list(encodings_by_filename)),
+             encodings=np.array(list(encodings_by_filename.values()), dtype=np.float64).reshape(-1, face_cache.ENCODING_SIZE))
+    os.replace(tmp_path, os.path.join(inbox_dir, base + UPDATE_SUFFIX))
+
+
+def publish_removal(inbox_dir, filename):
+    """Announces that an authorized face image was deleted."""
+    _publish(inbox_dir, ACTION_REMOVE, filename, np.zeros(face_cache.ENCODING_SIZE))
+
+
+def read_pending_updates(inbox_dir):
+    """
+    Returns [(path, action, filename, encoding)] for every published update, oldest first.
+    A batch file yields one tuple per face, all with the same path.
+    """
+    if not os.path.isdir(inbox_dir):
+        return []
+    updates = []
+    for entry in sorted(os.scandir(inbox_dir), key=lambda e: e.name):
+        if entry.name.startswith('.') or not entry.name.endswith(UPDATE_SUFFIX):
+            continue
+        try:
+            with np.load(entry.path) as data:
+                if 'filenames' in data:
+                    action = str(data['action'])
+                    updates.extend((entry.path, action, str(filename), encoding)
+                                   for filename, encoding in zip(data['filenames'], data['encodings']))
+                else:
+                    updates.append((entry.path, str(data['action']), str(data['filename']), data['encoding']))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"WARNING: Ignoring unreadable gallery update '{entry.name}': {e}")
+            os.remove(entry.path)
+    return updates
+
+
+def apply_pending_to_cache(inbox_dir, faces_dir, cache_dir):
+    """Folds any published updates into the on-disk face cache. Used at startup, before the cache is loaded."""
+    updates = read_pending_updates(inbox_dir)
+    if not updates:
+        return 0
+    upserts, removals = _collapse(updates)
+    face_cache.apply_updates(faces_dir, cache_dir, upserts, removals)
+    _remove_update_files(updates)
+    return len(updates)
+
+
+def _remove_update_files(updates):
+    for path in dict.fromkeys(update[0] for update in updates):
+        os.remove(path)
+
+
+def _collapse(updates):
+    """Reduces a list of updates to the final upserts {filename: encoding} and removals {filename}."""
+    upserts = {}
+    removals = set()
+    for _, action, filename, encoding in updates:
+        if action == ACTION_REMOVE:
+            upserts.pop(filename, None)
+            removals.add(filename)
+        else:
+            removals.discard(filename)
+            upserts[filename] = encoding
+    return upserts, removals
+
+
+class GalleryUpdateWatcher(threading.Thread):
+    """Polls the inbox and applies published face updates to a live FaceGallery."""
+
+    def __init__(self, inbox_dir, faces_dir, cache_dir, gallery, on_person_added=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL_SECONDS):
+        super().__init__(name="gallery-updates", daemon=True)
+        self.inbox_dir = inbox_dir
+        self.faces_dir = faces_dir
+        self.cache_dir = cache_dir
+        self.gallery = gallery
+        self.on_person_added = on_person_added
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"ERROR applying gallery updates: {e}")
+
+    def poll(self):
+        """Applies every pending update once. Returns the number of updates applied."""
+        updates = read_pending_updates(self.inbox_dir)
+        if not updates:
+            return 0
+
+        upserts, removals = _collapse(updates)
+        # Each image is one sample of its person; a person leaves the gallery with their last image.
+        # The whole batch is applied to the gallery at once, so matching sees a single new snapshot.
+        added = {person_name for person_name in map(face_cache.person_name_from_filename, upserts) if person_name not in self.gallery}
+        for person_name in map(face_cache.person_name_from_filename, upserts):
+            # Create attendance state before the face can be matched
+            if self.on_person_added:
+                self.on_person_added(person_name)
+        removed = self.gallery.apply_updates(
+            [(face_cache.person_name_from_filename(filename), encoding, filename) for filename, encoding in upserts.items()],
+            [(face_cache.person_name_from_filename(filename), filename) for filename in removals])
+        for person_name, filename in removed:
+            if person_name in self.gallery:
+                print(f"GALLERY: Removed photo '{filename}' of '{person_name}'.")
+            else:
+                print(f"GALLERY: Removed '{person_name}'.")
+        for filename in upserts:
+            person_name = face_cache.person_name_from_filename(filename)
+            action = "Added" if person_name in added else "Updated"
+            print(f"GALLERY: {action} '{person_name}' ({len(self.gallery)} people).")
+
+        # Persist to the face cache so the next start does not re-encode these images
+        face_cache.apply_updates(self.faces_dir, self.cache_dir, upserts, removals)
+        _remove_update_files(updates)
+        return len(updates)
@@ -0,0 +1,149 @@
+import re
+import time
+from collections import Counter
+
+# --- In-Memory Google Sheets Stand-In ---
+# Implements the subset of the gspread Worksheet API the attendance system uses,
+# so the pipeline can be benchmarked (benchmark.py) without network access or a
+# real sheet. Every call is counted, and an optional per-call latency simulates
+# the round trip to Google.
+_CELL_RE = re.compile(r"^([A-Z]+)(\d*)$")
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index
+
+
+def _parse_range(a1_range):
+    """
+    Parses 'B3' or 'A2:D5' into ((row, col), (row, col)), 1-indexed and inclusive.
+    An open-ended range such as 'A2:B' has None as its last row.
+    """
+    cells = a1_range.split('!')[-1].split(':')
+    parsed = []
+    for cell in cells:
+        match = _CELL_RE.match(cell.upper())
+        if not match:
+            raise ValueError(f"Unsupported range '{a1_range}'")
+        parsed.append((int(match.group(2)) if match.group(2) else None, _column_index(match.group(1))))
+    return parsed[0], parsed[-1]
+
+
+class FakeWorksheet:
+    """gspread Worksheet look-alike that keeps its cells in a dict of rows."""
+
+    def __init__(self, rows=None, row_count=1000, latency=0.0):
+        self.rows = {i + 1: list(row) for i, row in enumerate(rows or [])}
+        self._row_count = row_count
+        self.latency = latency
+        self.calls = Counter()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    @property
+    def row_count(self):
+        return self._row_count # Comes from cached worksheet metadata in gspread, so not counted as a call
+
+    def _cell(self, row, col):
+        cells = self.rows.get(row, [])
+        return cells[col - 1] if len(cells) >= col else ''
+
+    def _set(self, row, col, value):
+        if row > self._row_count:
+            raise ValueError(f"Row {row} exceeds grid limits ({self._row_count} rows)")
+        cells = self.rows.setdefault(row, [])
+        cells.extend([''] * (col - len(cells)))
+        cells[col - 1] = value
+
+    def _write_range(self, a1_range, values):
+        (top, left), _ = _parse_range(a1_range)
+        for row_offset, row_values in enumerate(values):
+            for col_offset, value in enumerate(row_values):
+                self._set(top + row_offset, left + col_offset, value)
+
+    # --- gspread API subset ---
+    def row_values(self, row):
+        self._call('row_values')
+        values = list(self.rows.get(row, []))
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def col_values(self, col):
+        self._call('col_values')
+        values = [self._cell(r, col) for r in range(1, max(self.rows, default=0) + 1)]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def get_all_values(self):
+        self._call('get_all_values')
+        last_row = max(self.rows, default=0)
+        width = max((len(cells) for cells in self.rows.values()), default=0)
+        return [self.rows.get(r, []) + [''] * (width - len(self.rows.get(r, []))) for r in range(1, last_row + 1)]
+
+    def batch_get(self, ranges):
+        self._call('batch_get')
+        results = []
+        for a1_range in ranges:
+            (top, left), (bottom, right) = _parse_range(a1_range)
+            if bottom is None:
+                bottom = max(self.rows, default=0)
+            values = [[self._cell(r, c) for c in range(left, right + 1)] for r in range(top, bottom + 1)]
+            # Like the API, drop trailing empty cells and rows
+            for row_values in values:
+                while row_values and row_values[-1] == '':
+                    row_values.pop()
+            while values and not values[-1]:
+                values.pop()
+            results.append(values)
+        return results
+
+    def update(self, a1_range, values):
+        self._call('update')
+        self._write_range(a1_range, values)
+
+    def update_cell(self, row, col, value):
+        self._call('update_cell')
+        self._set(row, col, value)
+
+    def append_row(self, values, value_input_option='RAW'):
+        self._call('append_row')
+        row = max(self.rows, default=0) + 1
+        self._row_count = max(self._row_count, row)
+        for col, value in enumerate(values, start=1):
+            self._set(row, col, value)
+
+    def append_rows(self, values, value_input_option='RAW', insert_data_option=None, table_range=None):
+        """Appends rows after the last used row and returns the values.append response."""
+        self._call('append_rows')
+        first = max(self.rows, default=0) + 1
+        last = first + len(values) - 1
+        if insert_data_option == 'INSERT_ROWS':
+            self._row_count += len(values)
+        else:
+            self._row_count = max(self._row_count, last)
+        for row_offset, row_values in enumerate(values):
+            for col, value in enumerate(row_values, start=1):
+                self._set(first + row_offset, col, value)
+        last_column = chr(ord('A') + max(len(row_values) for row_values in values) - 1)
+        return {'updates': {'updatedRange': f"Sheet1!A{first}:{last_column}{last}", 'updatedRows': len(values)}}
+
+    def add_rows(self, rows):
+        self._call('add_rows')
+        self._row_count += rows
+
+    def batch_update(self, data, value_input_option='RAW'):
+        self._call('batch_update')
+        for item in data:
+            self._write_range(item['range'], item['values'])
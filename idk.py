@@ -1,308 +1,412 @@
-import face_recognition
 import cv2
-import numpy as np
 import os
 import time
-# scipy.spatial.distance is still implicitly used by face_recognition for face_distance
-import dlib
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import face_cache
+from face_updates import GalleryUpdateWatcher, apply_pending_to_cache
+from face_gallery import FaceGallery
+from capture_pipeline import CapturePipeline
+from sheet_writer import SheetWriter, open_worksheet
+from attendance_journal import AttendanceJournal
+from attendance import AttendanceBook
+from attendance_recovery import recover_attendance
+from face_tracker import FaceTracker
+from detection_control import DetectionController
+from recognizer import FrameRecognizer
+from recognition_profiles import make_profile
+from motion_gate import MotionGate
+from metrics import MetricsRegistry, MetricsServer, InstrumentedWorksheet, SamplingProfiler, StartupTimer, install_profiler_signal
+from preview_stream import MJPEGPreviewServer
 # requests import is removed as Telegram part is removed
-
-# --- Google Sheets API Configuration ---
-# !!! IMPORTANT: REPLACE WITH YOUR GOOGLE SHEET ID !!!
-SHEET_ID = "10rV0z0KIMJh1OKZVuewL8WtH4KR2m9zi3SMc_IoxzdI" # <--- YOUR GOOGLE SHEET ID HERE
-# The path to your service account key JSON file
-SERVICE_ACCOUNT_KEY_PATH = os.path.join(os.path.dirname(__file__), "credentials.json")
-
-# Import gspread and google.oauth2.service_account for Google Sheets
-import gspread
-from google.oauth2.service_account import Credentials
+# face_recognition, dlib and gspread are imported by the startup steps that need them, so
+# importing this module is cheap and the slow imports overlap with each other and the camera
 
 # --- Configuration ---
-script_dir = os.path.dirname(__file__)
-AUTHORIZED_FACES_DIR = os.path.join(script_dir, "authorized_faces")
-# SHAPE_PREDICTOR_PATH is no longer needed as liveness detection is removed
-# ACCESS_LOG_FILE is defined but not actively written to in this version,
-# as logging goes directly to Google Sheets.
-
-FACE_RECOGNITION_TOLERANCE = 0.55
-
-# --- Cooldown Period ---
-# Prevents logging the same person multiple times in quick succession
-# This cooldown applies to both entry and exit actions for a given person.
-COOLDOWN_PERIOD_SECONDS = 10.0 # Recommended: 10-30 seconds
-
-# --- Google Sheets Setup ---
-client = None # Global gspread client
-worksheet = None # Global worksheet object
-try:
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_KEY_PATH, scopes=scopes)
-    client = gspread.authorize(creds)
-    
-    workbook = client.open_by_key(SHEET_ID)
-    worksheet = workbook.worksheet("Sheet1") # Assuming your attendance sheet is named "Sheet1"
-
-    # Check and set headers
-    head = ['Name', 'Date', 'Entry Time', 'Exit Time']
-    current_header = worksheet.row_values(1)
-    if current_header != head:
-        print("Google Sheet headers do not match expected format. Updating headers...")
-        worksheet.update('A1:D1', [head]) # Update the entire header row
-        print("Google Sheet headers updated successfully.")
-    else:
-        print("Google Sheet headers are already correctly set.")
-
-    print(f"Successfully connected to Google Sheet (ID: {SHEET_ID}, Worksheet: Sheet1)")
-
-except FileNotFoundError:
-    print(f"ERROR: Google Sheets credentials file not found at '{SERVICE_ACCOUNT_KEY_PATH}'.")
-    print("Please ensure you've downloaded 'credentials.json' and placed it in the script directory.")
-    exit()
-except Exception as e:
-    print(f"ERROR: Could not connect to Google Sheets or update headers: {e}")
-    print("Please check:")
-    print(f"  - Is the Google Sheet ID '{SHEET_ID}' correct?")
-    print("  - Is the worksheet named 'Sheet1' in your Google Sheet?")
-    print("  - Have you shared the Google Sheet with your service account email (Editor access)?")
-    print("  - Is your internet connection stable?")
-    exit()
-
-# --- Attendance Logging Functions ---
-# This dictionary will hold the state for each known person
-# Format: {person_name: {'is_in': bool, 'entry_row': int or None, 'last_action_time': float}}
-present_individuals = {}
-
-def log_new_entry(person_name, current_dt):
-    """Appends a new entry row to the Google Sheet."""
-    log_date = current_dt.strftime("%Y-%m-%d")
-    log_time = current_dt.strftime("%H:%M:%S")
+# All settings live in config.py, shared with multi_camera.py
+from config import (
+    SHEET_ID, SERVICE_ACCOUNT_KEY_PATH, WORKSHEET_NAME,
+    AUTHORIZED_FACES_DIR, FACE_CACHE_DIR, FACE_RECOGNITION_TOLERANCE, GALLERY_INDEX,
+    GALLERY_MATCH_MODE, GALLERY_MAX_EXEMPLARS, RECOGNITION_PROFILES, RECOGNITION_PROFILE,
+    GALLERY_INBOX_DIR, GALLERY_UPDATE_POLL_SECONDS,
+    TRACK_REFRESH_INTERVAL_SECONDS, TRACK_CONFIDENT_DISTANCE,
+    DETECTION_SCALE, DETECT_EVERY_N_FRAMES, DETECTION_TARGET_FPS, DETECTION_MIN_SCALE,
+    MOTION_GATE_ENABLED, MOTION_PIXEL_THRESHOLD, MOTION_MIN_CHANGED_FRACTION, MOTION_WARM_DOWN_SECONDS, MOTION_IDLE_CHECK_FPS,
+    COOLDOWN_PERIOD_SECONDS,
+    SHEET_FLUSH_INTERVAL_SECONDS, SHEET_BATCH_SIZE, SHEET_MAX_BACKOFF_SECONDS, ATTENDANCE_JOURNAL_PATH,
+    ATTENDANCE_JOURNAL_DURABLE, ATTENDANCE_CHECKPOINT_PATH, ATTENDANCE_SNAPSHOT_PATH,
+    PIPELINE_STATS_INTERVAL_SECONDS,
+    METRICS_PORT, METRICS_OVERLAY, PROFILE_OUTPUT_DIR,
+    HEADLESS, PREVIEW_PORT, PREVIEW_HOST, PREVIEW_FPS,
+)
+
+# --- Metrics ---
+# Latency histograms for every frame-loop stage and Google Sheets call, served at /metrics
+STAGE_METRIC = 'attendance_stage_seconds'
+STAGE_METRIC_HELP = "Time spent in each stage of the frame loop."
+
+
+# --- Command Line ---
+def parse_args():
+    parser = argparse.ArgumentParser(description="Face recognition attendance system for a single camera.")
+    parser.add_argument('--headless', action='store_true', default=HEADLESS,
+                        help="No window, drawing or keyboard polling; stop with Ctrl+C or SIGTERM")
+    parser.add_argument('--preview-port', type=int, default=PREVIEW_PORT,
+                        help="Serve an MJPEG preview on this port, rendered only while a client is connected")
+    parser.add_argument('--profile', default=RECOGNITION_PROFILE, choices=sorted(RECOGNITION_PROFILES),
+                        help="Recognition profile: how faces are encoded (speed vs. accuracy)")
+    return parser.parse_args()
+
+
+# --- Startup Steps ---
+# Sheet authentication, gallery loading and model loading are independent, so they run
+# on a small thread pool while the main thread opens the camera and starts capturing.
+def connect_sheets(metrics_registry):
+    """
+    Opens the worksheet, the local journal and the batched writer, and restores who is IN.
+    If Google Sheets is unreachable the writer starts in journal-only mode and connects later.
+    Returns (attendance_journal, sheet_writer, attendance_book).
+    """
+    def connect():
+        # Every call on the worksheet is timed, so a blocking Sheets request shows up in /metrics
+        return InstrumentedWorksheet(open_worksheet(SHEET_ID, SERVICE_ACCOUNT_KEY_PATH, WORKSHEET_NAME), metrics_registry)
 
     try:
-        # Get the current number of rows to determine the new row index
-        # This is a simple way to get the next row number.
-        # For very high-volume systems, consider more robust row management.
-        all_values = worksheet.get_all_values()
-        new_row_index = len(all_values) + 1 # +1 because sheet rows are 1-indexed
-
-        worksheet.append_row([person_name, log_date, log_time, '']) # Exit Time is blank initially
-        print(f"ATTENDANCE LOG: ENTRY for '{person_name}' recorded to Google Sheet at row {new_row_index} ({log_time} on {log_date}).")
-        return new_row_index # Return the row index for later exit update
+        worksheet = connect()
+    except FileNotFoundError:
+        raise # Missing credentials will not fix themselves
     except Exception as e:
-        print(f"ERROR logging entry for '{person_name}': {e}")
-        return None # Indicate failure
-
-def update_exit_time(person_name, row_index, current_dt):
-    """Updates the 'Exit Time' for a specific row in the Google Sheet."""
-    exit_time = current_dt.strftime("%H:%M:%S")
+        print(f"WARNING: Could not connect to Google Sheets or update headers: {e}")
+        print("Starting in journal-only mode: attendance is kept in the local journal and written to the sheet once it is reachable.")
+        print("If this persists, please check:")
+        print(f"  - Is the Google Sheet ID '{SHEET_ID}' correct?")
+        print(f"  - Is the worksheet named '{WORKSHEET_NAME}' in your Google Sheet?")
+        print("  - Have you shared the Google Sheet with your service account email (Editor access)?")
+        print("  - Is your internet connection stable?")
+        worksheet = None
+
+    # Attendance events are committed to the local journal first, then written to the sheet
+    # in batches from a background thread. Events the sheet has not received yet are replayed here.
+    attendance_journal = AttendanceJournal(ATTENDANCE_JOURNAL_PATH, durable=ATTENDANCE_JOURNAL_DURABLE)
+    attendance_journal.prune()
+    sheet_writer = SheetWriter(worksheet, flush_interval=SHEET_FLUSH_INTERVAL_SECONDS,
+                               batch_size=SHEET_BATCH_SIZE, max_backoff=SHEET_MAX_BACKOFF_SECONDS,
+                               journal=attendance_journal, connect=connect)
+
+    # Tracks who is IN or OUT and turns recognitions into ENTRY/EXIT events for the sheet writer.
+    # People still IN from earlier today are restored from the sheet before the writer starts.
+    # The local snapshot of a same-day restart restores cooldown timers; the sheet stays authoritative for IN/OUT.
+    attendance_book = AttendanceBook(sheet_writer, COOLDOWN_PERIOD_SECONDS)
+    if os.path.exists(ATTENDANCE_SNAPSHOT_PATH):
+        try:
+            saved_at = attendance_book.load_snapshot(ATTENDANCE_SNAPSHOT_PATH)
+            if datetime.fromtimestamp(saved_at).date() != datetime.now().date():
+                attendance_book = AttendanceBook(sheet_writer, COOLDOWN_PERIOD_SECONDS) # Yesterday's state is of no use
+            else:
+                print(f"Attendance snapshot loaded: {len(attendance_book)} people, saved at {datetime.fromtimestamp(saved_at).strftime('%H:%M:%S')}.")
+        except Exception as e:
+            print(f"WARNING: Could not load attendance snapshot '{ATTENDANCE_SNAPSHOT_PATH}': {e}")
+            attendance_book = AttendanceBook(sheet_writer, COOLDOWN_PERIOD_SECONDS)
+    sheet_writer.start(restore=lambda worksheet, pending_events: recover_attendance(
+        worksheet, attendance_book, pending_events, ATTENDANCE_CHECKPOINT_PATH, f"{SHEET_ID}/{WORKSHEET_NAME}"))
+    return attendance_journal, sheet_writer, attendance_book
 
-    try:
-        # Update the 'Exit Time' column (column 4) for the given row_index
-        worksheet.update_cell(row_index, 4, exit_time)
-        print(f"ATTENDANCE LOG: EXIT for '{person_name}' updated in Google Sheet at row {row_index} ({exit_time}).")
-        return True
-    except Exception as e:
-        print(f"ERROR updating exit time for '{person_name}' at row {row_index}: {e}")
-        return False
 
-# --- Load all known faces from the 'authorized_faces' directory ---
-known_face_encodings = []
-known_face_names = []
+def load_known_faces():
+    """Returns (names, encodings, filenames) of the authorized faces, re-encoding only new or changed images."""
+    # Faces enrolled while the recognizer was not running already have their encodings in the inbox
+    applied_updates = apply_pending_to_cache(GALLERY_INBOX_DIR, AUTHORIZED_FACES_DIR, FACE_CACHE_DIR)
+    if applied_updates:
+        print(f"Applied {applied_updates} pending gallery updates from the enrollment server.")
+    return face_cache.load_encodings(AUTHORIZED_FACES_DIR, FACE_CACHE_DIR, with_filenames=True)
 
-print(f"Loading authorized faces from: {AUTHORIZED_FACES_DIR}")
-if not os.path.exists(AUTHORIZED_FACES_DIR):
-    print(f"ERROR: '{AUTHORIZED_FACES_DIR}' directory not found.")
-    print("Please create this folder and place authorized person images inside it.")
-    exit()
 
-for filename in os.listdir(AUTHORIZED_FACES_DIR):
-    if filename.endswith((".jpg", ".jpeg", ".png")):
-        person_name = os.path.splitext(filename)[0]
-        person_name = person_name.replace("_", " ").title()
-        image_path = os.path.join(AUTHORIZED_FACES_DIR, filename)
+def load_detector():
+    """Loads the dlib face detector and the face_recognition models. Returns the detector."""
+    import dlib
+    import face_recognition # Loads the landmark and encoding models used by the recognizer
+    return dlib.get_frontal_face_detector()
 
-        try:
-            image = face_recognition.load_image_file(image_path)
-            encodings = face_recognition.face_encodings(image)
-
-            if len(encodings) > 0:
-                known_face_encodings.append(encodings[0])
-                known_face_names.append(person_name)
-                print(f"Loaded '{person_name}' from '{filename}'.")
-                # Initialize state for each known person
-                present_individuals[person_name] = {'is_in': False, 'entry_row': None, 'last_action_time': 0.0}
-            else:
-                print(f"WARNING: No face found in '{filename}'. Skipping this image.")
-        except Exception as e:
-            print(f"ERROR: Could not process '{filename}': {e}")
-
-if not known_face_encodings:
-    print("ERROR: No authorized faces loaded. Please ensure 'authorized_faces' folder contains images with clear faces.")
-    exit()
-print(f"Successfully loaded {len(known_face_encodings)} authorized faces.")
-
-# --- Dlib Face Detector ---
-print(f"Loading Dlib face detector...")
-try:
-    detector = dlib.get_frontal_face_detector()
-    print("Dlib face detector loaded successfully.")
-except RuntimeError as e:
-    print(f"ERROR loading Dlib face detector: {e}")
-    exit()
 
-# --- Main Program Execution ---
-video_capture = None # Initialize video_capture outside try block
-try:
-    # --- Webcam Initialization (USB Camera) ---
+def open_camera():
+    """Opens the default USB webcam, or returns None if it cannot be opened."""
     video_capture = cv2.VideoCapture(0) # Use 0 for default USB webcam
-
     if not video_capture.isOpened():
-        print("\nERROR: Could not open camera. Please check :")
-        print("  1. If your USB webcam is connected and powered on.")
-        print("  2. If it is not in use by another application.")
-        print("  3. If you have granted camera permissions to your terminal/Python environment (macOS/Linux).")
-        exit()
-
+        return None
     # Set camera resolution (optional, but good for consistency)
     video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    return video_capture
 
-    print(f"\nAttendance system started. Press 'q' to quit.")
-
-    # --- Main loop for live recognition and attendance ---
-    while True:
-        ret, frame = video_capture.read()
-        if not ret:
-            print("ERROR: Failed to grab frame from webcam. Exiting.")
-            break
-
-        small_frame = frame
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        gray_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-
-        current_datetime = datetime.now()
-        current_time_epoch = time.time() # For cooldown calculations
-
-        face_locations_dlib = detector(gray_frame, 0) # Use dlib for face detection
-
-        # --- Face Recognition & Attendance Logic ---
-        # Default display messages if no specific action occurs
-        overall_display_message = "Waiting for Face..."
-        overall_display_color = (0, 255, 255) # Yellow
-
-        # Keep track of who was seen in THIS frame
-        seen_in_this_frame = set()
-
-        if len(face_locations_dlib) > 0:
-            overall_display_message = "Processing Face(s)..."
-            overall_display_color = (0, 165, 255) # Orange
-
-            for dlib_rect in face_locations_dlib:
-                top_d, right_d, bottom_d, left_d = dlib_rect.top(), dlib_rect.right(), dlib_rect.bottom(), dlib_rect.left()
-                face_location_fr = (top_d, right_d, bottom_d, left_d)
-
-                face_encodings_recognition = face_recognition.face_encodings(rgb_small_frame, [face_location_fr])
-
-                display_name_on_box = "Unknown"
-                display_color_on_box = (0, 0, 255) # Red for unknown
-
-                if face_encodings_recognition:
-                    matches = face_recognition.compare_faces(known_face_encodings, face_encodings_recognition[0], tolerance=FACE_RECOGNITION_TOLERANCE)
-                    face_distances = face_recognition.face_distance(known_face_encodings, face_encodings_recognition[0])
-                    best_match_index = np.argmin(face_distances)
-
-                    if matches[best_match_index]:
-                        recognized_person_name = known_face_names[best_match_index]
-                        seen_in_this_frame.add(recognized_person_name) # Mark as seen in this frame
-
-                        person_data = present_individuals[recognized_person_name] # Get their current state
-
-                        # Check cooldown for this person's last action
-                        if (current_time_epoch - person_data['last_action_time']) < COOLDOWN_PERIOD_SECONDS:
-                            # Still in cooldown, just update display
-                            display_name_on_box = f"{recognized_person_name} (Cooldown)"
-                            display_color_on_box = (0, 255, 255) # Yellow
-                            overall_display_message = f"Cooldown: {recognized_person_name}"
-                            overall_display_color = (0, 255, 255) # Yellow
-                        else:
-                            # Not in cooldown, perform action
-                            if not person_data['is_in']: # Person is currently OUT -> ENTRY
-                                new_row_idx = log_new_entry(recognized_person_name, current_datetime)
-                                if new_row_idx:
-                                    present_individuals[recognized_person_name]['is_in'] = True
-                                    present_individuals[recognized_person_name]['entry_row'] = new_row_idx
-                                    present_individuals[recognized_person_name]['last_action_time'] = current_time_epoch
-                                    display_name_on_box = f"ENTRY: {recognized_person_name}"
-                                    display_color_on_box = (0, 255, 0) # Green
-                                    overall_display_message = f"ENTRY: {recognized_person_name}"
-                                    overall_display_color = (0, 255, 0) # Green
-                                else:
-                                    display_name_on_box = f"Entry Failed: {recognized_person_name}"
-                                    display_color_on_box = (0, 0, 255) # Red
-                                    overall_display_message = f"Entry Failed: {recognized_person_name}"
-                                    overall_display_color = (0, 0, 255) # Red
-                            else: # Person is currently IN -> EXIT
-                                if person_data['entry_row'] is not None:
-                                    if update_exit_time(recognized_person_name, person_data['entry_row'], current_datetime):
-                                        present_individuals[recognized_person_name]['is_in'] = False
-                                        present_individuals[recognized_person_name]['entry_row'] = None # Clear for next entry
-                                        present_individuals[recognized_person_name]['last_action_time'] = current_time_epoch
-                                        display_name_on_box = f"EXIT: {recognized_person_name}"
-                                        display_color_on_box = (0, 0, 255) # Red
-                                        overall_display_message = f"EXIT: {recognized_person_name}"
-                                        overall_display_color = (0, 0, 255) # Red
-                                    else:
-                                        display_name_on_box = f"Exit Failed: {recognized_person_name}"
-                                        display_color_on_box = (0, 0, 255) # Red
-                                        overall_display_message = f"Exit Failed: {recognized_person_name}"
-                                        overall_display_color = (0, 0, 255) # Red
-                                else:
-                                    # Inconsistent state: is_in is True but no entry_row. Resetting.
-                                    print(f"WARNING: Inconsistent state for {recognized_person_name}. Resetting to OUT.")
-                                    present_individuals[recognized_person_name]['is_in'] = False
-                                    present_individuals[recognized_person_name]['entry_row'] = None
-                                    display_name_on_box = f"Error State: {recognized_person_name}"
-                                    display_color_on_box = (0, 0, 255) # Red
-                                    overall_display_message = f"Error State: {recognized_person_name}"
-                                    overall_display_color = (0, 0, 255) # Red
-                    else: # Face recognized, but not a known person
-                        display_name_on_box = "Unknown Person"
-                        display_color_on_box = (0, 0, 255) # Red
-                else: # Dlib found a face, but face_recognition couldn't encode it (rare)
-                    display_name_on_box = "Processing Face..."
-                    display_color_on_box = (0, 165, 255) # Orange
-
-                # Draw bounding box and name
-                cv2.rectangle(frame, (left_d, top_d), (right_d, bottom_d), display_color_on_box, 2)
-                cv2.rectangle(frame, (left_d, bottom_d - 35), (right_d, bottom_d), display_color_on_box, cv2.FILLED)
-                font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(frame, display_name_on_box, (left_d + 6, bottom_d - 6), font, 1.0, (255, 255, 255), 1)
+
+def step_result(future):
+    """Result of a finished startup step, or None if it failed or never finished."""
+    if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+# --- Render Stage ---
+def draw_recognition(frame, recognition_result, num_present, overlay_lines=None):
+    """Draws the latest recognition result and system status onto a frame."""
+    face_boxes, overall_display_message, overall_display_color = recognition_result
+
+    for (top_d, right_d, bottom_d, left_d), display_name_on_box, display_color_on_box in face_boxes:
+        # Draw bounding box and name
+        cv2.rectangle(frame, (left_d, top_d), (right_d, bottom_d), display_color_on_box, 2)
+        cv2.rectangle(frame, (left_d, bottom_d - 35), (right_d, bottom_d), display_color_on_box, cv2.FILLED)
+        font = cv2.FONT_HERSHEY_DUPLEX
+        cv2.putText(frame, display_name_on_box, (left_d + 6, bottom_d - 6), font, 1.0, (255, 255, 255), 1)
+
+    # --- Display overall system status ---
+    cv2.putText(frame, overall_display_message, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, overall_display_color, 2)
+
+    # Display count of people currently "IN"
+    cv2.putText(frame, f"Currently IN: {num_present}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+    # p50 / p99 of the recent samples of each stage
+    for i, line in enumerate(overlay_lines or []):
+        cv2.putText(frame, line, (10, 85 + i * 18), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
+# --- Main Program Execution ---
+def main():
+    args = parse_args()
+    startup = StartupTimer()
+    metrics_registry = MetricsRegistry()
+
+    def observe_stage(stage, seconds):
+        metrics_registry.observe(STAGE_METRIC, STAGE_METRIC_HELP, 'stage', stage, seconds)
+
+    print(f"Loading authorized faces from: {AUTHORIZED_FACES_DIR}")
+    if not os.path.exists(AUTHORIZED_FACES_DIR):
+        print(f"ERROR: '{AUTHORIZED_FACES_DIR}' directory not found.")
+        print("Please create this folder and place authorized person images inside it.")
+        return
+
+    # --- Shutdown Signals ---
+    # SIGINT (Ctrl+C) and SIGTERM (systemd, docker stop) end the main loop so cleanup still flushes the sheet writer
+    shutdown_requested = threading.Event()
+
+    def request_shutdown(signum, _frame):
+        print(f"\n{signal.Signals(signum).name} received. Exiting...")
+        shutdown_requested.set()
+
+    signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    startup_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+    sheets_future = None
+    video_capture = None
+    pipeline = None
+    gallery_watcher = None
+    metrics_server = None
+    preview_server = None
+    try:
+        print("Connecting to Google Sheets, loading authorized faces and the Dlib face detector...")
+        sheets_future = startup_pool.submit(startup.run, 'sheets', connect_sheets, metrics_registry)
+        faces_future = startup_pool.submit(startup.run, 'gallery', load_known_faces)
+        detector_future = startup_pool.submit(startup.run, 'models', load_detector)
+
+        # --- Webcam Initialization (USB Camera) ---
+        # The camera opens and starts capturing while the other steps finish
+        video_capture = startup.run('camera', open_camera)
+        if video_capture is None:
+            print("\nERROR: Could not open camera. Please check :")
+            print("  1. If your USB webcam is connected and powered on.")
+            print("  2. If it is not in use by another application.")
+            print("  3. If you have granted camera permissions to your terminal/Python environment (macOS/Linux).")
+            return
+        pipeline = CapturePipeline(video_capture)
+        pipeline.start()
+
+        # --- Google Sheets Setup ---
+        try:
+            attendance_journal, sheet_writer, attendance_book = sheets_future.result()
+        except FileNotFoundError:
+            print(f"ERROR: Google Sheets credentials file not found at '{SERVICE_ACCOUNT_KEY_PATH}'.")
+            print("Please ensure you've downloaded 'credentials.json' and placed it in the script directory.")
+            return
+        except Exception as e:
+            print(f"ERROR: Could not set up attendance logging: {e}")
+            return
+
+        # --- Load all known faces from the 'authorized_faces' directory ---
+        # Encodings are served from the on-disk face cache; only new or changed images are re-encoded.
+        known_face_names, known_face_encodings, known_face_files = faces_future.result()
+        for person_name in known_face_names:
+            # Initialize state for each known person
+            attendance_book.add_person(person_name)
+
+        if len(known_face_names) == 0:
+            print("ERROR: No authorized faces loaded. Please ensure 'authorized_faces' folder contains images with clear faces.")
+            return
+        print(f"Successfully loaded {len(known_face_names)} authorized faces.")
+
+        # All encodings live in one float32 matrix; every face in a frame is matched in a single batch.
+        # Each photo is one sample of its person, keyed by filename so live updates replace the right one.
+        gallery = FaceGallery(known_face_names, known_face_encodings, tolerance=FACE_RECOGNITION_TOLERANCE, index=GALLERY_INDEX,
+                              match_mode=GALLERY_MATCH_MODE, max_exemplars=GALLERY_MAX_EXEMPLARS, sample_keys=known_face_files)
+        print(f"Face gallery ready ({len(gallery)} people, {len(gallery.encodings)} encodings, '{gallery.index_type}' matching).")
+
+        # Faces added or removed through web_add_face.py are applied to the live gallery without a restart
+        gallery_watcher = GalleryUpdateWatcher(GALLERY_INBOX_DIR, AUTHORIZED_FACES_DIR, FACE_CACHE_DIR, gallery,
+                                               on_person_added=attendance_book.add_person,
+                                               poll_interval=GALLERY_UPDATE_POLL_SECONDS)
+        gallery_watcher.start()
+
+        # Keeps identities of faces across frames so they are not re-encoded every frame
+        face_tracker = FaceTracker(refresh_interval=TRACK_REFRESH_INTERVAL_SECONDS, confident_distance=TRACK_CONFIDENT_DISTANCE)
+
+        # Chooses the detection scale and which frames run detection (adapting to DETECTION_TARGET_FPS if set)
+        detection_controller = DetectionController(scale=DETECTION_SCALE, detect_every=DETECT_EVERY_N_FRAMES,
+                                                   target_fps=DETECTION_TARGET_FPS, min_scale=DETECTION_MIN_SCALE)
+
+        # Wakes detection and encoding only while something moves in front of the camera
+        motion_gate = None
+        if MOTION_GATE_ENABLED:
+            motion_gate = MotionGate(pixel_threshold=MOTION_PIXEL_THRESHOLD, min_changed_fraction=MOTION_MIN_CHANGED_FRACTION,
+                                     warm_down_seconds=MOTION_WARM_DOWN_SECONDS, idle_check_fps=MOTION_IDLE_CHECK_FPS)
+
+        # --- Dlib Face Detector ---
+        try:
+            detector = detector_future.result()
+            print("Dlib face detector loaded successfully.")
+        except RuntimeError as e:
+            print(f"ERROR loading Dlib face detector: {e}")
+            return
+
+        # --- Recognition Stage ---
+        # Runs on the recognition worker thread: detection, tracking, encoding, matching and attendance
+        profile = make_profile(args.profile, RECOGNITION_PROFILES)
+        print(f"Recognition profile '{profile.name}': {profile.describe()}.")
+        recognize_frame = FrameRecognizer(detector, gallery, attendance_book, face_tracker, detection_controller,
+                                          on_stage=observe_stage, motion_gate=motion_gate, profile=profile)
+        pipeline.start_recognition(recognize_frame)
+        print(f"STARTUP: {startup.summary()}")
+
+        if args.headless:
+            print(f"\nAttendance system started in headless mode. Stop with Ctrl+C or SIGTERM (pid {os.getpid()}).")
         else:
-            # No faces detected in the current frame
-            overall_display_message = "Waiting for Face..."
-            overall_display_color = (0, 255, 255) # Yellow
-
-
-        # --- Display overall system status ---
-        cv2.putText(frame, overall_display_message, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, overall_display_color, 2)
-        
-        # Display count of people currently "IN"
-        num_present = sum(1 for p_data in present_individuals.values() if p_data['is_in'])
-        cv2.putText(frame, f"Currently IN: {num_present}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-
-        cv2.imshow('Attendance System', frame)
-
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            print("\n'q' pressed. Exiting...")
-            break
-
-finally:
-    # --- Cleanup ---
-    print("\nCleaning up resources...")
-    if video_capture:
-        video_capture.release()
-    
-    cv2.destroyAllWindows()
-    print("Program ended.")
\ No newline at end of file
+            print(f"\nAttendance system started. Press 'q' to quit, 'm' to toggle the stage timing overlay.")
+
+        metrics_registry.gauge('attendance_present_people', "People currently IN.", attendance_book.num_present)
+        metrics_registry.gauge('attendance_gallery_faces', "People in the gallery.", lambda: len(gallery))
+        metrics_registry.gauge('attendance_encode_faces_per_second', "Faces encoded per second of encoding time.",
+                               lambda: profile.faces_per_second)
+        metrics_registry.gauge('attendance_sheet_queued_events', "Attendance events waiting for Google Sheets.", sheet_writer.pending_count)
+        metrics_registry.gauge('attendance_recognition_fps', "Frames recognized per second.", lambda: pipeline.recognition.stats.fps)
+        if motion_gate:
+            metrics_registry.gauge('attendance_motion_duty_cycle', "Share of the time recognition ran since start.", lambda: motion_gate.duty_cycle)
+        metrics_registry.gauge('attendance_dropped_frames', "Frames dropped because recognition was busy.", lambda: pipeline.frame_queue.dropped)
+        if METRICS_PORT:
+            try:
+                metrics_server = MetricsServer(metrics_registry, METRICS_PORT)
+                metrics_server.start()
+                print(f"Metrics available at http://127.0.0.1:{METRICS_PORT}/metrics")
+            except OSError as e:
+                print(f"WARNING: Could not start metrics server on port {METRICS_PORT}: {e}")
+                metrics_server = None
+        profiler = SamplingProfiler(PROFILE_OUTPUT_DIR)
+        if install_profiler_signal(profiler):
+            print(f"Send SIGUSR1 (kill -USR1 {os.getpid()}) to start/stop the sampling profiler.")
+        if args.preview_port:
+            try:
+                preview_server = MJPEGPreviewServer(args.preview_port, PREVIEW_HOST)
+                preview_server.start()
+                print(f"Preview stream available at http://{PREVIEW_HOST}:{args.preview_port}/")
+            except OSError as e:
+                print(f"WARNING: Could not start preview server on port {args.preview_port}: {e}")
+                preview_server = None
+
+        # --- Main loop: capture and recognition run on their own threads, rendering happens here ---
+        show_metrics_overlay = METRICS_OVERLAY
+        latest_result = ([], "Waiting for Face...", (0, 255, 255)) # Yellow
+        last_rendered_frame = None
+        last_stats_time = time.time()
+        next_preview_time = 0.0
+        while pipeline.running and not shutdown_requested.is_set():
+            # Headless there is nothing to redraw, so the loop only wakes for results, stats and the preview
+            new_result = pipeline.result_queue.get(timeout=0.1 if args.headless else 0.005)
+            if new_result is not None:
+                latest_result = new_result
+            overlay_lines = metrics_registry.overlay_lines(STAGE_METRIC) if show_metrics_overlay else None
+
+            # The preview is drawn and JPEG-encoded at PREVIEW_FPS, and only while someone is watching
+            if preview_server and preview_server.client_count > 0 and time.time() >= next_preview_time:
+                next_preview_time = time.time() + 1.0 / PREVIEW_FPS
+                frame = pipeline.capture.latest_frame()
+                if frame is not None:
+                    with metrics_registry.timer(STAGE_METRIC, STAGE_METRIC_HELP, 'stage', 'preview'):
+                        frame = frame.copy()
+                        draw_recognition(frame, latest_result, attendance_book.num_present(), overlay_lines)
+                        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+                    if ok:
+                        preview_server.publish(jpeg.tobytes())
+
+            # Only redraw when the camera or the recognizer produced something new
+            frame = None if args.headless else pipeline.capture.latest_frame()
+            if frame is not None and (frame is not last_rendered_frame or new_result is not None):
+                last_rendered_frame = frame
+                with metrics_registry.timer(STAGE_METRIC, STAGE_METRIC_HELP, 'stage', 'draw'):
+                    frame = frame.copy() # The same frame may still be in use by the recognition stage
+                    draw_recognition(frame, latest_result, attendance_book.num_present(), overlay_lines)
+                with metrics_registry.timer(STAGE_METRIC, STAGE_METRIC_HELP, 'stage', 'imshow'):
+                    cv2.imshow('Attendance System', frame)
+                pipeline.render_stats.tick()
+
+            if time.time() - last_stats_time >= PIPELINE_STATS_INTERVAL_SECONDS:
+                print(f"PIPELINE: {pipeline.stats_line()}")
+                print(f"TRACKER: {face_tracker.stats_line()}")
+                print(f"DETECTION: {detection_controller.stats_line()}")
+                print(f"ENCODING: {profile.stats_line()}")
+                if motion_gate:
+                    print(f"MOTION: {motion_gate.stats_line()}")
+                print(f"SHEETS: {sheet_writer.status_line()} | Currently IN: {attendance_book.num_present()}")
+                last_stats_time = time.time()
+
+            if args.headless:
+                continue
+            with metrics_registry.timer(STAGE_METRIC, STAGE_METRIC_HELP, 'stage', 'waitkey'):
+                key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                print("\n'q' pressed. Exiting...")
+                break
+            if key == ord('m'):
+                show_metrics_overlay = not show_metrics_overlay
+
+    finally:
+        # --- Cleanup ---
+        print("\nCleaning up resources...")
+        if pipeline:
+            pipeline.stop()
+        # Startup steps still running are waited for, so a sheet writer that started late is flushed too
+        startup_pool.shutdown(wait=True)
+        if gallery_watcher:
+            gallery_watcher.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if preview_server:
+            preview_server.stop()
+        if video_capture:
+            video_capture.release()
+        sheets = step_result(sheets_future)
+        if sheets:
+            attendance_journal, sheet_writer, attendance_book = sheets
+            sheet_writer.stop() # Flush attendance events that are still queued
+            try:
+                attendance_book.save_snapshot(ATTENDANCE_SNAPSHOT_PATH)
+            except OSError as e:
+                print(f"WARNING: Could not save attendance snapshot '{ATTENDANCE_SNAPSHOT_PATH}': {e}")
+            attendance_journal.close()
+
+        if not args.headless:
+            cv2.destroyAllWindows()
+        print("Program ended.")
+
+
+if __name__ == '__main__':
+    main()
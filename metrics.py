@@ -0,0 +1,299 @@
+import bisect
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Hot-Path Metrics ---
+# Timers around every stage of the frame loop and every Google Sheets call feed
+# histograms that are cheap to update (one bisect and a few additions under a lock).
+# They are exposed in Prometheus text format on a local HTTP endpoint:
+#   curl http://127.0.0.1:9108/metrics
+# Each histogram also keeps its most recent samples, so the kiosk overlay can show
+# current percentiles rather than averages since startup.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 256
+DEFAULT_PROFILE_INTERVAL_SECONDS = 0.005
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram plus a rolling window of recent samples."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, recent_samples=RECENT_SAMPLES):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1) # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=recent_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+
+    def percentile(self, p):
+        """p-th percentile (0-100) of the recent samples, or None if there are none."""
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return None
+        return recent[min(int(len(recent) * p / 100.0), len(recent) - 1)]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.bucket_counts), self.count, self.sum
+
+
+class _Timer:
+    """Context manager that observes the elapsed time of its block into a histogram."""
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Named histograms with one label each (e.g. attendance_stage_seconds{stage="detect"})
+    and gauges read from callbacks at scrape time.
+    """
+
+    def __init__(self):
+        self._histograms = {} # metric name -> (help, label name, {label value: Histogram})
+        self._gauges = {} # metric name -> (help, callback)
+        self._lock = threading.Lock()
+
+    def histogram(self, metric, help_text, label, value):
+        with self._lock:
+            _, _, series = self._histograms.setdefault(metric, (help_text, label, {}))
+            if value not in series:
+                series[value] = Histogram()
+            return series[value]
+
+    def observe(self, metric, help_text, label, value, seconds):
+        self.histogram(metric, help_text, label, value).observe(seconds)
+
+    def timer(self, metric, help_text, label, value):
+        return _Timer(self.histogram(metric, help_text, label, value))
+
+    def gauge(self, metric, help_text, callback):
+        with self._lock:
+            self._gauges[metric] = (help_text, callback)
+
+    def series(self, metric):
+        """{label value: Histogram} for a metric (empty if nothing was observed yet)."""
+        with self._lock:
+            entry = self._histograms.get(metric)
+            return dict(entry[2]) if entry else {}
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = {metric: (help_text, label, dict(series)) for metric, (help_text, label, series) in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        lines = []
+        for metric, (help_text, label, series) in sorted(histograms.items()):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for value, histogram in sorted(series.items()):
+                bucket_counts, count, total = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float('inf'),), bucket_counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{{label}="{value}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}="{value}"}} {total}')
+                lines.append(f'{metric}_count{{{label}="{value}"}} {count}')
+        for metric, (help_text, callback) in sorted(gauges.items()):
+            try:
+                value = float(callback())
+            except Exception:
+                continue # A gauge that cannot be read is left out of this scrape
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def overlay_lines(self, metric):
+        """Short 'stage p50/p99' lines of one metric for drawing on the video frame."""
+        lines = []
+        for value, histogram in sorted(self.series(metric).items()):
+            p50, p99 = histogram.percentile(50), histogram.percentile(99)
+            if p50 is not None:
+                lines.append(f"{value}: {p50 * 1000:.1f} / {p99 * 1000:.1f} ms")
+        return lines
+
+
+class MetricsServer(threading.Thread):
+    """Serves GET /metrics from a MetricsRegistry on a background thread."""
+
+    def __init__(self, registry, port, host="127.0.0.1"):
+        super().__init__(name="metrics-server", daemon=True)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Scrapes would otherwise flood the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- Google Sheets Call Timing ---
+class InstrumentedWorksheet:
+    """Wraps a gspread Worksheet and times every method call into attendance_sheets_call_seconds."""
+
+    def __init__(self, worksheet, registry):
+        self._worksheet = worksheet
+        self._registry = registry
+
+    @property
+    def row_count(self):
+        return self._worksheet.row_count
+
+    def __getattr__(self, name):
+        attribute = getattr(self._worksheet, name)
+        if not callable(attribute):
+            return attribute
+        registry = self._registry
+
+        def timed(*args, **kwargs):
+            with registry.timer('attendance_sheets_call_seconds', "Google Sheets API call latency.", 'method', name):
+                return attribute(*args, **kwargs)
+        return timed
+
+
+# --- Sampling Profiler ---
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads every interval seconds and writes them in
+    collapsed-stack format ('thread;outer;...;inner count'), which flamegraph.pl,
+    speedscope and inferno read directly.
+    """
+
+    def __init__(self, output_dir, interval=DEFAULT_PROFILE_INTERVAL_SECONDS):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._stacks = Counter()
+        self._stop_event = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def toggle(self):
+        """Starts sampling, or stops it and writes the profile. Returns the written path, if any."""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def start(self):
+        self._stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        print(f"PROFILER: Sampling every {self.interval * 1000:.0f} ms. Send the signal again to stop and write the profile.")
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.folded")
+        with open(path, 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"PROFILER: {sum(self._stacks.values())} samples written to '{path}'.")
+        return path
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+
+
+def install_profiler_signal(profiler, signum=getattr(signal, 'SIGUSR1', None)):
+    """Toggles the profiler on a signal (SIGUSR1 by default). Returns False where the signal does not exist (Windows)."""
+    if signum is None:
+        return False
+    signal.signal(signum, lambda *_: profiler.toggle())
+    return True
+
+
+# --- Startup Timing ---
+# Startup steps (sheet auth, gallery, models, camera) run on several threads at once,
+# so besides each step's own duration the summary reports the wall-clock total.
+class StartupTimer:
+    """Records how long each startup step took, from any thread."""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.steps = [] # (name, seconds, ok) in the order they finished
+
+    def run(self, name, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) as the step called name and returns its result."""
+        step_start = time.perf_counter()
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.steps.append((name, time.perf_counter() - step_start, ok))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        """e.g. 'sheets 1.84s, models 1.10s, camera 0.80s (failed) | 2.05s total'."""
+        with self._lock:
+            steps = list(self.steps)
+        parts = [f"{name} {seconds:.2f}s" + ("" if ok else " (failed)") for name, seconds, ok in steps]
+        return f"{', '.join(parts)} | {self.elapsed:.2f}s total"
@@ -0,0 +1,98 @@
+import time
+
+import cv2
+
+# --- Motion Gate ---
+# An empty corridor does not need the HOG detector. Before any colour conversion or
+# detection, each frame is shrunk to a tiny grayscale thumbnail and compared with the
+# previous one. Detection and encoding only run while something moved recently:
+#   - a pixel counts as changed if it differs by more than pixel_threshold (0-255),
+#   - motion means more than min_changed_fraction of the thumbnail changed,
+#   - the gate stays open for warm_down_seconds after the last motion, so a person
+#     pausing in front of the camera is still recognized.
+# While closed, motion is only checked idle_check_fps times per second.
+THUMBNAIL_SIZE = (80, 60) # width, height
+DEFAULT_PIXEL_THRESHOLD = 25
+DEFAULT_MIN_CHANGED_FRACTION = 0.002
+DEFAULT_WARM_DOWN_SECONDS = 3.0
+DEFAULT_IDLE_CHECK_FPS = 5.0
+
+
+class MotionGate:
+    """Decides per frame whether recognition should run, and reports its duty cycle."""
+
+    def __init__(self, pixel_threshold=DEFAULT_PIXEL_THRESHOLD, min_changed_fraction=DEFAULT_MIN_CHANGED_FRACTION,
+                 warm_down_seconds=DEFAULT_WARM_DOWN_SECONDS, idle_check_fps=DEFAULT_IDLE_CHECK_FPS, clock=time.monotonic):
+        self.clock = clock # Replaced by the video's own timeline when replaying recordings faster than real time
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.warm_down_seconds = warm_down_seconds
+        self.idle_check_interval = 1.0 / idle_check_fps if idle_check_fps else 0.0
+        self.is_open = True # Start open so whoever is already at the door is recognized
+        self.wake_ups = 0
+        self.changed_fraction = 0.0
+        self._previous = None
+        self._last_motion = None
+        self._last_check = 0.0
+        self._last_update = None
+        self._open_seconds = 0.0
+        self._total_seconds = 0.0
+        self._interval_open_seconds = 0.0
+        self._interval_total_seconds = 0.0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame, now=None):
+        """Returns True if this frame should go through detection and recognition."""
+        if now is None:
+            now = self.clock()
+        self._account(now)
+        if self._last_motion is None:
+            self._last_motion = now
+
+        if not self.is_open and now - self._last_check < self.idle_check_interval:
+            return False
+        self._last_check = now
+
+        thumbnail = self._thumbnail(frame)
+        if self._previous is not None:
+            changed = cv2.absdiff(thumbnail, self._previous) > self.pixel_threshold
+            self.changed_fraction = float(changed.mean())
+            if self.changed_fraction >= self.min_changed_fraction:
+                self._last_motion = now
+        self._previous = thumbnail
+
+        was_open = self.is_open
+        self.is_open = now - self._last_motion <= self.warm_down_seconds
+        if self.is_open and not was_open:
+            self.wake_ups += 1
+        return self.is_open
+
+    def _account(self, now):
+        """Adds the time since the previous frame to the open/total counters."""
+        if self._last_update is not None:
+            elapsed = now - self._last_update
+            self._total_seconds += elapsed
+            self._interval_total_seconds += elapsed
+            if self.is_open:
+                self._open_seconds += elapsed
+                self._interval_open_seconds += elapsed
+        self._last_update = now
+
+    @property
+    def duty_cycle(self):
+        """Fraction of the time since start during which recognition was running."""
+        return self._open_seconds / self._total_seconds if self._total_seconds else 1.0
+
+    def stats_line(self):
+        """Duty cycle since start and since the previous call, plus the number of wake-ups."""
+        recent = self._interval_open_seconds / self._interval_total_seconds if self._interval_total_seconds else 1.0
+        self._interval_open_seconds = 0.0
+        self._interval_total_seconds = 0.0
+        state = "open" if self.is_open else "closed"
+        return (f"gate {state}, duty cycle {recent * 100:.1f}% recently / {self.duty_cycle * 100:.1f}% overall, "
+                f"{self.wake_ups} wake-ups")
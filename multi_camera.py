@@ -0,0 +1,368 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import face_cache
+from face_gallery import FaceGallery
+from capture_pipeline import StageStats
+from detection_control import detect_faces
+from recognition_profiles import make_profile
+from sheet_writer import SheetWriter, open_worksheet
+from attendance_journal import AttendanceJournal
+from attendance import AttendanceBook
+from attendance_recovery import recover_attendance
+from config import (
+    SHEET_ID, SERVICE_ACCOUNT_KEY_PATH, WORKSHEET_NAME,
+    AUTHORIZED_FACES_DIR, FACE_CACHE_DIR, FACE_RECOGNITION_TOLERANCE, GALLERY_INDEX,
+    GALLERY_MATCH_MODE, GALLERY_MAX_EXEMPLARS, RECOGNITION_PROFILES, RECOGNITION_PROFILE,
+    DETECTION_SCALE, COOLDOWN_PERIOD_SECONDS,
+    SHEET_FLUSH_INTERVAL_SECONDS, SHEET_BATCH_SIZE, SHEET_MAX_BACKOFF_SECONDS, ATTENDANCE_JOURNAL_PATH,
+    ATTENDANCE_JOURNAL_DURABLE, ATTENDANCE_CHECKPOINT_PATH,
+    PIPELINE_STATS_INTERVAL_SECONDS, CAMERA_WORKERS, CAMERA_FRAME_SLOTS,
+)
+
+# --- Multi-Camera Attendance Server ---
+# Serves several entrances from one multi-core host. dlib detection and encoding
+# are CPU-bound, so they run in a pool of worker processes instead of threads:
+#   - The gallery is built once in the parent (people with several photos reduced to
+#     their centroid and exemplar rows) and its matrix placed in shared memory; every
+#     worker maps it without copying and wraps it in a FaceGallery.
+#   - Each camera owns a few shared-memory frame slots. Frames are decoded straight
+#     into a free slot and only the slot's name is sent to a worker, so pixels are
+#     never pickled. While all slots of a camera are busy, its frames are dropped.
+#   - Workers return only boxes, names and distances. The parent process owns the
+#     single attendance state and sheet writer shared by all doors.
+#   - A worker that dies (e.g. killed by the OOM killer) breaks the pool. It is replaced
+#     and the frames it held are reported as failed, so their slots are freed.
+#   - Each camera has its own recognition profile, e.g. "accurate" at the main door
+#     and "fast" at a busy side entrance.
+# Usage: python multi_camera.py 0 1 rtsp://door-2/stream recorded.mp4
+#        python multi_camera.py 0 1 --profile accurate,fast
+
+
+# --- Worker Process Side ---
+_worker = {} # Per-process state set up by _init_worker
+
+
+def _init_worker(gallery_shm_name, gallery_shape, names, row_counts, tolerance, gallery_index, detection_scale,
+                 match_mode):
+    """Maps the shared gallery and loads the dlib detector, once per worker process."""
+    import dlib
+
+    gallery_shm = shared_memory.SharedMemory(name=gallery_shm_name)
+    encodings = np.ndarray(gallery_shape, dtype=np.float32, buffer=gallery_shm.buf)
+    _worker['gallery_shm'] = gallery_shm # Keep the mapping alive for the life of the worker
+    _worker['gallery'] = FaceGallery.from_rows(names, encodings, row_counts, tolerance=tolerance, index=gallery_index,
+                                               match_mode=match_mode)
+    _worker['profiles'] = {name: make_profile(name, RECOGNITION_PROFILES) for name in RECOGNITION_PROFILES}
+    _worker['detector'] = dlib.get_frontal_face_detector()
+    _worker['scale'] = detection_scale
+    _worker['slots'] = {}
+
+
+def _slot_view(slot_name, shape):
+    """Returns an ndarray over a camera's shared frame slot, attaching to it on first use."""
+    slots = _worker['slots']
+    if slot_name not in slots:
+        shm = shared_memory.SharedMemory(name=slot_name)
+        slots[slot_name] = (shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    return slots[slot_name][1]
+
+
+def _recognize_slot(camera_id, slot_index, slot_name, shape, profile_name):
+    """
+    Detects, encodes and matches the faces in one shared frame slot. Runs in a worker process.
+    Returns (camera_id, slot_index, faces, error, encode_seconds).
+    """
+    try:
+        frame = _slot_view(slot_name, shape)
+        boxes = detect_faces(_worker['detector'], frame, _worker['scale'])
+        if not boxes:
+            return camera_id, slot_index, [], None, 0.0
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        encode_start = time.perf_counter()
+        encodings = _worker['profiles'][profile_name].encode(rgb_frame, boxes)
+        encode_seconds = time.perf_counter() - encode_start
+        matches = _worker['gallery'].match(encodings)
+        return (camera_id, slot_index, [(box, name, distance) for box, (name, distance) in zip(boxes, matches)],
+                None, encode_seconds)
+    except Exception as e:
+        # Always report back so the parent can free the slot
+        return camera_id, slot_index, [], str(e), 0.0
+
+
+# --- Parent Process Side ---
+class SharedGallery:
+    """The gallery encodings copied once into a shared-memory float32 matrix."""
+
+    def __init__(self, encodings):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+        self.shape = encodings.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=max(encodings.nbytes, 1))
+        np.ndarray(self.shape, dtype=np.float32, buffer=self.shm.buf)[:] = encodings
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RecognitionPool:
+    """Recognition worker processes, replaced as a whole when one of them dies."""
+
+    def __init__(self, workers, initargs):
+        self.workers = workers
+        self.initargs = initargs
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=self.initargs)
+
+    def _replace(self, executor):
+        """Swaps a broken executor for a new one, once. Caller holds self._lock."""
+        if self._executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+            print("ERROR: A recognition worker process died. Starting new workers.")
+        return self._executor
+
+    def submit(self, callback, camera_id, slot_index, slot_name, shape, profile_name):
+        """Recognizes one frame slot in a worker; callback always gets a result tuple, so the slot is freed."""
+        args = (camera_id, slot_index, slot_name, shape, profile_name)
+        with self._lock:
+            executor = self._executor
+            try:
+                future = executor.submit(_recognize_slot, *args)
+            except BrokenProcessPool:
+                executor = self._replace(executor)
+                future = executor.submit(_recognize_slot, *args)
+        future.add_done_callback(lambda f: self._done(f, executor, camera_id, slot_index, callback))
+
+    def _done(self, future, executor, camera_id, slot_index, callback):
+        try:
+            result = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                with self._lock:
+                    self._replace(executor)
+            result = (camera_id, slot_index, [], f"{type(e).__name__}: {e}", 0.0)
+        callback(result)
+
+    def shutdown(self):
+        with self._lock:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class CameraFeed(threading.Thread):
+    """Decodes one camera into its shared frame slots and submits filled slots to the worker pool."""
+
+    def __init__(self, camera_id, source, pool, result_queue, stop_event, slot_count=CAMERA_FRAME_SLOTS, profile=None):
+        super().__init__(name=f"camera-{camera_id}", daemon=True)
+        self.camera_id = camera_id
+        self.source = int(source) if str(source).isdigit() else source
+        self.pool = pool
+        self.result_queue = result_queue
+        self.stop_event = stop_event
+        self.slot_count = slot_count
+        self.slots = [] # (SharedMemory, ndarray) per slot
+        self.free_slots = queue.Queue()
+        self.shape = None
+        self.finished = False
+        self.capture_stats = StageStats(f"camera-{camera_id}-capture")
+        self.recognition_stats = StageStats(f"camera-{camera_id}-recognition")
+        self.dropped = 0
+        # Encoding runs in the workers; the parent copy of the profile only adds up their timings
+        self.profile = profile if profile is not None else make_profile(RECOGNITION_PROFILE, RECOGNITION_PROFILES)
+
+    def release_slot(self, slot_index):
+        self.free_slots.put(slot_index)
+        self.recognition_stats.tick()
+
+    def _allocate_slots(self, first_frame):
+        self.shape = first_frame.shape
+        for slot_index in range(self.slot_count):
+            shm = shared_memory.SharedMemory(create=True, size=first_frame.nbytes)
+            self.slots.append((shm, np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf)))
+            self.free_slots.put(slot_index)
+
+    def run(self):
+        video_capture = cv2.VideoCapture(self.source)
+        if not video_capture.isOpened():
+            print(f"ERROR: Could not open camera source '{self.source}'.")
+            self.finished = True
+            return
+        try:
+            ret, first_frame = video_capture.read()
+            if not ret:
+                print(f"ERROR: Camera source '{self.source}' delivered no frames.")
+                return
+            self._allocate_slots(first_frame)
+            print(f"Camera {self.camera_id} ('{self.source}') started at {self.shape[1]}x{self.shape[0]}.")
+
+            while not self.stop_event.is_set():
+                try:
+                    slot_index = self.free_slots.get_nowait()
+                except queue.Empty:
+                    # Every slot is still being recognized: skip this frame without decoding it
+                    if not video_capture.grab():
+                        break
+                    self.dropped += 1
+                    continue
+
+                shm, slot = self.slots[slot_index]
+                # Decode straight into shared memory; OpenCV only allocates if the frame size changed
+                ret, frame = video_capture.read(slot)
+                if not ret:
+                    self.free_slots.put(slot_index)
+                    break
+                if frame is not slot:
+                    if frame.shape != self.shape:
+                        print(f"WARNING: Camera {self.camera_id} changed resolution. Frame skipped.")
+                        self.free_slots.put(slot_index)
+                        continue
+                    np.copyto(slot, frame)
+                self.capture_stats.tick()
+                self.pool.submit(self.result_queue.put, self.camera_id, slot_index, shm.name, self.shape, self.profile.name)
+        finally:
+            video_capture.release()
+            self.finished = True
+            print(f"Camera {self.camera_id} ('{self.source}') stopped.")
+
+    def close(self):
+        for shm, _ in self.slots:
+            shm.close()
+            shm.unlink()
+
+    def stats_line(self):
+        in_flight = self.slot_count - self.free_slots.qsize() if self.slots else 0
+        return (f"camera {self.camera_id}: capture {self.capture_stats.fps:.1f} fps"
+                f" | recognition {self.recognition_stats.fps:.1f} fps"
+                f" | in flight {in_flight}/{self.slot_count} | dropped {self.dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve several entrance cameras from one multi-core host.")
+    parser.add_argument('sources', nargs='+', help="Camera device indices, RTSP/HTTP URLs or video files")
+    parser.add_argument('--workers', type=int, default=CAMERA_WORKERS,
+                        help="Recognition worker processes (default: CPU cores minus one)")
+    parser.add_argument('--slots', type=int, default=CAMERA_FRAME_SLOTS,
+                        help="Shared-memory frame buffers per camera")
+    parser.add_argument('--scale', type=float, default=DETECTION_SCALE, help="Detection downscale factor")
+    parser.add_argument('--profile', default=RECOGNITION_PROFILE,
+                        help="Recognition profile for every camera, or a comma-separated list with one per camera")
+    args = parser.parse_args()
+    workers = args.workers or max((os.cpu_count() or 2) - 1, 1)
+
+    profile_names = args.profile.split(',')
+    if len(profile_names) == 1:
+        profile_names *= len(args.sources)
+    if len(profile_names) != len(args.sources):
+        print(f"ERROR: Got {len(profile_names)} profiles for {len(args.sources)} cameras.")
+        return
+    try:
+        profiles = [make_profile(name.strip(), RECOGNITION_PROFILES) for name in profile_names]
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
+
+    # --- Google Sheets Setup ---
+    def connect():
+        return open_worksheet(SHEET_ID, SERVICE_ACCOUNT_KEY_PATH, WORKSHEET_NAME)
+
+    try:
+        worksheet = connect()
+    except FileNotFoundError:
+        print(f"ERROR: Google Sheets credentials file not found at '{SERVICE_ACCOUNT_KEY_PATH}'.")
+        return
+    except Exception as e:
+        # Attendance is kept in the local journal and written to the sheet once it is reachable
+        print(f"WARNING: Could not connect to Google Sheets or update headers: {e}. Starting in journal-only mode.")
+        worksheet = None
+    attendance_journal = AttendanceJournal(ATTENDANCE_JOURNAL_PATH, durable=ATTENDANCE_JOURNAL_DURABLE)
+    attendance_journal.prune()
+    sheet_writer = SheetWriter(worksheet, flush_interval=SHEET_FLUSH_INTERVAL_SECONDS,
+                               batch_size=SHEET_BATCH_SIZE, max_backoff=SHEET_MAX_BACKOFF_SECONDS,
+                               journal=attendance_journal, connect=connect)
+    attendance_book = AttendanceBook(sheet_writer, COOLDOWN_PERIOD_SECONDS)
+    sheet_writer.start(restore=lambda worksheet, pending_events: recover_attendance(
+        worksheet, attendance_book, pending_events, ATTENDANCE_CHECKPOINT_PATH, f"{SHEET_ID}/{WORKSHEET_NAME}"))
+
+    # --- Shared Gallery ---
+    # A person with several photos appears once per photo; the gallery groups them before it is shared
+    known_face_names, known_face_encodings = face_cache.load_encodings(AUTHORIZED_FACES_DIR, FACE_CACHE_DIR)
+    if len(known_face_names) == 0:
+        print("ERROR: No authorized faces loaded. Please ensure 'authorized_faces' folder contains images with clear faces.")
+        sheet_writer.stop()
+        attendance_journal.close()
+        return
+    gallery = FaceGallery(known_face_names, known_face_encodings, match_mode=GALLERY_MATCH_MODE,
+                          max_exemplars=GALLERY_MAX_EXEMPLARS)
+    for person_name in gallery.names:
+        attendance_book.add_person(person_name)
+    shared_gallery = SharedGallery(gallery.encodings)
+    print(f"Shared gallery ready ({len(gallery)} people, {len(gallery.encodings)} rows). Starting {workers} recognition workers...")
+
+    stop_event = threading.Event()
+    result_queue = queue.Queue()
+    pool = RecognitionPool(workers, (shared_gallery.shm.name, shared_gallery.shape, gallery.names, gallery.row_counts,
+                                     FACE_RECOGNITION_TOLERANCE, GALLERY_INDEX, args.scale, GALLERY_MATCH_MODE))
+    feeds = [CameraFeed(camera_id, source, pool, result_queue, stop_event, slot_count=args.slots, profile=profile)
+             for camera_id, (source, profile) in enumerate(zip(args.sources, profiles))]
+    try:
+        for feed in feeds:
+            feed.start()
+        print(f"\nMulti-camera attendance server started with {len(feeds)} camera(s). Press Ctrl+C to quit.")
+
+        last_stats_time = time.time()
+        while not all(feed.finished for feed in feeds) or any(feed.free_slots.qsize() < feed.slot_count
+                                                               for feed in feeds if feed.slots):
+            try:
+                camera_id, slot_index, faces, error, encode_seconds = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                camera_id = None
+            if camera_id is not None:
+                feeds[camera_id].release_slot(slot_index)
+                if faces:
+                    feeds[camera_id].profile.record(len(faces), encode_seconds)
+                if error:
+                    print(f"ERROR in recognition worker (camera {camera_id}): {error}")
+                current_datetime = datetime.now()
+                current_time_epoch = time.time()
+                recognized_names = [person_name for _, person_name, _ in faces if person_name is not None]
+                if recognized_names:
+                    attendance_book.record_sightings(recognized_names, current_datetime, current_time_epoch)
+
+            if time.time() - last_stats_time >= PIPELINE_STATS_INTERVAL_SECONDS:
+                for feed in feeds:
+                    print(f"PIPELINE: {feed.stats_line()}")
+                    print(f"ENCODING: camera {feed.camera_id}: {feed.profile.stats_line()}")
+                print(f"SHEETS: {sheet_writer.status_line()} | Currently IN: {attendance_book.num_present()}")
+                last_stats_time = time.time()
+    except KeyboardInterrupt:
+        print("\nCtrl+C pressed. Exiting...")
+    finally:
+        # --- Cleanup ---
+        print("\nCleaning up resources...")
+        stop_event.set()
+        for feed in feeds:
+            feed.join(2.0)
+        pool.shutdown()
+        for feed in feeds:
+            feed.close()
+        shared_gallery.close()
+        sheet_writer.stop() # Flush attendance events that are still queued
+        attendance_journal.close()
+        print("Program ended.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- MJPEG Preview Stream ---
+# Lets a headless door controller be checked from a browser:
+#   http://<host>:<port>/   - multipart/x-mixed-replace stream of JPEG frames
+# The server never renders anything itself. The frame loop asks client_count and
+# only draws and encodes a preview frame while someone is watching, at a low rate.
+BOUNDARY = "frame"
+
+
+class MJPEGPreviewServer(threading.Thread):
+    """Pushes the latest published JPEG to every connected client."""
+
+    def __init__(self, port, host="127.0.0.1"):
+        super().__init__(name="preview-server", daemon=True)
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._sequence = 0
+        self._clients = 0
+        self._stopping = False
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/stream.mjpg'):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                preview._serve(self.wfile)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def client_count(self):
+        return self._clients
+
+    def publish(self, jpeg_bytes):
+        """Hands a new JPEG frame to all connected clients."""
+        with self._cond:
+            self._jpeg = jpeg_bytes
+            self._sequence += 1
+            self._cond.notify_all()
+
+    def _serve(self, wfile):
+        with self._cond:
+            self._clients += 1
+            last_sequence = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopping or self._sequence != last_sequence, timeout=5.0)
+                    if self._stopping:
+                        return
+                    if self._sequence == last_sequence:
+                        continue
+                    jpeg, last_sequence = self._jpeg, self._sequence
+                wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode('ascii'))
+                wfile.write(jpeg)
+                wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The client went away
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import cv2
+
+# --- Recognition Profiles ---
+# A profile decides how faces in the live feed are encoded, trading accuracy for speed:
+#   landmark_model - 'small' (5 landmarks, faster alignment) or 'large' (68 landmarks)
+#   num_jitters    - randomly shifted copies of each face that are encoded and averaged;
+#                    N jitters cost about N times the encoding time
+#   max_face_side  - faces larger than this many pixels are cropped and downscaled before
+#                    encoding (the encoder works on a 150x150 face chip anyway); None keeps full size
+# Profiles are defined in config.RECOGNITION_PROFILES and chosen per camera. Each profile
+# counts the faces it encoded and the time that took, so their throughput can be compared.
+LANDMARK_MODELS = ('small', 'large')
+CROP_MARGIN = 0.5 # Context kept around a face box when cropping, as a fraction of the box size
+
+
+class RecognitionProfile:
+    """Encodes faces with one set of landmark, jitter and crop settings, and measures its throughput."""
+
+    def __init__(self, name, landmark_model='large', num_jitters=1, max_face_side=None):
+        if landmark_model not in LANDMARK_MODELS:
+            raise ValueError(f"Unknown landmark model '{landmark_model}'. Expected one of {LANDMARK_MODELS}.")
+        self.name = name
+        self.landmark_model = landmark_model
+        self.num_jitters = max(int(num_jitters), 1)
+        self.max_face_side = max_face_side
+        self.faces_encoded = 0
+        self.encode_seconds = 0.0
+        self._face_encodings = None
+        self._lock = threading.Lock()
+
+    def describe(self):
+        crop = f"faces downscaled to {self.max_face_side}px" if self.max_face_side else "full-size faces"
+        return f"{self.landmark_model} landmarks, {self.num_jitters} jitter(s), {crop}"
+
+    def encode(self, rgb_frame, boxes):
+        """Returns one 128-d encoding per (top, right, bottom, left) box of an RGB frame."""
+        if self._face_encodings is None:
+            # Imported on first use so importing this module does not load the dlib models
+            import face_recognition
+            self._face_encodings = face_recognition.face_encodings
+
+        start = time.perf_counter()
+        encodings = [None] * len(boxes)
+        full_size = []
+        for i, (top, right, bottom, left) in enumerate(boxes):
+            if self.max_face_side and max(bottom - top, right - left) > self.max_face_side:
+                encodings[i] = self._encode_downscaled(rgb_frame, (top, right, bottom, left))
+            else:
+                full_size.append(i)
+        if full_size:
+            # Faces that need no downscaling are encoded together in one call
+            for i, encoding in zip(full_size, self._face_encodings(rgb_frame, [boxes[i] for i in full_size],
+                                                                   num_jitters=self.num_jitters, model=self.landmark_model)):
+                encodings[i] = encoding
+        self.record(len(boxes), time.perf_counter() - start)
+        return encodings
+
+    def _encode_downscaled(self, rgb_frame, box):
+        """Encodes one face from a crop around it, scaled so the face is max_face_side pixels."""
+        top, right, bottom, left = box
+        side = max(bottom - top, right - left)
+        margin = int(side * CROP_MARGIN)
+        height, width = rgb_frame.shape[:2]
+        crop_top, crop_left = max(top - margin, 0), max(left - margin, 0)
+        crop_bottom, crop_right = min(bottom + margin, height), min(right + margin, width)
+        scale = self.max_face_side / side
+        crop = cv2.resize(rgb_frame[crop_top:crop_bottom, crop_left:crop_right], (0, 0), fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA)
+        scaled_box = (int((top - crop_top) * scale), int((right - crop_left) * scale),
+                      int((bottom - crop_top) * scale), int((left - crop_left) * scale))
+        return self._face_encodings(crop, [scaled_box], num_jitters=self.num_jitters, model=self.landmark_model)[0]
+
+    def record(self, faces, seconds):
+        """Adds encoding work done here or, for the multi-camera server, in a worker process."""
+        with self._lock:
+            self.faces_encoded += faces
+            self.encode_seconds += seconds
+
+    @property
+    def faces_per_second(self):
+        """Faces encoded per second of encoding time (one core), or None before the first face."""
+        with self._lock:
+            return self.faces_encoded / self.encode_seconds if self.encode_seconds else None
+
+    def stats_line(self):
+        faces_per_second = self.faces_per_second
+        if faces_per_second is None:
+            return f"profile '{self.name}' ({self.describe()}): no faces encoded yet"
+        return (f"profile '{self.name}' ({self.describe()}): {self.faces_encoded} faces encoded, "
+                f"{1000.0 / faces_per_second:.1f} ms/face ({faces_per_second:.1f} faces/s per core)")
+
+
+def make_profile(name, definitions):
+    """Builds the profile called name from {name: settings}, e.g. config.RECOGNITION_PROFILES."""
+    if name not in definitions:
+        raise ValueError(f"Unknown recognition profile '{name}'. Expected one of {tuple(definitions)}.")
+    return RecognitionProfile(name, **definitions[name])
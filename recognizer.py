@@ -0,0 +1,142 @@
+import time
+from datetime import datetime
+
+import cv2
+
+from detection_control import detect_faces
+from recognition_profiles import RecognitionProfile
+
+# --- Frame Recognizer ---
+# The recognition stage of the attendance pipeline: detection, tracking, encoding,
+# gallery matching and attendance, for one frame at a time. Used by idk.py's
+# recognition worker and by benchmark.py.
+# STAGES lists the names passed to the optional on_stage(stage, seconds) callback.
+STAGES = ('motion', 'detect', 'encode', 'match', 'attendance', 'frame')
+
+
+class FrameRecognizer:
+    """Callable that turns a BGR frame into display annotations and attendance events."""
+
+    def __init__(self, detector, gallery, attendance_book, face_tracker, detection_controller, on_stage=None,
+                 motion_gate=None, profile=None):
+        self.detector = detector
+        self.gallery = gallery
+        self.attendance_book = attendance_book
+        self.face_tracker = face_tracker
+        self.detection_controller = detection_controller
+        self.motion_gate = motion_gate
+        self.on_stage = on_stage
+        # How faces are encoded; the default profile uses face_recognition's default settings
+        self.profile = profile if profile is not None else RecognitionProfile("default")
+
+    def _stage_done(self, stage, stage_start):
+        """Reports a finished stage to on_stage and returns the current time, for timing the next stage."""
+        now = time.perf_counter()
+        if self.on_stage:
+            self.on_stage(stage, now - stage_start)
+        return now
+
+    def __call__(self, frame):
+        """
+        Detects, encodes and matches every face in a frame and records attendance.
+        Returns (face_boxes, overall_display_message, overall_display_color), where
+        face_boxes holds ((top, right, bottom, left), label, color).
+        """
+        frame_start_time = time.perf_counter()
+
+        if self.motion_gate is not None:
+            gate_open = self.motion_gate.check(frame)
+            self._stage_done('motion', frame_start_time)
+            if not gate_open:
+                # Nothing moved for a while: skip colour conversion, detection and encoding entirely
+                if self.face_tracker.tracks:
+                    self.face_tracker.update([]) # Let faces that walked away age out
+                return [], "Waiting for Face...", (0, 255, 255) # Yellow
+
+        current_datetime = datetime.now()
+        current_time_epoch = time.time() # For cooldown calculations
+
+        if self.detection_controller.should_detect():
+            # Detect on a downscaled grayscale frame; boxes come back at full resolution for encoding
+            stage_start = time.perf_counter()
+            face_locations_fr = detect_faces(self.detector, frame, self.detection_controller.scale)
+            self._stage_done('detect', stage_start)
+
+            # Follow faces across frames; only new, unconfident or stale tracks are re-encoded below
+            face_tracks = self.face_tracker.update(face_locations_fr)
+        else:
+            # Detection skipped on this frame: keep following the faces found by the last detection
+            face_tracks = [track for track in self.face_tracker.tracks if track.missed == 0]
+            face_locations_fr = [track.box for track in face_tracks]
+
+        # --- Face Recognition & Attendance Logic ---
+        # Default display messages if no specific action occurs
+        overall_display_message = "Waiting for Face..."
+        overall_display_color = (0, 255, 255) # Yellow
+
+        # Keep track of who was seen in THIS frame
+        seen_in_this_frame = set()
+        face_boxes = []
+
+        if len(face_locations_fr) > 0:
+            overall_display_message = "Processing Face(s)..."
+            overall_display_color = (0, 165, 255) # Orange
+
+            tracks_to_encode = [track for track in face_tracks if self.face_tracker.needs_encoding(track, current_time_epoch)]
+
+            if tracks_to_encode:
+                # Encode those faces as the profile says, then match them all against the gallery in one batch
+                stage_start = time.perf_counter()
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                face_encodings_recognition = self.profile.encode(rgb_frame, [track.box for track in tracks_to_encode])
+                stage_start = self._stage_done('encode', stage_start)
+                gallery_matches = self.gallery.match(face_encodings_recognition)
+                self._stage_done('match', stage_start)
+                for track, (match_name, match_distance) in zip(tracks_to_encode, gallery_matches):
+                    self.face_tracker.set_identity(track, match_name, match_distance, current_time_epoch)
+            for _ in range(len(face_tracks) - len(tracks_to_encode)):
+                self.face_tracker.skip_encoding()
+
+            # One (name, distance) per face, or None if the face has never been encoded successfully
+            face_matches = [(track.name, track.distance) if track.last_encoded_time is not None else None for track in face_tracks]
+
+            # ENTRY, EXIT or cooldown for everyone recognized in this frame, in one call
+            recognized = [i for i, face_match in enumerate(face_matches) if face_match is not None and face_match[0] is not None]
+            sightings = {}
+            if recognized:
+                stage_start = time.perf_counter()
+                sighting_results = self.attendance_book.record_sightings(
+                    [face_matches[i][0] for i in recognized], current_datetime, current_time_epoch)
+                self._stage_done('attendance', stage_start)
+                sightings = dict(zip(recognized, sighting_results))
+
+            for i, (top_d, right_d, bottom_d, left_d) in enumerate(face_locations_fr):
+                display_name_on_box = "Unknown"
+                display_color_on_box = (0, 0, 255) # Red for unknown
+
+                if face_matches[i] is not None:
+                    recognized_person_name, match_distance = face_matches[i]
+
+                    if recognized_person_name is not None:
+                        seen_in_this_frame.add(recognized_person_name) # Mark as seen in this frame
+                        display_name_on_box, overall_display_message, display_color_on_box = sightings[i]
+                        overall_display_color = display_color_on_box
+                    else: # Face recognized, but not a known person
+                        display_name_on_box = "Unknown Person"
+                        display_color_on_box = (0, 0, 255) # Red
+                else: # Dlib found a face, but face_recognition couldn't encode it (rare)
+                    display_name_on_box = "Processing Face..."
+                    display_color_on_box = (0, 165, 255) # Orange
+
+                # Boxes are drawn by the render stage, on whatever frame is newest by then
+                face_boxes.append(((top_d, right_d, bottom_d, left_d), display_name_on_box, display_color_on_box))
+        else:
+            # No faces detected in the current frame
+            overall_display_message = "Waiting for Face..."
+            overall_display_color = (0, 255, 255) # Yellow
+
+        frame_seconds = time.perf_counter() - frame_start_time
+        self.detection_controller.record_frame(frame_seconds)
+        if self.on_stage:
+            self.on_stage('frame', frame_seconds)
+        return face_boxes, overall_display_message, overall_display_color
@@ -0,0 +1,326 @@
+import itertools
+import re
+import threading
+import uuid
+from collections import deque
+
+from attendance_recovery import FIRST_DATA_ROW
+
+# --- Batched Google Sheets Writer ---
+# Every attendance event used to cost a full-sheet download (get_all_values) plus
+# one API call. SheetWriter instead:
+#   - queues ENTRY and EXIT events, and
+#   - flushes them from a background thread, appending every ENTRY of a batch with one
+#     values.append call (INSERT_ROWS) and writing the EXIT times with one batch_update.
+# Entry rows are never numbered locally: other door machines, or people editing the
+# sheet by hand, may add rows at any time, and append always lands after them. The
+# real row of an entry is taken from the append response. Until then the entry is
+# known by a negative reference (-journal event id), which log_exit accepts too; an
+# EXIT queued before its entry was written is merged into the same appended row.
+# Every appended row carries an event id in column E ('<writer id>-<event id>'). After
+# an append that failed without a clear answer, or after a crash, the tail of column E
+# is read first and entries already there are not appended again, so replay stays
+# idempotent. With an AttendanceJournal attached, events are committed locally first
+# and replayed after a restart. A writer started without a worksheet (Google Sheets was
+# unreachable) runs journal-only: the flush thread opens the sheet and recovers state
+# once it can, retrying with the same backoff as failed writes.
+SHEET_HEADER = ['Name', 'Date', 'Entry Time', 'Exit Time', 'Event ID']
+DEFAULT_FLUSH_INTERVAL_SECONDS = 2.0
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_BACKOFF_SECONDS = 64.0
+_ROW_RE = re.compile(r"[A-Z]+(\d+)")
+
+
+def open_worksheet(sheet_id, service_account_key_path, worksheet_name):
+    """Connects to the attendance worksheet with a service account and makes sure the header row is set."""
+    # Imported here so the writer itself can be used with any worksheet-like object
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+    creds = Credentials.from_service_account_file(service_account_key_path, scopes=scopes)
+    client = gspread.authorize(creds)
+
+    workbook = client.open_by_key(sheet_id)
+    worksheet = workbook.worksheet(worksheet_name)
+
+    # Check and set headers
+    current_header = worksheet.row_values(1)
+    if current_header != SHEET_HEADER:
+        print("Google Sheet headers do not match expected format. Updating headers...")
+        worksheet.update('A1:E1', [SHEET_HEADER]) # Update the entire header row
+        print("Google Sheet headers updated successfully.")
+    else:
+        print("Google Sheet headers are already correctly set.")
+
+    print(f"Successfully connected to Google Sheet (ID: {sheet_id}, Worksheet: {worksheet_name})")
+    return worksheet
+
+
+class SheetWriter:
+    """Queues attendance events and writes them to the worksheet in batches on a background thread."""
+
+    def __init__(self, worksheet, flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 batch_size=DEFAULT_BATCH_SIZE, max_backoff=DEFAULT_MAX_BACKOFF_SECONDS, journal=None, connect=None):
+        self.worksheet = worksheet # None until connect() succeeds when started in journal-only mode
+        self.connect = connect
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+
+        self.api_calls = 0
+        self.events_written = 0
+        self._entry_rows = {} # Entry reference -> sheet row, for entries written this run whose exit is still to come
+        self._local_refs = itertools.count(1) # Entry references when there is no journal
+        self.writer_id = journal.writer_id if journal is not None else uuid.uuid4().hex[:8]
+        self._known_rows = None # Sheet rows known to be used, from recovery and our own appends
+        self._verify_from = None # Set after an unclear append: first row to search for our event ids
+        self._restore = None
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    # --- Public API (called from the recognition thread, never blocks on the network) ---
+    def start(self, restore=None):
+        """
+        Replays unreplicated journal events and starts the flush thread. restore(worksheet,
+        pending_events) is called once the worksheet is open: before the thread starts, or from
+        the thread in journal-only mode. pending_events() returns [(kind, person_name, row_index,
+        values)] for events not yet in the sheet, the row_index of an unwritten entry being its
+        negative reference; call it under the lock guarding the restored state, since events may
+        be logged meanwhile. restore may return the number of used sheet rows.
+        """
+        if self.journal is not None:
+            replay = self.journal.unreplicated()
+            for event_id, kind, person_name, row_index, values in replay:
+                if kind == 'entry':
+                    row_index = -event_id
+                elif row_index < 0:
+                    # The exit's entry may have been written before the restart
+                    row_index = self.journal.entry_row(-row_index) or row_index
+                self._pending.append((kind, person_name, row_index, values, event_id))
+            if replay:
+                print(f"Replaying {len(replay)} attendance events from the local journal.")
+
+        self._restore = restore
+        if self.worksheet is not None:
+            used_rows = self._recover(self.worksheet)
+            print("Sheet writer started." + (f" {used_rows} rows in the sheet." if used_rows is not None else ""))
+        else:
+            print("Sheet writer started in journal-only mode. Google Sheets will be connected in the background.")
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+        self._thread.start()
+
+    def log_entry(self, person_name, current_dt):
+        """Queues an ENTRY row and returns the (negative) reference log_exit takes for it."""
+        values = [person_name, current_dt.strftime("%Y-%m-%d"), current_dt.strftime("%H:%M:%S"), '']
+        with self._cond:
+            event_id = self.journal.append('entry', person_name, 0, values) if self.journal is not None else None
+            entry_ref = -event_id if event_id is not None else -next(self._local_refs)
+            self._enqueue('entry', person_name, entry_ref, values, event_id)
+        return entry_ref
+
+    def log_exit(self, person_name, row_index, current_dt):
+        """Queues an EXIT time update for an entry, given its sheet row or the reference from log_entry."""
+        values = [current_dt.strftime("%H:%M:%S")]
+        with self._cond:
+            event_id = self.journal.append('exit', person_name, row_index, values) if self.journal is not None else None
+            self._enqueue('exit', person_name, row_index, values, event_id)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def status_line(self):
+        """One-line summary of replication progress."""
+        line = f"{self.events_written} events written in {self.api_calls} API calls, {self.pending_count()} queued"
+        if self.worksheet is None:
+            line += ", Google Sheets not connected"
+        if self.journal is not None:
+            pending, lag_seconds = self.journal.lag()
+            line += f", replication lag {pending} events / {lag_seconds:.1f}s"
+        return line
+
+    def stop(self, timeout=10.0):
+        """Flushes whatever is still queued and stops the background thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._pending:
+            if self.journal is not None:
+                print(f"{len(self._pending)} attendance events not yet in Google Sheets; they will be replayed from the journal on next start.")
+            else:
+                print(f"WARNING: {len(self._pending)} attendance events could not be written to Google Sheets.")
+
+    # --- Background flushing ---
+    def _enqueue(self, kind, person_name, row_index, values, event_id):
+        """Queues an already journaled event. Caller holds self._cond."""
+        self._pending.append((kind, person_name, row_index, values, event_id))
+        if len(self._pending) >= self.batch_size:
+            self._cond.notify()
+
+    def _run(self):
+        backoff = 0.0 # Seconds to wait after a failed write, doubled on each consecutive failure
+        while True:
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait_for(lambda: self._stopping or len(self._pending) >= self.batch_size,
+                                        timeout=self.flush_interval)
+                if self._stopping and not self._pending:
+                    return
+
+            batch = []
+            try:
+                if self.worksheet is None:
+                    self._connect()
+                with self._cond:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                batch = self._append_entries(batch) # Only the exits are left to retry once the entries are in
+                self._write_exits(batch)
+                backoff = 0.0
+            except Exception as e:
+                # Put the batch back in front, in order, and retry later with exponential backoff
+                with self._cond:
+                    self._pending.extendleft(reversed(batch))
+                    queued = len(self._pending)
+                backoff = min(max(backoff * 2, 1.0), self.max_backoff)
+                reason = "rate limited" if _is_rate_limit(e) else f"error: {e}"
+                action = "write failed" if self.worksheet is not None else "connection failed"
+                print(f"WARNING: Google Sheets {action} ({reason}). Retrying {queued} events in {backoff:.0f}s.")
+                with self._cond:
+                    if self._stopping:
+                        return
+                    self._cond.wait(backoff) # Wake early only for shutdown
+
+    def _recover(self, worksheet):
+        """Runs the restore callback against an open worksheet and notes which rows may already hold our entries."""
+        used_rows = self._restore(worksheet, self._pending_events) if self._restore is not None else None
+        with self._cond:
+            self._known_rows = used_rows
+            if any(event[0] == 'entry' for event in self._pending):
+                # The last run may have appended some of these before it stopped
+                self._verify_from = self._journal_scan_start(used_rows)
+        return used_rows
+
+    def _connect(self):
+        """Opens the worksheet of a writer started in journal-only mode and recovers state from it."""
+        worksheet = self.connect()
+        used_rows = self._recover(worksheet)
+        self.worksheet = worksheet
+        print("Connected to Google Sheets; leaving journal-only mode." + (f" {used_rows} rows in the sheet." if used_rows is not None else ""))
+
+    def _pending_events(self):
+        with self._cond:
+            return [event[:4] for event in self._pending]
+
+    def _event_token(self, entry_ref):
+        return f"{self.writer_id}-{-entry_ref}"
+
+    def _journal_scan_start(self, used_rows):
+        """First row our unconfirmed entries can be on: after the last entry the journal saw written."""
+        last_row = self.journal.last_entry_row() if self.journal is not None else None
+        if last_row is None or (used_rows is not None and last_row > used_rows):
+            return FIRST_DATA_ROW # No history, or the sheet shrank since
+        return last_row + 1
+
+    def _find_appended(self, entry_refs):
+        """Rows of the given entries that an earlier, unclear append already wrote, read from column E."""
+        (tail,) = self.worksheet.batch_get([f"E{self._verify_from}:E"])
+        self.api_calls += 1
+        rows_by_token = {row[0]: self._verify_from + offset for offset, row in enumerate(tail) if row}
+        found = {}
+        for entry_ref in entry_refs:
+            row_index = rows_by_token.get(self._event_token(entry_ref))
+            if row_index is not None:
+                found[entry_ref] = row_index
+        return found
+
+    def _append_entries(self, batch):
+        """Appends the entries of a batch as new rows with a single values.append call. Returns the remaining exits."""
+        entries = [event for event in batch if event[0] == 'entry']
+        exits = [event for event in batch if event[0] == 'exit']
+        if not entries:
+            return exits
+
+        written_rows = self._find_appended([event[2] for event in entries]) if self._verify_from is not None else {}
+        rows = {event[2]: list(event[3]) + [self._event_token(event[2])] for event in entries if event[2] not in written_rows}
+        merged = [event for event in exits if event[2] in rows]
+        for _, _, entry_ref, values, _ in merged:
+            rows[entry_ref][3] = values[0] # Left before the entry was written: one complete row
+        if rows:
+            scan_start = self._known_rows + 1 if self._known_rows is not None else self._journal_scan_start(None)
+            try:
+                response = self.worksheet.append_rows(list(rows.values()), value_input_option='RAW',
+                                                      insert_data_option='INSERT_ROWS', table_range='A1')
+            except Exception:
+                # The rows may have been written even though the call failed: look for them before appending again
+                self._verify_from = min(self._verify_from or scan_start, scan_start)
+                raise
+            finally:
+                self.api_calls += 1
+            first_row = _first_row(response['updates']['updatedRange'])
+            written_rows.update((entry_ref, first_row + offset) for offset, entry_ref in enumerate(rows))
+        self._verify_from = None
+        self._known_rows = max([self._known_rows or 0] + list(written_rows.values()))
+
+        closed = {event[2] for event in merged}
+        self._entry_rows.update((entry_ref, row) for entry_ref, row in written_rows.items() if entry_ref not in closed)
+        self.events_written += len(entries) + len(merged)
+        if self.journal is not None:
+            self.journal.mark_replicated([event[4] for event in entries + merged if event[4] is not None],
+                                         entry_rows={event[4]: written_rows[event[2]] for event in entries if event[4] is not None})
+
+        for _, person_name, entry_ref, values, _ in entries:
+            exit_note = f", exit {rows[entry_ref][3]}" if entry_ref in closed else ""
+            print(f"ATTENDANCE LOG: ENTRY for '{person_name}' written to Google Sheet at row {written_rows[entry_ref]} ({values[2]} on {values[1]}{exit_note}).")
+        return [event for event in exits if event[2] not in rows]
+
+    def _write_exits(self, exits):
+        """Writes exit times into their entry rows with a single values batch_update call."""
+        if not exits:
+            return
+        data, resolved, unknown = [], [], []
+        for event in exits:
+            row_index = self._resolve_row(event[2])
+            if row_index is None:
+                unknown.append(event)
+            else:
+                data.append({'range': f"D{row_index}", 'values': [event[3]]})
+                resolved.append((event, row_index))
+
+        if data:
+            self.worksheet.batch_update(data, value_input_option='RAW')
+            self.api_calls += 1
+            self.events_written += len(data)
+        if self.journal is not None:
+            # Exits whose entry row cannot be found are dropped rather than retried forever
+            self.journal.mark_replicated([event[4] for event in exits if event[4] is not None])
+
+        for (_, person_name, entry_ref, values, _), row_index in resolved:
+            self._entry_rows.pop(entry_ref, None)
+            print(f"ATTENDANCE LOG: EXIT for '{person_name}' written to Google Sheet at row {row_index} ({values[0]}).")
+        for _, person_name, _, values, _ in unknown:
+            print(f"WARNING: EXIT for '{person_name}' ({values[0]}) dropped: the row of its entry is not known.")
+
+    def _resolve_row(self, row_index):
+        """Sheet row of an entry given its row or its negative reference, or None if unknown."""
+        if row_index > 0:
+            return row_index
+        if row_index in self._entry_rows:
+            return self._entry_rows[row_index]
+        return self.journal.entry_row(-row_index) if self.journal is not None else None
+
+
+def _first_row(updated_range):
+    """First row number of an A1 range such as "'Sheet1'!A12:D14"."""
+    return int(_ROW_RE.match(updated_range.split('!')[-1]).group(1))
+
+
+def _is_rate_limit(error):
+    """True if a gspread APIError is an HTTP 429 quota error."""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from attendance import AttendanceBook
+
+# --- Attendance Book Checks ---
+# A recording stand-in replaces the SheetWriter; times are passed in explicitly.
+NOW = datetime(2026, 10, 18, 9, 0, 0)
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.events = []
+
+    def log_entry(self, person_name, current_dt):
+        self.events.append(('entry', person_name))
+        return -len(self.events) # Like SheetWriter: a negative reference until the row is written
+
+    def log_exit(self, person_name, row_index, current_dt):
+        self.events.append(('exit', person_name, row_index))
+
+
+def test_sightings_toggle_after_the_cooldown():
+    writer = RecordingWriter()
+    book = AttendanceBook(writer, cooldown_seconds=10, capacity=2)
+
+    results = book.record_sightings(["Alice", "Bob", "Alice"], NOW, 100.0)
+    assert [label for label, _, _ in results] == ["ENTRY: Alice", "ENTRY: Bob", "Alice (Cooldown)"]
+    assert book.record_sightings(["Alice"], NOW, 105.0)[0][0] == "Alice (Cooldown)"
+    assert book.record_sightings(["Alice", "Carol"], NOW, 110.0)[0][0] == "EXIT: Alice"
+
+    assert writer.events == [('entry', "Alice"), ('entry', "Bob"), ('exit', "Alice", -1), ('entry', "Carol")]
+    assert sorted(book.present_names()) == ["Bob", "Carol"] and book.num_present() == 2
+    assert len(book) == 3 # Grew past the initial capacity
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "attendance.npz")
+    book = AttendanceBook(RecordingWriter(), cooldown_seconds=10)
+    for person_name in ["Alice", "Bob", "Carol"]:
+        book.add_person(person_name)
+    book.record_sightings(["Bob", "Carol"], NOW, 100.0)
+    book.record_sightings(["Carol"], NOW, 200.0)
+    book.save_snapshot(path)
+
+    writer = RecordingWriter()
+    restored = AttendanceBook(writer, cooldown_seconds=10)
+    restored.add_person("Dave") # Slots differ from the saved book
+    assert restored.load_snapshot(path) == pytest.approx(datetime.now().timestamp(), abs=60)
+    assert restored.present_names() == ["Bob"]
+    # Bob's cooldown and entry reference survived the restart
+    assert restored.record_sightings(["Bob"], NOW, 105.0)[0][0] == "Bob (Cooldown)"
+    assert restored.record_sightings(["Bob"], NOW, 110.0)[0][0] == "EXIT: Bob"
+    assert writer.events == [('exit', "Bob", -1)]
+
+
+def test_snapshot_of_another_version_is_refused(tmp_path):
+    path = str(tmp_path / "attendance.npz")
+    np.savez_compressed(path, version=99, saved_at=0.0, names=np.array([], dtype=str), is_in=np.zeros(0, dtype=bool),
+                        entry_row=np.zeros(0, dtype=np.int64), last_action_time=np.zeros(0))
+    with pytest.raises(ValueError):
+        AttendanceBook(RecordingWriter(), cooldown_seconds=10).load_snapshot(path)
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+from attendance import AttendanceBook
+from attendance_recovery import apply_pending_events, read_open_entries, recover_attendance, save_checkpoint, load_checkpoint
+from fake_sheets import FakeWorksheet
+from sheet_writer import SHEET_HEADER
+
+# --- Attendance Recovery Checks ---
+# Runs against fake_sheets.FakeWorksheet, so no network or Google account is needed:
+#   python -m pytest -q
+TODAY = "2026-10-18"
+YESTERDAY = "2026-10-17"
+SHEET_KEY = "sheet/Attendance"
+
+
+def make_sheet(rows):
+    return FakeWorksheet([SHEET_HEADER] + [list(row) for row in rows])
+
+
+# --- Recovery ---
+def test_recovery_without_checkpoint_reads_today_open_rows():
+    worksheet = make_sheet([
+        ["Alice", YESTERDAY, "09:00:00", ""],        # Yesterday, never closed: not IN today
+        ["Bob", TODAY, "08:00:00", "08:30:00"],      # Closed
+        ["Carol", TODAY, "08:10:00", ""],            # Open
+        ["Bob", TODAY, "09:00:00", ""],              # Open again, later row wins
+    ])
+    open_entries, used_rows, rows_read = read_open_entries(worksheet, None, TODAY)
+    assert open_entries == {"Carol": 4, "Bob": 5}
+    assert (used_rows, rows_read) == (5, 4)
+
+
+def test_recovery_later_closed_row_clears_earlier_open_row():
+    worksheet = make_sheet([
+        ["Alice", TODAY, "08:00:00", ""],            # Never closed, e.g. a duplicate or a dropped exit
+        ["Alice", TODAY, "08:00:00", "12:00:00"],    # ...but her latest row says she left
+        ["Bob", TODAY, "09:00:00", "09:30:00"],
+        ["Bob", TODAY, "10:00:00", ""],              # Closed earlier, open again
+    ])
+    open_entries, _, _ = read_open_entries(worksheet, None, TODAY)
+    assert open_entries == {"Bob": 5}
+
+    # The same holds for an open row remembered by the checkpoint
+    checkpoint = {'date': TODAY, 'scanned_rows': 2, 'open': {"Alice": 2}}
+    open_entries, _, _ = read_open_entries(worksheet, checkpoint, TODAY)
+    assert open_entries == {"Bob": 5}
+
+
+def test_recovery_same_day_reads_only_new_rows_and_rechecks_open_ones():
+    worksheet = make_sheet([
+        ["Alice", TODAY, "08:00:00", ""],
+        ["Bob", TODAY, "08:05:00", ""],
+    ])
+    checkpoint = {'date': TODAY, 'scanned_rows': 3, 'open': {"Alice": 2, "Bob": 3}}
+    worksheet.update("D2", [["09:00:00"]])          # Alice left after the checkpoint
+    worksheet.update("A4:D4", [["Dave", TODAY, "09:10:00", ""]])
+
+    open_entries, used_rows, rows_read = read_open_entries(worksheet, checkpoint, TODAY)
+    assert open_entries == {"Bob": 3, "Dave": 4}
+    assert (used_rows, rows_read) == (4, 1)
+    assert worksheet.calls['col_values'] == 0 and worksheet.calls['batch_get'] == 1
+
+
+def test_recovery_new_day_ignores_rows_before_checkpoint():
+    worksheet = make_sheet([
+        ["Alice", YESTERDAY, "08:00:00", ""],
+        ["Bob", TODAY, "07:55:00", ""],
+    ])
+    checkpoint = {'date': YESTERDAY, 'scanned_rows': 2, 'open': {"Alice": 2}}
+    open_entries, used_rows, rows_read = read_open_entries(worksheet, checkpoint, TODAY)
+    assert open_entries == {"Bob": 3}
+    assert (used_rows, rows_read) == (3, 1)
+
+
+def test_recovery_rescans_after_sheet_shrank():
+    worksheet = make_sheet([["Carol", TODAY, "08:00:00", ""]])
+    checkpoint = {'date': TODAY, 'scanned_rows': 40, 'open': {"Alice": 30}} # Rows were deleted by hand
+    open_entries, used_rows, rows_read = read_open_entries(worksheet, checkpoint, TODAY)
+    assert open_entries == {"Carol": 2}
+    assert (used_rows, rows_read) == (2, 1)
+
+
+def test_checkpoint_round_trip_and_other_sheet(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    save_checkpoint(path, SHEET_KEY, TODAY, 7, {"Alice": 5})
+    assert load_checkpoint(path, SHEET_KEY) == {'date': TODAY, 'scanned_rows': 7, 'open': {"Alice": 5}}
+    assert load_checkpoint(path, "other/sheet") is None
+
+
+def test_pending_journal_events_are_folded_in():
+    open_entries = {"Alice": 2, "Bob": 3}
+    pending = [
+        ('exit', "Alice", 2, ["10:00:00"]),                          # Alice left, not yet in the sheet
+        ('entry', "Carol", -7, ["Carol", TODAY, "10:01:00", ""]),    # Carol came in, row not known yet
+        ('entry', "Dave", -8, ["Dave", TODAY, "10:02:00", ""]),
+        ('exit', "Dave", -8, ["10:03:00"]),                          # ...and Dave already left again
+        ('entry', "Erin", -9, ["Erin", YESTERDAY, "23:59:00", ""]),  # Not today
+    ]
+    assert apply_pending_events(open_entries, pending, TODAY) == {"Bob": 3, "Carol": -7}
+
+
+def test_recover_attendance_restores_book_and_writes_checkpoint(tmp_path):
+    worksheet = make_sheet([["Alice", TODAY, "08:00:00", ""], ["Bob", TODAY, "08:05:00", ""]])
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    book = AttendanceBook(None, cooldown_seconds=0)
+    today = datetime.now().strftime("%Y-%m-%d")
+    worksheet.update("B2:B3", [[today], [today]])
+    pending = [('exit', "Bob", 3, ["09:00:00"]), ('entry', "Carol", -4, ["Carol", today, "09:01:00", ""])]
+
+    assert recover_attendance(worksheet, book, lambda: pending, checkpoint_path, SHEET_KEY) == 3
+    assert sorted(book.present_names()) == ["Alice", "Carol"]
+    # The checkpoint covers the sheet only; pending events are replayed again on the next start
+    assert load_checkpoint(checkpoint_path, SHEET_KEY)['open'] == {"Alice": 2, "Bob": 3}
@@ -0,0 +1,66 @@
+import numpy as np
+
+from detection_control import ADJUST_INTERVAL_SECONDS, DetectionController, detect_faces, scale_rects_to_full
+
+# --- Detection Control Checks ---
+# A stand-in detector returns dlib-like rectangles, so no dlib models are needed.
+
+
+class Rect:
+    def __init__(self, top, right, bottom, left):
+        self._box = (top, right, bottom, left)
+
+    def top(self):
+        return self._box[0]
+
+    def right(self):
+        return self._box[1]
+
+    def bottom(self):
+        return self._box[2]
+
+    def left(self):
+        return self._box[3]
+
+
+def test_boxes_are_mapped_back_to_full_resolution():
+    boxes = scale_rects_to_full([Rect(10, 60, 50, 20), Rect(-5, 400, 300, 300)], 0.5, (480, 640, 3))
+    assert boxes == [(20, 120, 100, 40), (0, 639, 479, 600)]
+
+
+def test_detection_runs_on_a_small_grayscale_frame():
+    seen = []
+
+    def detector(image, upsample):
+        seen.append(image.shape)
+        return [Rect(10, 60, 50, 20)]
+
+    assert detect_faces(detector, np.zeros((480, 640, 3), dtype=np.uint8), 0.25) == [(40, 240, 200, 80)]
+    assert seen == [(120, 160)]
+
+
+def test_detect_every_n_frames():
+    controller = DetectionController(detect_every=3)
+    assert [controller.should_detect() for _ in range(7)] == [True, False, False, True, False, False, True]
+
+
+def record(controller, seconds):
+    controller._last_adjust -= ADJUST_INTERVAL_SECONDS # Allow an adjustment on every call
+    controller.record_frame(seconds)
+
+
+def test_adaptive_mode_lowers_scale_before_skipping_and_restores_in_reverse():
+    controller = DetectionController(scale=0.5, target_fps=10, min_scale=0.375, max_skip=3)
+    settings = []
+    controller.frame_time = 0.2
+    for _ in range(4):
+        record(controller, 0.2) # 5 fps, half the target
+        settings.append((controller.scale, controller.detect_every))
+    assert settings == [(0.375, 1), (0.375, 2), (0.375, 3), (0.375, 3)]
+
+    settings = []
+    controller.frame_time = 0.01
+    for _ in range(4):
+        record(controller, 0.01) # 100 fps
+        settings.append((controller.scale, controller.detect_every))
+    assert settings == [(0.375, 2), (0.375, 1), (0.5, 1), (0.5, 1)] # Never above the configured scale
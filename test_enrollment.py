@@ -0,0 +1,79 @@
+import csv
+import os
+import time
+
+import numpy as np
+
+from enrollment import STATUS_FAILED, BulkImport, EnrollmentQueue
+from face_updates import read_pending_updates
+
+# --- Enrollment Checks ---
+# Worker functions are module-level so the process pool can pickle them; no face models are loaded.
+
+
+def wait_for_job(queue, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while queue.status(job_id)['finished'] is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return queue.status(job_id)
+
+
+def crash_or_reject(data, max_side):
+    if data == b"crash":
+        os._exit(1) # Like a worker killed for running out of memory
+    return {'ok': False, 'message': "No face found."}
+
+
+def test_dead_worker_fails_its_job_and_the_queue_recovers(tmp_path, monkeypatch):
+    monkeypatch.setattr("enrollment.encode_face_photo", crash_or_reject)
+    queue = EnrollmentQueue(str(tmp_path / "faces"), str(tmp_path / "inbox"), workers=1)
+    try:
+        crashed = wait_for_job(queue, queue.submit("Alice", b"crash"))
+        assert crashed['status'] == STATUS_FAILED and "stopped unexpectedly" in crashed['message']
+
+        job = wait_for_job(queue, queue.submit("Bob", b"photo"))
+        assert job['status'] == STATUS_FAILED and job['message'] == "No face found."
+    finally:
+        queue.shutdown()
+
+
+def encode_fake_file(path, max_side):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data == b"no face":
+        return {'ok': False, 'message': "No face found.", 'encoding': None, 'jpeg': None}
+    return {'ok': True, 'message': "", 'encoding': np.full(128, len(data), dtype=np.float64), 'jpeg': data}
+
+
+def read_report(report_path):
+    with open(report_path, newline='') as f:
+        return {row['source']: row['status'] for row in csv.DictReader(f)}
+
+
+def test_bulk_import_reports_every_photo_and_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr("enrollment.encode_face_file", encode_fake_file)
+    source, faces_dir, inbox_dir = tmp_path / "source", str(tmp_path / "faces"), str(tmp_path / "inbox")
+    report_path = str(tmp_path / "report.csv")
+    os.makedirs(source)
+    for filename, data in [("alice.jpg", b"a"), ("alice.png", b"a"), ("alice__2.jpg", b"aa"), ("bob.jpg", b"no face")]:
+        (source / filename).write_bytes(data)
+
+    counts = BulkImport(str(source), faces_dir, inbox_dir, report_path, workers=1, batch_size=1,
+                        skipped=[("../evil.jpg", "Filename contains a path separator, skipped.")]).run()
+    assert read_report(report_path) == {"../evil.jpg": "skipped", "alice.jpg": "added", "alice.png": "duplicate",
+                                        "alice__2.jpg": "added", "bob.jpg": "rejected"}
+    assert counts == {'skipped': 1, 'added': 2, 'duplicate': 1, 'rejected': 1}
+    assert sorted(os.listdir(faces_dir)) == ["alice.jpg", "alice__2.jpg"]
+    assert sorted(filename for _, _, filename, _ in read_pending_updates(inbox_dir)) == ["alice.jpg", "alice__2.jpg"]
+
+    # An import stopped before its last rows were written picks up after the listed photos
+    with open(report_path) as f:
+        lines = f.readlines()
+    with open(report_path, 'w') as f:
+        f.writelines(line for line in lines if not line.startswith("bob.jpg"))
+    (source / "carol.jpg").write_bytes(b"ccc")
+    counts = BulkImport(str(source), faces_dir, inbox_dir, report_path, workers=1).run()
+    assert counts == {'already imported': 3, 'added': 1, 'rejected': 1}
+    report = read_report(report_path)
+    assert report["carol.jpg"] == "added" and report["bob.jpg"] == "rejected"
+    assert len(report) == 6
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+import face_cache
+
+# --- Face Cache Checks ---
+# _encode_image is replaced by a stand-in that derives the encoding from the file's bytes,
+# so no dlib models are needed and every call is counted.
+
+
+def fake_encoder(monkeypatch):
+    encoded = []
+
+    def encode_image(image_path):
+        data = open(image_path, 'rb').read()
+        encoded.append(os.path.basename(image_path))
+        if data == b"no face":
+            return None
+        return np.full(128, len(data), dtype=np.float64)
+
+    monkeypatch.setattr(face_cache, "_encode_image", encode_image)
+    return encoded
+
+
+def write_image(faces_dir, filename, data):
+    with open(os.path.join(faces_dir, filename), 'wb') as f:
+        f.write(data)
+
+
+def test_only_new_or_changed_images_are_encoded(tmp_path, monkeypatch):
+    encoded = fake_encoder(monkeypatch)
+    faces_dir, cache_dir = str(tmp_path / "faces"), str(tmp_path / "cache")
+    os.makedirs(faces_dir)
+    write_image(faces_dir, "alice.jpg", b"a")
+    write_image(faces_dir, "alice__2.jpg", b"aa")
+    write_image(faces_dir, "bob.jpg", b"bbb")
+    write_image(faces_dir, "nobody.jpg", b"no face")
+
+    names, encodings = face_cache.load_encodings(faces_dir, cache_dir)
+    assert names == ["Alice", "Alice", "Bob"]
+    assert encodings[:, 0].tolist() == [1.0, 2.0, 3.0]
+    assert sorted(encoded) == ["alice.jpg", "alice__2.jpg", "bob.jpg", "nobody.jpg"]
+
+    encoded.clear()
+    names, encodings = face_cache.load_encodings(faces_dir, cache_dir)
+    assert encoded == [] and names == ["Alice", "Alice", "Bob"]
+    assert not isinstance(encodings, np.memmap) # Never hand out a map of a file that updates replace
+
+    os.utime(os.path.join(faces_dir, "bob.jpg"), (1, 1)) # Touched, same contents
+    write_image(faces_dir, "alice.jpg", b"aaaa")
+    os.remove(os.path.join(faces_dir, "alice__2.jpg"))
+    names, encodings = face_cache.load_encodings(faces_dir, cache_dir)
+    assert encoded == ["alice.jpg"] # The image without a face is not retried either
+    assert names == ["Alice", "Bob"] and encodings[:, 0].tolist() == [4.0, 3.0]
+
+
+def test_applied_updates_are_not_encoded_again(tmp_path, monkeypatch):
+    encoded = fake_encoder(monkeypatch)
+    faces_dir, cache_dir = str(tmp_path / "faces"), str(tmp_path / "cache")
+    os.makedirs(faces_dir)
+    write_image(faces_dir, "alice.jpg", b"a")
+    face_cache.load_encodings(faces_dir, cache_dir)
+
+    write_image(faces_dir, "carol.jpg", b"c")
+    os.remove(os.path.join(faces_dir, "alice.jpg"))
+    face_cache.apply_updates(faces_dir, cache_dir, {"carol.jpg": np.full(128, 9.0)}, {"alice.jpg"})
+
+    encoded.clear()
+    names, encodings, filenames = face_cache.load_encodings(faces_dir, cache_dir, with_filenames=True)
+    assert encoded == []
+    assert names == ["Carol"] and filenames == ["carol.jpg"] and encodings[0, 0] == 9.0
+
+
+def test_sample_filenames():
+    assert face_cache.person_name_from_filename("jane_doe__glasses.jpg") == "Jane Doe"
+    assert face_cache.sample_from_filename("jane_doe__glasses.jpg") == "glasses"
+    assert face_cache.sample_from_filename("jane_doe.jpg") is None
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from face_gallery import FaceGallery, identity_rows
+
+# --- Face Gallery Checks ---
+# Matching is compared against plain per-row distances computed in float64.
+
+
+def random_gallery(rng, people=50):
+    names = [f"Person {i}" for i in range(people)]
+    return names, rng.normal(scale=0.1, size=(people, 128)).astype(np.float32) # The gallery stores float32
+
+
+def test_distances_match_plain_euclidean_distances():
+    rng = np.random.default_rng(1)
+    names, encodings = random_gallery(rng)
+    queries = rng.normal(scale=0.1, size=(5, 128))
+    gallery = FaceGallery(names, encodings)
+
+    expected = np.linalg.norm(queries[:, None, :] - encodings[None, :, :], axis=2)
+    np.testing.assert_allclose(gallery.distances(queries), expected, rtol=1e-4, atol=1e-4)
+    indices, distances = gallery.nearest(queries, k=3)
+    np.testing.assert_array_equal(indices, np.argsort(expected, axis=1)[:, :3])
+    np.testing.assert_allclose(distances, np.sort(expected, axis=1)[:, :3], rtol=1e-4, atol=1e-4)
+
+
+def test_match_applies_the_tolerance_in_float64():
+    rng = np.random.default_rng(2)
+    names, encodings = random_gallery(rng, people=3)
+    query = encodings[1].astype(np.float64) + 0.001
+    distance = float(np.linalg.norm(encodings[1] - query))
+
+    (name, matched_distance), = FaceGallery(names, encodings, tolerance=distance * 1.000001).match([query])
+    assert name == "Person 1" and matched_distance == pytest.approx(distance, rel=1e-12)
+    assert FaceGallery(names, encodings, tolerance=distance * 0.999999).match([query])[0][0] is None
+
+
+def test_empty_gallery_matches_nobody():
+    gallery = FaceGallery([], np.empty((0, 128)))
+    assert gallery.match(np.zeros((2, 128))) == [(None, None), (None, None)]
+    gallery.upsert("Alice", np.zeros(128))
+    assert gallery.match(np.zeros((1, 128)))[0][0] == "Alice"
+
+
+def reference_distances(names, encodings, mode, max_exemplars):
+    """Brute-force (faces x people) distances: every stored row of a person, reduced in Python."""
+    people = list(dict.fromkeys(names))
+    samples = {name: [e for n, e in zip(names, encodings) if n == name] for name in people}
+
+    def distances(query):
+        row = []
+        for name in people:
+            rows = identity_rows(samples[name], max_exemplars).astype(np.float64)
+            person_distances = [np.linalg.norm(query - r) for r in rows]
+            row.append(min(person_distances) if mode == "min" else sum(person_distances) / len(person_distances))
+        return row
+    return people, distances
+
+
+@pytest.mark.parametrize("mode", ["min", "mean"])
+def test_gallery_reduction_matches_brute_force(mode):
+    rng = np.random.default_rng(11)
+    names = ["a", "b", "b", "c", "c", "c", "c", "c", "c", "d"]
+    encodings = rng.normal(scale=0.1, size=(len(names), 128)).astype(np.float32)
+    queries = rng.normal(scale=0.1, size=(6, 128))
+    gallery = FaceGallery(names, encodings, tolerance=10.0, match_mode=mode, max_exemplars=3)
+    people, distances = reference_distances(names, encodings, mode, 3)
+
+    expected = np.array([distances(query) for query in queries])
+    assert gallery.names == people
+    np.testing.assert_allclose(gallery.distances(queries), expected, rtol=1e-4, atol=1e-4)
+    best = expected.argmin(axis=1)
+    assert [name for name, _ in gallery.match(queries)] == [people[i] for i in best]
+    np.testing.assert_allclose([d for _, d in gallery.match(queries)], expected[np.arange(len(queries)), best], rtol=1e-6)
+
+    shared = FaceGallery.from_rows(gallery.names, gallery.encodings, gallery.row_counts, tolerance=10.0, match_mode=mode)
+    assert np.shares_memory(shared.encodings, gallery.encodings)
+    np.testing.assert_allclose(shared.distances(queries), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_gallery_sample_updates():
+    rng = np.random.default_rng(3)
+    first, second = rng.normal(scale=0.1, size=(2, 128))
+    gallery = FaceGallery(["a"], [first], tolerance=0.01, sample_keys=["a.jpg"])
+    gallery.upsert("a", second, sample_key="a__2.jpg")
+    assert gallery.row_counts.tolist() == [3] # Centroid plus both samples
+    assert gallery.match([second])[0][0] == "a"
+    assert gallery.remove("a", sample_key="a.jpg")
+    assert gallery.row_counts.tolist() == [1]
+    assert gallery.match([first])[0][0] is None
+    assert gallery.remove("a", sample_key="a__2.jpg")
+    assert len(gallery) == 0
+
+
+def test_apply_updates_swaps_in_one_snapshot():
+    rng = np.random.default_rng(4)
+    names, encodings = random_gallery(rng, people=3)
+    gallery = FaceGallery(names, encodings, sample_keys=["0.jpg", "1.jpg", "2.jpg"])
+    before = gallery._data
+    new_samples = rng.normal(scale=0.1, size=(3, 128))
+    snapshots = []
+    build_snapshot = gallery._snapshot
+    gallery._snapshot = lambda: snapshots.append(1) or build_snapshot()
+
+    removed = gallery.apply_updates([("Person 0", new_samples[0], "0__2.jpg"), ("Person 3", new_samples[1], "3.jpg"),
+                                     ("Person 4", new_samples[2], "4.jpg")],
+                                    [("Person 1", "1.jpg"), ("Person 2", "missing.jpg")])
+    assert removed == [("Person 1", "1.jpg")] and len(snapshots) == 1
+    assert before.names == names # Readers holding the old snapshot are unaffected
+    assert sorted(gallery.names) == ["Person 0", "Person 2", "Person 3", "Person 4"]
+    assert gallery.row_counts[gallery.names.index("Person 0")] == 3
+    assert [name for name, _ in gallery.match(new_samples[1:])] == ["Person 3", "Person 4"]
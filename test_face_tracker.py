@@ -0,0 +1,43 @@
+import numpy as np
+
+from face_tracker import FaceTracker, box_iou
+
+# --- Face Tracker Checks ---
+# Boxes are (top, right, bottom, left); times are passed in explicitly.
+
+
+def test_box_iou():
+    iou = box_iou([(0, 10, 10, 0)], [(0, 10, 10, 0), (0, 15, 10, 5), (20, 30, 30, 20)])
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], rtol=1e-6)
+
+
+def test_tracks_follow_moving_faces_and_expire():
+    tracker = FaceTracker(max_missed=1)
+    first, second = tracker.update([(0, 100, 100, 0), (0, 400, 100, 300)])
+    assert first.track_id != second.track_id
+
+    # Both faces moved a little, and are listed in the opposite order
+    moved_second, moved_first = tracker.update([(0, 410, 100, 310), (0, 105, 100, 5)])
+    assert moved_first is first and moved_second is second
+    assert first.box == (0, 105, 100, 5)
+
+    tracker.update([(0, 105, 100, 5)]) # The second face is missed once...
+    assert second in tracker.tracks
+    tracker.update([(0, 105, 100, 5)]) # ...and dropped after max_missed
+    assert tracker.tracks == [first]
+    (new,) = tracker.update([(0, 410, 100, 310)])
+    assert new is not second and new.track_id > second.track_id
+
+
+def test_only_new_unconfident_or_stale_tracks_are_encoded():
+    tracker = FaceTracker(refresh_interval=3.0, confident_distance=0.45, unknown_retry_interval=0.5)
+    known, unsure, unknown = tracker.update([(0, 100, 100, 0), (0, 300, 100, 200), (0, 500, 100, 400)])
+    assert all(tracker.needs_encoding(track, 0.0) for track in (known, unsure, unknown))
+
+    tracker.set_identity(known, "Alice", 0.3, 0.0)
+    tracker.set_identity(unsure, "Bob", 0.5, 0.0)
+    tracker.set_identity(unknown, None, None, 0.0)
+    assert not tracker.needs_encoding(known, 2.9) and tracker.needs_encoding(known, 3.0)
+    assert tracker.needs_encoding(unsure, 0.1)
+    assert not tracker.needs_encoding(unknown, 0.4) and tracker.needs_encoding(unknown, 0.5)
+    assert tracker.encodes_done.count == 3
@@ -0,0 +1,42 @@
+import numpy as np
+
+from motion_gate import MotionGate
+
+# --- Motion Gate Checks ---
+# Frames are synthetic and every check gets an explicit time.
+
+
+def frame(value=0, square_at=None):
+    image = np.full((480, 640, 3), value, dtype=np.uint8)
+    if square_at is not None:
+        image[100:300, square_at:square_at + 200] = 255
+    return image
+
+
+def test_gate_closes_after_warm_down_and_wakes_on_motion():
+    gate = MotionGate(warm_down_seconds=1.0, idle_check_fps=5.0)
+    assert gate.check(frame(), now=0.0) # Open at start
+    assert gate.check(frame(), now=0.5)
+    assert not gate.check(frame(), now=1.5) # Nothing moved for longer than the warm-down
+
+    # While closed, frames between idle checks are not even looked at
+    assert not gate.check(frame(square_at=100), now=1.6)
+    assert gate.check(frame(square_at=100), now=1.8)
+    assert gate.wake_ups == 1
+    assert gate.check(frame(square_at=100), now=2.5) # Standing still, within the warm-down
+
+
+def test_duty_cycle_counts_open_time():
+    gate = MotionGate(warm_down_seconds=1.0, idle_check_fps=0)
+    for step in range(41):
+        gate.check(frame(), now=step * 0.1)
+    # Open from 0 to 1.1s (the first check after the warm-down closes it) out of 4s
+    assert abs(gate.duty_cycle - 1.1 / 4.0) < 1e-6
+
+
+def test_gate_can_run_on_a_video_clock():
+    video_time = [0.0]
+    gate = MotionGate(warm_down_seconds=1.0, clock=lambda: video_time[0])
+    gate.check(frame())
+    video_time[0] = 2.0
+    assert not gate.check(frame())
@@ -0,0 +1,203 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from attendance_journal import AttendanceJournal
+from fake_sheets import FakeWorksheet
+from sheet_writer import SHEET_HEADER, SheetWriter
+
+# --- Sheet Writer Checks ---
+# Several writers, restarts and crashes against one fake_sheets.FakeWorksheet.
+TODAY = "2026-10-18"
+
+
+def make_sheet(rows):
+    return FakeWorksheet([SHEET_HEADER] + [list(row) for row in rows])
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = AttendanceJournal(str(tmp_path / "journal.db"), durable=False)
+    yield journal
+    journal.close()
+
+
+def start_writer(worksheet, journal=None, restore=None):
+    writer = SheetWriter(worksheet, flush_interval=0.01, journal=journal)
+    writer.start(restore=restore)
+    return writer
+
+
+def test_two_writers_never_overwrite_each_other(tmp_path):
+    worksheet = make_sheet([])
+    door1 = start_writer(worksheet, AttendanceJournal(str(tmp_path / "door1.db"), durable=False))
+    door2 = start_writer(worksheet, AttendanceJournal(str(tmp_path / "door2.db"), durable=False))
+    now = datetime.now()
+    alice = door1.log_entry("Alice", now)
+    bob = door2.log_entry("Bob", now)
+    door1.stop()
+    door2.stop()
+    worksheet.append_row(["Hand-typed", TODAY, "12:00:00", ""]) # Someone editing the sheet
+    door1 = start_writer(worksheet, door1.journal)
+    door1.log_exit("Alice", alice, now)
+    door1.log_entry("Carol", now)
+    door1.stop()
+    door2.log_exit("Bob", bob, now) # Queued after its writer stopped: written by the next start
+    door2 = start_writer(worksheet, door2.journal)
+    door2.stop()
+
+    names = [row[0] for row in worksheet.get_all_values()[1:]]
+    assert sorted(names) == ["Alice", "Bob", "Carol", "Hand-typed"]
+    exits = {row[0]: row[3] for row in worksheet.get_all_values()[1:]}
+    assert exits["Alice"] and exits["Bob"] and not exits["Carol"] and not exits["Hand-typed"]
+    door1.journal.close()
+    door2.journal.close()
+
+
+def test_exit_queued_before_entry_is_written_lands_in_the_same_row(journal):
+    worksheet = make_sheet([])
+    writer = SheetWriter(worksheet, flush_interval=60.0, journal=journal)
+    writer.start()
+    now = datetime.now()
+    entry_ref = writer.log_entry("Alice", now)
+    writer.log_exit("Alice", entry_ref, now + timedelta(minutes=5))
+    writer.stop()
+
+    assert worksheet.get_all_values()[1][:4] == ["Alice", now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"),
+                                             (now + timedelta(minutes=5)).strftime("%H:%M:%S")]
+    assert worksheet.calls['append_rows'] == 1 and worksheet.calls['batch_update'] == 0
+    assert journal.lag()[0] == 0
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """Applies the first append and then times out, as if the response was lost on the way back."""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.lost_responses = 1
+
+    def append_rows(self, values, **kwargs):
+        response = super().append_rows(values, **kwargs)
+        if self.lost_responses:
+            self.lost_responses -= 1
+            raise TimeoutError("The read operation timed out")
+        return response
+
+
+def test_retry_after_lost_append_response_does_not_duplicate_rows(journal):
+    worksheet = FlakyWorksheet([SHEET_HEADER, ["Zed", TODAY, "07:00:00", "", ""]])
+    writer = SheetWriter(worksheet, flush_interval=0.01, max_backoff=0.01, journal=journal)
+    writer.start()
+    now = datetime.now()
+    alice = writer.log_entry("Alice", now)
+    writer.log_exit("Alice", alice, now + timedelta(minutes=1)) # Merged into the append that times out
+    writer.log_entry("Bob", now)
+    wait_until(lambda: not journal.unreplicated())
+    writer.stop()
+
+    rows = worksheet.get_all_values()[1:]
+    assert [row[0] for row in rows] == ["Zed", "Alice", "Bob"]
+    assert rows[1][3] == (now + timedelta(minutes=1)).strftime("%H:%M:%S")
+    assert worksheet.calls['append_rows'] == 1 and journal.unreplicated() == []
+
+
+def test_restart_after_crash_between_append_and_journal_does_not_duplicate_rows(journal):
+    worksheet = make_sheet([])
+    now = datetime.now()
+    crashed = SheetWriter(worksheet, journal=journal)
+    crashed.log_entry("Alice", now)
+    crashed.log_entry("Bob", now)
+    # The last run appended Alice's row, then died before marking it replicated
+    (event_id, _, _, _, values), _ = journal.unreplicated()
+    worksheet.append_rows([values + [f"{journal.writer_id}-{event_id}"]])
+
+    writer = start_writer(worksheet, journal)
+    alice = -event_id
+    writer.log_exit("Alice", alice, now)
+    writer.stop()
+
+    rows = worksheet.get_all_values()[1:]
+    assert [row[0] for row in rows] == ["Alice", "Bob"]
+    assert rows[0][3] == now.strftime("%H:%M:%S")
+    assert journal.entry_row(event_id) == 2
+
+
+def test_restart_replays_unwritten_events(journal):
+    worksheet = make_sheet([])
+    now = datetime.now()
+    crashed = SheetWriter(worksheet, journal=journal) # Never started: nothing reached the sheet
+    alice = crashed.log_entry("Alice", now)
+    crashed.log_entry("Bob", now)
+    crashed.log_exit("Alice", alice, now)
+
+    restored = []
+    writer = start_writer(worksheet, journal, restore=lambda _, pending_events: restored.append(pending_events()))
+    writer.stop()
+
+    assert [(kind, name) for kind, name, _, _ in restored[0]] == [('entry', "Alice"), ('entry', "Bob"), ('exit', "Alice")]
+    rows = worksheet.get_all_values()[1:]
+    assert [row[0] for row in rows] == ["Alice", "Bob"]
+    assert rows[0][3] and not rows[1][3]
+    assert journal.unreplicated() == []
+
+
+def test_exit_after_restart_finds_the_entry_row_in_the_journal(journal):
+    worksheet = make_sheet([["Zed", TODAY, "07:00:00", ""]])
+    now = datetime.now()
+    writer = start_writer(worksheet, journal)
+    entry_ref = writer.log_entry("Alice", now)
+    writer.stop()
+
+    writer = start_writer(worksheet, journal)
+    writer.log_exit("Alice", entry_ref, now) # Reference kept by the attendance snapshot
+    writer.stop()
+    assert worksheet.get_all_values()[2][0] == "Alice"
+    assert worksheet.get_all_values()[2][3] == now.strftime("%H:%M:%S")
+
+
+def test_cleared_sheet_gets_new_rows_from_the_top(journal):
+    worksheet = make_sheet([])
+    now = datetime.now()
+    writer = start_writer(worksheet, journal)
+    for i in range(50):
+        writer.log_entry(f"Person {i}", now)
+    writer.stop()
+    assert len(worksheet.get_all_values()) == 51
+
+    worksheet.rows = {1: list(SHEET_HEADER)} # Sheet archived, header kept
+    writer = start_writer(worksheet, journal)
+    writer.log_entry("Alice", now)
+    writer.stop()
+    assert worksheet.get_all_values()[1][0] == "Alice"
+
+
+def test_writer_started_without_a_sheet_connects_and_recovers_later(journal):
+    worksheet = make_sheet([["Zed", TODAY, "07:00:00", ""]])
+    attempts = []
+
+    def connect():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ConnectionError("Google Sheets unreachable")
+        return worksheet
+
+    restored = []
+    writer = SheetWriter(None, flush_interval=0.01, journal=journal, connect=connect)
+    writer.start(restore=lambda opened, pending_events: restored.append((opened, pending_events())) or 2)
+    entry_ref = writer.log_entry("Alice", datetime.now()) # Journal-only: kept locally until the sheet is reachable
+    wait_until(lambda: not journal.unreplicated())
+    writer.log_exit("Alice", entry_ref, datetime.now())
+    writer.stop()
+
+    assert len(attempts) == 2
+    (opened, pending_events), = restored # Recovered once, with the event logged while disconnected
+    assert opened is worksheet and [(kind, name, row) for kind, name, row, _ in pending_events] == [('entry', "Alice", entry_ref)]
+    assert [row[0] for row in worksheet.get_all_values()[1:]] == ["Zed", "Alice"]
+    assert worksheet.get_all_values()[2][3]
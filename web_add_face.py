@@ -1,11 +1,33 @@
+import io
 import os
-from flask import Flask, request, render_template, redirect, url_for, flash
-import cv2 # Still needed for face_recognition's image loading/saving capabilities
-import face_recognition
-import numpy as np # Still needed by face_recognition for image arrays
+import shutil
+import tempfile
+import threading
+import uuid
+from flask import Flask, Request, request, render_template, redirect, url_for, flash, jsonify, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+import face_cache
+import face_updates
+from enrollment import EnrollmentQueue, BulkImport, face_filename
 
 # --- Flask App Setup ---
+class EnrollmentRequest(Request):
+    """
+    Applies each route's upload limit before the body is parsed, and keeps single photo
+    uploads in memory (Werkzeug spools files over 500 KB to temporary files).
+    """
+
+    @property
+    def max_content_length(self):
+        return ROUTE_MAX_CONTENT_LENGTH.get(self.endpoint, super().max_content_length)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint == 'upload_face':
+            return io.BytesIO() # At most MAX_PHOTO_BYTES, read by upload_face right away
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
 app = Flask(__name__)
+app.request_class = EnrollmentRequest
 app.secret_key = 'your_strong_secret_key_here' # !!! IMPORTANT: CHANGE THIS TO A UNIQUE, RANDOM STRING !!!
 # Example: app.secret_key = os.urandom(24).hex()
 
@@ -14,27 +36,81 @@ script_dir = os.path.dirname(__file__)
 # This is now the actual local folder on your laptop where authorized faces will be stored
 AUTHORIZED_FACES_DIR = os.path.join(script_dir, "authorized_faces")
 
+# New encodings are published here so a running idk.py adds the face without a restart
+GALLERY_INBOX_DIR = face_updates.default_inbox_dir(AUTHORIZED_FACES_DIR)
+
+# Uploads are decoded in memory and downscaled to this longest side before face detection
+ENROLL_MAX_IMAGE_SIDE = 1024
+# Worker processes for detection and encoding (None = one per CPU core)
+ENROLL_WORKERS = None
+# Uploads waiting for a worker before new ones are turned away
+ENROLL_MAX_PENDING_JOBS = 64
+# Largest accepted single photo, and largest bulk upload (many photos or one ZIP archive).
+# Bodies over the limit of their route are refused before anything is read; other routes get MAX_FORM_BYTES.
+MAX_PHOTO_BYTES = 32 * 1024 * 1024
+MAX_BULK_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+MAX_FORM_BYTES = 1024 * 1024
+ROUTE_MAX_CONTENT_LENGTH = {'upload_face': MAX_PHOTO_BYTES + MAX_FORM_BYTES, 'bulk_upload': MAX_BULK_UPLOAD_BYTES}
+app.config['MAX_CONTENT_LENGTH'] = MAX_FORM_BYTES
+# Bulk imports write their per-file reports here
+BULK_REPORTS_DIR = os.path.join(face_cache.default_cache_dir(AUTHORIZED_FACES_DIR), "bulk_reports")
+
 # Ensure the authorized_faces directory exists on the laptop
 if not os.path.exists(AUTHORIZED_FACES_DIR):
     os.makedirs(AUTHORIZED_FACES_DIR)
     print(f"Created authorized faces directory on laptop: {AUTHORIZED_FACES_DIR}")
 
+# Detection and encoding run in worker processes; request threads only queue the upload
+enrollment_queue = EnrollmentQueue(AUTHORIZED_FACES_DIR, GALLERY_INBOX_DIR, workers=ENROLL_WORKERS,
+                                   max_pending=ENROLL_MAX_PENDING_JOBS, max_side=ENROLL_MAX_IMAGE_SIDE)
+
+# One bulk import runs at a time, in a background thread with its own process pool
+bulk_imports = {} # bulk_id -> {'import': BulkImport, 'error': str or None}
+bulk_lock = threading.Lock()
+
+def run_bulk_import(bulk_id, upload_dir):
+    """Runs a bulk import in the background and removes the uploaded photos afterwards."""
+    try:
+        bulk_imports[bulk_id]['import'].run()
+    except Exception as e:
+        bulk_imports[bulk_id]['error'] = str(e)
+        print(f"Web Error: Bulk import {bulk_id} failed: {e}")
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+def wants_json():
+    """True for API clients (Accept: application/json) rather than the HTML form."""
+    return request.accept_mimetypes.best == 'application/json'
+
 # --- Web Server Routes ---
 
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """Refuses a request body over its route's limit."""
+    message = 'The upload is too large.'
+    if wants_json():
+        return jsonify({'error': message}), 413
+    flash(message)
+    return redirect(url_for('index'))
+
 @app.route('/')
 def index():
-    """Renders the main upload form."""
-    return render_template('upload.html')
+    """Renders the main upload form with the status of recent uploads."""
+    return render_template('upload.html', jobs=enrollment_queue.recent())
 
 @app.route('/upload_face', methods=['POST'])
 def upload_face():
-    """Handles the photo and name upload, processes, and saves locally."""
+    """
+    Handles the photo and name upload and queues it for face detection and encoding.
+    With 'extra' set, the photo is added as another photo of the person instead of replacing theirs.
+    """
     if 'photo' not in request.files:
         flash('No photo part in the request.')
         return redirect(request.url)
 
     file = request.files['photo']
     name = request.form.get('name', '').strip()
+    extra = request.form.get('extra', '') not in ('', '0', 'false')
 
     if file.filename == '':
         flash('No selected photo.')
@@ -44,50 +120,135 @@ def upload_face():
         flash('Name cannot be empty.')
         return redirect(request.url)
 
-    if file:
-        # Sanitize the name for a valid filename
-        sanitized_name = name.replace(" ", "_").lower()
-        final_image_path = os.path.join(AUTHORIZED_FACES_DIR, f"{sanitized_name}.jpg")
-        
-        # Temporary path for initial save, then process
-        temp_upload_path = os.path.join('/tmp', f"temp_{os.urandom(8).hex()}_{file.filename}")
-
-        try:
-            file.save(temp_upload_path) # Save the uploaded file temporarily
-
-            # Load the image using face_recognition to detect faces
-            image = face_recognition.load_image_file(temp_upload_path)
-            face_locations = face_recognition.face_locations(image)
-
-            if len(face_locations) == 1:
-                # A single face is detected, proceed to save the original uploaded image
-                if os.path.exists(final_image_path):
-                    flash(f"Warning: A face for '{name}' already exists. Overwriting.")
-                
-                # Save the uploaded image directly to the authorized_faces folder
-                # We use cv2.imwrite to ensure consistent image format/quality if needed,
-                # otherwise, a simple os.rename or shutil.copyfile would suffice.
-                # For consistency with how face_recognition loads, it's safer to use cv2.imwrite
-                # after converting to BGR (OpenCV's default).
-                cv2.imwrite(final_image_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
-                
-                flash(f"Successfully added '{name}' to local authorized faces folder!")
-                print(f"Web: Added '{name}' to local authorized faces at {final_image_path}")
-
-            elif len(face_locations) > 1:
-                flash('Multiple faces detected in the photo. Please upload a photo with only one face.')
-            else:
-                flash('No face detected in the photo. Please upload a clearer photo.')
-        
-        except Exception as e:
-            flash(f'An error occurred during processing: {e}')
-            print(f"Web Error: {e}")
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_upload_path):
-                os.remove(temp_upload_path)
-                print(f"Cleaned up temporary upload file: {temp_upload_path}")
+    # The upload was parsed into memory (EnrollmentRequest); decoding happens in a worker process
+    data = file.read()
+    if len(data) > MAX_PHOTO_BYTES:
+        flash('The photo is too large.')
+        return redirect(url_for('index'))
+    job_id = enrollment_queue.submit(name, data, extra=extra)
+    if job_id is None:
+        message = 'The server is busy enrolling other faces. Please try again in a minute.'
+        if wants_json():
+            return jsonify({'error': message}), 503
+        flash(message)
+        return redirect(url_for('index'))
+
+    print(f"Web: Queued photo of '{name}' as job {job_id}")
+    if wants_json():
+        return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+    flash(f"Photo of '{name}' received and is being processed. Its status is shown below.")
+    return redirect(url_for('index'))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Returns the status of an upload as JSON: queued, processing, done or failed."""
+    job = enrollment_queue.status(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job '{job_id}'."}), 404
+    return jsonify(job)
 
+@app.route('/bulk_upload', methods=['POST'])
+def bulk_upload():
+    """
+    Starts a bulk import of many photos ('photos', named after each person) or a ZIP
+    archive ('archive'). Returns right away; progress is at /bulk_jobs/<id>.
+    """
+    photos = [f for f in request.files.getlist('photos') if f.filename]
+    archive = request.files.get('archive')
+    if not photos and not (archive and archive.filename):
+        flash('No photos or archive in the request.')
+        return redirect(url_for('index'))
+
+    with bulk_lock:
+        if any(not job['import'].finished and job['error'] is None for job in bulk_imports.values()):
+            message = 'Another bulk import is still running. Please wait for it to finish.'
+            if wants_json():
+                return jsonify({'error': message}), 503
+            flash(message)
+            return redirect(url_for('index'))
+
+        # Uploads arrive as temporary files; keep them on disk for the import instead of in memory
+        upload_dir = tempfile.mkdtemp(prefix="bulk_enroll_")
+        skipped = [] # (uploaded filename, reason), listed in the import report
+        if archive and archive.filename:
+            source = os.path.join(upload_dir, "upload.zip")
+            archive.save(source)
+        else:
+            source = os.path.join(upload_dir, "photos")
+            os.makedirs(source)
+            saved = {} # Lower-cased filename -> uploaded filename; 'Jane.jpg' and 'jane.jpg' are one file on some systems
+            for photo in photos:
+                # Names are kept as uploaded (including non-ASCII) since they are the person's name
+                if any(separator in photo.filename for separator in ('/', '\\', '\0')):
+                    skipped.append((photo.filename, "Filename contains a path separator, skipped."))
+                    continue
+                filename = os.path.basename(photo.filename)
+                if filename.startswith('.'):
+                    skipped.append((photo.filename, "Hidden filename, skipped."))
+                    continue
+                if filename.lower() in saved:
+                    skipped.append((photo.filename, f"Same filename as '{saved[filename.lower()]}', skipped."))
+                    continue
+                saved[filename.lower()] = photo.filename
+                photo.save(os.path.join(source, filename))
+
+        bulk_id = uuid.uuid4().hex[:12]
+        os.makedirs(BULK_REPORTS_DIR, exist_ok=True)
+        bulk_import = BulkImport(source, AUTHORIZED_FACES_DIR, GALLERY_INBOX_DIR, os.path.join(BULK_REPORTS_DIR, f"{bulk_id}.csv"),
+                                 workers=ENROLL_WORKERS, max_side=ENROLL_MAX_IMAGE_SIDE, resume=False, skipped=skipped)
+        bulk_imports[bulk_id] = {'import': bulk_import, 'error': None}
+        threading.Thread(target=run_bulk_import, args=(bulk_id, upload_dir), name=f"bulk-{bulk_id}", daemon=True).start()
+
+    print(f"Web: Started bulk import {bulk_id}" + (f" ({len(skipped)} uploaded files skipped)" if skipped else ""))
+    if wants_json():
+        return jsonify({'bulk_id': bulk_id, 'status_url': url_for('bulk_status', bulk_id=bulk_id),
+                        'skipped': [{'filename': filename, 'message': message} for filename, message in skipped]}), 202
+    for filename, message in skipped:
+        flash(f"'{filename}': {message}")
+    flash(f"Bulk import started. Progress: {url_for('bulk_status', bulk_id=bulk_id)}, "
+          f"report: {url_for('bulk_report', bulk_id=bulk_id)}")
+    return redirect(url_for('index'))
+
+@app.route('/bulk_jobs/<bulk_id>')
+def bulk_status(bulk_id):
+    """Returns the per-status counts of a bulk import as JSON."""
+    job = bulk_imports.get(bulk_id)
+    if job is None:
+        return jsonify({'error': f"Unknown bulk import '{bulk_id}'."}), 404
+    return jsonify({'id': bulk_id, 'error': job['error'], 'counts': job['import'].progress(),
+                    'report_url': url_for('bulk_report', bulk_id=bulk_id)})
+
+@app.route('/bulk_jobs/<bulk_id>/report')
+def bulk_report(bulk_id):
+    """Downloads the per-file CSV report of a bulk import (complete once the import has finished)."""
+    job = bulk_imports.get(bulk_id)
+    if job is None or not os.path.exists(job['import'].report_path):
+        return jsonify({'error': f"No report for '{bulk_id}'."}), 404
+    return send_file(job['import'].report_path, mimetype='text/csv', as_attachment=True,
+                     download_name=f"enroll_report_{bulk_id}.csv")
+
+@app.route('/remove_face', methods=['POST'])
+def remove_face():
+    """Deletes a person's photo and removes them from the running recognizer."""
+    name = request.form.get('name', '').strip()
+    if not name:
+        flash('Name cannot be empty.')
+        return redirect(url_for('index'))
+
+    # Extra photos of the person (jane_doe__2.jpg) are removed along with the main one
+    person_name = face_cache.person_name_from_filename(face_filename(name))
+    filenames = [filename for filename in sorted(os.listdir(AUTHORIZED_FACES_DIR))
+                 if filename.lower().endswith(face_cache.IMAGE_EXTENSIONS)
+                 and face_cache.person_name_from_filename(filename) == person_name]
+    if not filenames:
+        flash(f"No face stored for '{name}'.")
+        return redirect(url_for('index'))
+
+    for filename in filenames:
+        os.remove(os.path.join(AUTHORIZED_FACES_DIR, filename))
+        face_updates.publish_removal(GALLERY_INBOX_DIR, filename)
+    flash(f"Removed '{name}' from local authorized faces folder.")
+    print(f"Web: Removed '{name}' ({', '.join(filenames)})")
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
@@ -99,6 +260,9 @@ if __name__ == '__main__':
 
     print(f"\nWeb server starting on your laptop. Access it from your phone at http://<Laptop_IP_Address>:5000")
     print(f"Photos will be saved to your laptop's local folder: '{AUTHORIZED_FACES_DIR}'")
+
+    # Workers load OpenCV and the dlib models while Flask starts, instead of on the first upload
+    enrollment_queue.warm_up()
     
     # Run Flask app on all available interfaces (0.0.0.0) and port 5000
     # For mobile access on the same network, '0.0.0.0' is usually required.